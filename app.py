@@ -1,11 +1,32 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, abort, make_response, Response
 import mysql.connector
 import os
 from dotenv import load_dotenv
-from werkzeug.security import generate_password_hash, check_password_hash
 from mysql.connector import IntegrityError
 from functools import wraps
 import sys
+from decimal import Decimal
+from db_pool import ConnectionPool, PoolTimeout
+import leaderboard
+import user_stats
+import exports
+import bulk_import
+import content_requests
+from cache import cache_from_env
+from dashboard_data import (load_dashboard, server_timing_header, DashboardLoadError,
+                            decode_cursor, fetch_watchlist_page, fetch_ratings_page)
+from concurrent.futures import ThreadPoolExecutor
+from search_engine import SearchIndex
+from autocomplete import AutocompleteService
+from browse import BrowseService
+from ranking import BayesianRanking, RankingService
+from search_cache import SearchResultCache
+from write_behind import WriteBehindBuffer
+from password_hasher import PasswordHasher, HasherBusy
+from session_store import SessionStore
+from profiling import Profiler
+import threading
+import time
 
 # load environment variables from .env
 load_dotenv()
@@ -16,20 +37,139 @@ app = Flask(__name__)
 # secret key for session management
 app.secret_key = os.getenv('SECRET_KEY')
 
-# database connection helper function, for a fresh connection in each route
+# opt-in request/query profiling, aggregated at /admin/metrics
+profiler = Profiler(
+    enabled=os.getenv('PROFILING_ENABLED', 'false').lower() == 'true',
+    slow_request_ms=float(os.getenv('PROFILING_SLOW_REQUEST_MS', 0))
+)
+profiler.init_app(app)
+
+# shared connection pool, connections are only opened when first needed
+db_pool = ConnectionPool(
+    connect_args={
+        'host': os.getenv('DB_HOST'),
+        'user': os.getenv('DB_USER'),
+        'password': os.getenv('DB_PASSWORD'),
+        'database': os.getenv('DB_NAME'),
+    },
+    size=int(os.getenv('DB_POOL_SIZE', 5)),
+    max_overflow=int(os.getenv('DB_POOL_MAX_OVERFLOW', 10)),
+    timeout=float(os.getenv('DB_POOL_TIMEOUT', 30)),
+    recycle=int(os.getenv('DB_POOL_RECYCLE', 3600)),
+    pre_ping=os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+)
+
+# search_history and action_log rows are written in batches by a background thread
+telemetry = WriteBehindBuffer(
+    get_connection=lambda: get_db_connection(),
+    batch_size=int(os.getenv('WRITE_BEHIND_BATCH_SIZE', 200)),
+    flush_interval=float(os.getenv('WRITE_BEHIND_FLUSH_INTERVAL', 1.0)),
+    max_queue=int(os.getenv('WRITE_BEHIND_MAX_QUEUE', 10000)),
+    on_full=os.getenv('WRITE_BEHIND_ON_FULL', 'sync'),
+    enabled=os.getenv('WRITE_BEHIND_ENABLED', 'true').lower() == 'true'
+)
+
+# password hashing runs in worker processes so a burst of logins can't stall other requests
+password_hasher = PasswordHasher(
+    method=os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256'),
+    workers=int(os.getenv('PASSWORD_HASH_WORKERS', 2)),
+    max_pending=int(os.getenv('PASSWORD_HASH_MAX_PENDING', 32)),
+    timeout=float(os.getenv('PASSWORD_HASH_TIMEOUT', 5))
+)
+
+# server-side login sessions in the `sessions` table, the cookie only carries a token
+session_store = SessionStore(
+    get_connection=lambda: get_db_connection(),
+    lifetime=int(os.getenv('SESSION_LIFETIME', 7 * 86400)),
+    cache_ttl=int(os.getenv('SESSION_CACHE_TTL', 60)),
+    cache_max_entries=int(os.getenv('SESSION_CACHE_MAX_ENTRIES', 10000)),
+    refresh_interval=int(os.getenv('SESSION_REFRESH_INTERVAL', 300)),
+    flush_interval=float(os.getenv('SESSION_FLUSH_INTERVAL', 30)),
+    sweep_interval=int(os.getenv('SESSION_SWEEP_INTERVAL', 600))
+)
+
+# cache for the analytical views, see cache.py for the backends
+app_cache = cache_from_env()
+HOMEPAGE_CACHE_TTL = int(os.getenv('HOMEPAGE_CACHE_TTL', 60))
+
+# worker threads that load the dashboard panels in parallel, this also caps how
+# many pooled connections dashboard requests can hold at once
+dashboard_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('DASHBOARD_FETCH_WORKERS', 6)),
+    thread_name_prefix='dashboard'
+)
+DASHBOARD_PAGE_SIZE = int(os.getenv('DASHBOARD_PAGE_SIZE', 25))
+# rows fetched from MySQL per chunk of a streamed export
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 500))
+
+# search backend, 'fulltext' (MySQL MATCH ... AGAINST) or 'inverted' (in-process index)
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'fulltext').lower()
+SEARCH_INDEX_REFRESH = int(os.getenv('SEARCH_INDEX_REFRESH', 300))
+search_index = SearchIndex(title_boost=float(os.getenv('SEARCH_TITLE_BOOST', 3.0)))
+search_index_lock = threading.Lock()
+
+# search results by normalized query, kept in their own LRU so they can't push out other views
+search_cache = SearchResultCache(cache_from_env('search'), SEARCH_BACKEND)
+
+# typeahead titles for the search box, ranked by ratings + watchlist adds
+autocomplete = AutocompleteService(
+    get_connection=lambda: get_db_connection(),
+    top_n=int(os.getenv('AUTOCOMPLETE_MAX_RESULTS', 10)),
+    refresh_seconds=int(os.getenv('AUTOCOMPLETE_REFRESH', 600))
+)
+
+# top rated lists (overall, per type, per genre) ranked by a Bayesian average, kept
+# in memory and moved on every rating this process writes
+ranking_service = RankingService(
+    get_connection=lambda: get_db_connection(),
+    ranking=BayesianRanking(
+        prior_weight=float(os.getenv('RANKING_PRIOR_WEIGHT', 10)),
+        prior_mean=float(os.getenv('RANKING_PRIOR_MEAN')) if os.getenv('RANKING_PRIOR_MEAN') else None,
+        min_ratings=int(os.getenv('RANKING_MIN_RATINGS', 1))
+    ),
+    refresh_seconds=int(os.getenv('RANKING_REFRESH', 300))
+)
+
+# genre/director/type/year facets for /browse, held in memory as bitmaps
+browse_service = BrowseService(
+    get_connection=lambda: get_db_connection(),
+    directors_shown=int(os.getenv('BROWSE_DIRECTORS_SHOWN', 20)),
+    refresh_seconds=int(os.getenv('BROWSE_REFRESH', 600))
+)
+BROWSE_PAGE_SIZE = int(os.getenv('BROWSE_PAGE_SIZE', 25))
+
+# every title by normalized name, for matching the titles of an uploaded import
+title_index = bulk_import.TitleIndexService(
+    get_connection=lambda: get_db_connection(),
+    refresh_seconds=int(os.getenv('IMPORT_TITLE_INDEX_REFRESH', 600))
+)
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 500))
+IMPORT_MAX_ROWS = int(os.getenv('IMPORT_MAX_ROWS', 10000))
+
+# fuzzy title matching for content requests, against the catalog and the requests so far
+request_matcher = content_requests.RequestMatcher(
+    get_connection=lambda: get_db_connection(),
+    threshold=float(os.getenv('REQUEST_MATCH_THRESHOLD', 0.6)),
+    refresh_seconds=int(os.getenv('REQUEST_MATCH_REFRESH', 600))
+)
+
+# database connection helper function, checks a connection out of the pool
+# (calling close() on it hands it back to the pool)
 def get_db_connection():
+    start = time.perf_counter()
     try:
-        conn = mysql.connector.connect(
-            host=os.getenv('DB_HOST'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            database=os.getenv('DB_NAME')
-        )
-        return conn
-    except mysql.connector.Error as err:
+        return profiler.wrap_connection(db_pool.connect(), start)
+    except (mysql.connector.Error, PoolTimeout) as err:
         print(f"Error connecting to database: {err}")
         return None
     
+# a login only counts while its server-side session is alive, so revoked or
+# expired sessions are logged out before any route (or template) sees them
+@app.before_request
+def check_session():
+    if 'user_id' in session and session_store.validate(session.get('sid'), session['user_id']) is False:
+        session.clear()
+
 # helper
 def login_required(f):
     @wraps(f)
@@ -40,59 +180,59 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# helper for the admin-only endpoints, admins are listed in ADMIN_EMAILS
+def admin_required(f):
+    @wraps(f)
+    @login_required
+    def decorated_function(*args, **kwargs):
+        admin_emails = [e.strip() for e in os.getenv('ADMIN_EMAILS', '').split(',') if e.strip()]
+        if session.get('email') not in admin_emails:
+            abort(403)
+        return f(*args, **kwargs)
+    return decorated_function
+
 # homepage route
 @app.route('/')
 def index():
-    conn = get_db_connection()
-    if not conn:
+    # analytical view 2 -> top rated content leaderboard, served from the in-memory
+    # Bayesian ranking that rate_content keeps up to date
+    top_content = ranking_service.top(limit=10)
+    if top_content is None:
         return "Database connection failed", 500
-    cursor = conn.cursor(dictionary=True)
 
-    # analytical view 2 -> top rated content leaderboard
-    leaderboard_query = """
-        SELECT 
-            c.content_id,
-            c.title,
-            c.release_year,
-            c.content_type,
-            COALESCE(AVG(r.rating), 0) AS avg_rating,
-            COUNT(r.rating) AS num_ratings
-        FROM 
-            content c
-        LEFT JOIN 
-            user_ratings r ON c.content_id = r.content_id
-        GROUP BY 
-            c.content_id, c.title, c.release_year, c.content_type
-        HAVING 
-            COUNT(r.rating) > 0
-        ORDER BY 
-            avg_rating DESC, num_ratings DESC
-        LIMIT 10;
-    """
-    cursor.execute(leaderboard_query)
-    top_content = cursor.fetchall()
-
-    # analytical view 3: recent oscar winners
-    awards_query = """
-        SELECT 
-            c.content_id,
-            c.title,
-            c.release_year,
-            a.year AS award_year,
-            a.category
-        FROM 
-            content c
-        JOIN 
-            awards a ON c.content_id = a.content_id
-        ORDER BY 
-            a.year DESC
-        LIMIT 10;
-    """
-    cursor.execute(awards_query)
-    award_winners = cursor.fetchall()
-
-    cursor.close()
-    conn.close()
+    # the awards view is the same for every visitor, so it is served from the
+    # cache, which setup_database.py clears after a reload
+    award_winners = app_cache.get('homepage:awards')
+
+    if award_winners is None:
+        conn = get_db_connection()
+        if not conn:
+            return "Database connection failed", 500
+        cursor = conn.cursor(dictionary=True)
+
+        # analytical view 3: recent oscar winners
+        awards_query = """
+            SELECT 
+                c.content_id,
+                c.title,
+                c.release_year,
+                a.year AS award_year,
+                a.category
+            FROM 
+                content c
+            JOIN 
+                awards a ON c.content_id = a.content_id
+            ORDER BY 
+                a.year DESC
+            LIMIT 10;
+        """
+        try:
+            cursor.execute(awards_query)
+            award_winners = cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+        app_cache.set('homepage:awards', award_winners, HOMEPAGE_CACHE_TTL)
 
     return render_template('index.html', 
                            top_content=top_content, 
@@ -106,7 +246,11 @@ def signup():
         password = request.form['password']
         
         # hash password
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+        try:
+            hashed_password = password_hasher.hash(password)
+        except HasherBusy:
+            flash("We're handling a lot of sign-ups right now, please try again in a moment.", "error")
+            return render_template('signup.html'), 503
 
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -137,18 +281,37 @@ def login():
         password = request.form['password']
 
         conn = get_db_connection()
+        if not conn:
+            flash("Database connection failed.", "error")
+            return render_template('login.html'), 500
         cursor = conn.cursor(dictionary=True) 
         
         query = "SELECT * FROM users WHERE email = %s"
-        cursor.execute(query, (email,))
-        user = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
+        try:
+            cursor.execute(query, (email,))
+            user = cursor.fetchone()
+        finally:
+            cursor.close()
+            conn.close()
 
         # check passwork hash
-        if user and check_password_hash(user['password_hash'], password):
+        try:
+            matches, needs_rehash = password_hasher.verify(user['password_hash'], password) if user else (False, False)
+        except HasherBusy:
+            flash("We're handling a lot of logins right now, please try again in a moment.", "error")
+            return render_template('login.html'), 503
+
+        if matches:
+            if needs_rehash:
+                # the hash parameters changed since this password was stored, upgrade it now that we have it
+                rehash_password(user['user_id'], password)
             # create session, log the user in [AR-4]
+            sid = session_store.create(user['user_id'])
+            if not sid:
+                flash("Could not log you in right now, please try again.", "error")
+                return render_template('login.html'), 503
+            session.clear()
+            session['sid'] = sid
             session['user_id'] = user['user_id']
             session['email'] = user['email']
             flash("Logged in successfully!", "success")
@@ -158,8 +321,29 @@ def login():
             
     return render_template('login.html')
 
+def rehash_password(user_id, password):
+    # best effort, if it fails the user is simply rehashed on a later login
+    try:
+        new_hash = password_hasher.hash(password)
+    except HasherBusy:
+        return
+    conn = get_db_connection()
+    if not conn:
+        return
+    cursor = conn.cursor()
+    try:
+        cursor.execute("UPDATE users SET password_hash = %s WHERE user_id = %s", (new_hash, user_id))
+        conn.commit()
+        password_hasher.rehashed()
+    except mysql.connector.Error as err:
+        print(f"Error rehashing password for user {user_id}: {err}")
+    finally:
+        cursor.close()
+        conn.close()
+
 @app.route('/logout')
 def logout():
+    session_store.revoke(session.get('sid'))
     session.clear()
     flash("You have been logged out.", "info")
     return redirect(url_for('login'))
@@ -169,32 +353,36 @@ def logout():
 def profile():
     user_id = session['user_id']
     conn = get_db_connection()
+    if not conn:
+        return "Database connection failed", 500
     cursor = conn.cursor(dictionary=True)
 
-    if request.method == 'POST':
-        display_name = request.form['display_name']
-        bio = request.form['bio']
-        
-        query = """
-            INSERT INTO user_profiles (user_id, display_name, bio)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE 
-                display_name = VALUES(display_name), 
-                bio = VALUES(bio);
-        """
-        cursor.execute(query, (user_id, display_name, bio))
-        conn.commit()
-        
-        flash("Profile updated successfully!", "success")
-        return redirect(url_for('dashboard'))
+    try:
+        if request.method == 'POST':
+            display_name = request.form['display_name']
+            bio = request.form['bio']
+            
+            query = """
+                INSERT INTO user_profiles (user_id, display_name, bio)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE 
+                    display_name = VALUES(display_name), 
+                    bio = VALUES(bio);
+            """
+            cursor.execute(query, (user_id, display_name, bio))
+            conn.commit()
+            
+            flash("Profile updated successfully!", "success")
+            return redirect(url_for('dashboard'))
 
-    cursor.execute("SELECT display_name, bio FROM user_profiles WHERE user_id = %s", (user_id,))
-    profile_data = cursor.fetchone()
-    
-    cursor.close()
-    conn.close()
+        cursor.execute("SELECT display_name, bio FROM user_profiles WHERE user_id = %s", (user_id,))
+        profile_data = cursor.fetchone()
+        stats = user_stats.get(cursor, user_id)
+    finally:
+        cursor.close()
+        conn.close()
     
-    return render_template('profile.html', profile=profile_data)
+    return render_template('profile.html', profile=profile_data, stats=stats)
 
 # --- interaction routes ---
 
@@ -208,6 +396,7 @@ def add_to_watchlist(content_id):
         # write action [AR-1]: insert into the watchlist
         query = "INSERT INTO user_watchlist (user_id, content_id) VALUES (%s, %s)"
         cursor.execute(query, (session['user_id'], content_id))
+        user_stats.apply(cursor, session['user_id'], watchlist_count=1)
         conn.commit()
         flash("Added to watchlist!", "success")
     except IntegrityError:
@@ -223,15 +412,21 @@ def add_to_watchlist(content_id):
 @login_required
 def remove_from_watchlist(content_id):
     conn = get_db_connection()
+    if not conn:
+        flash("Database connection failed.", "error")
+        return redirect(request.referrer or url_for('index'))
     cursor = conn.cursor()
 
     # write action: delete from watchlist
     query = "DELETE FROM user_watchlist WHERE user_id = %s AND content_id = %s"
-    cursor.execute(query, (session['user_id'], content_id))
-    conn.commit()
-    
-    cursor.close()
-    conn.close()
+    try:
+        cursor.execute(query, (session['user_id'], content_id))
+        if cursor.rowcount:
+            user_stats.apply(cursor, session['user_id'], watchlist_count=-1)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
     flash("Removed from watchlist.", "info")
     return redirect(request.referrer or url_for('index'))
 
@@ -244,22 +439,17 @@ def rate_content(content_id):
     cursor = conn.cursor()
 
     try:
-        # write action [AR-1]: insert or update the rating
-        rating_query = """
-            INSERT INTO user_ratings (user_id, content_id, rating) 
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE rating = VALUES(rating)
-        """
-        cursor.execute(rating_query, (session['user_id'], content_id, rating))
-
-        # audit logging [DS-5]: record the action
-        log_query = """
-            INSERT INTO action_log (user_id, action_type, target_id) 
-            VALUES (%s, 'USER_RATED_CONTENT', %s)
-        """
-        cursor.execute(log_query, (session['user_id'], content_id))
+        # write action [AR-1]: insert or update the rating, and apply the
+        # change to the leaderboard aggregate and the user's stats in the same transaction
+        old_rating, new_rating = leaderboard.save_rating(cursor, session['user_id'], content_id, rating)
+        user_stats.record_rating(cursor, session['user_id'], old_rating, new_rating)
 
         conn.commit()
+        # totals read after the commit, so a concurrent rating of the title can't be undone
+        ranking_service.reload(conn, [content_id])
+
+        # audit logging [DS-5]: record the action, written behind the request
+        telemetry.add('action_log', session['user_id'], 'USER_RATED_CONTENT', content_id)
         flash("Rating submitted!", "success")
 
     except mysql.connector.Error as err:
@@ -292,6 +482,7 @@ def report_content(content_id):
             VALUES (%s, %s, %s, %s)
         """
         cursor.execute(query, (session['user_id'], content_id, reason, details))
+        user_stats.apply(cursor, session['user_id'], report_count=1)
         conn.commit()
         flash("Report submitted successfully. Thank you for the feedback!", "success")
     except mysql.connector.Error as err:
@@ -336,8 +527,22 @@ def save_note(content_id):
 @app.route('/request', methods=['POST'])
 @login_required
 def request_content():
-    title = request.form['title']
+    title = request.form['title'].strip()
     user_id = session['user_id']
+    if not title:
+        flash("Enter a title to request.", "error")
+        return redirect(url_for('search'))
+    # '!!!' and the like reduce to an empty key, and would all share one group
+    if not content_requests.request_key(title):
+        flash("A title needs at least one letter or digit.", "error")
+        return redirect(url_for('search'))
+
+    # point at a catalog title that looks like the request, unless the user insists
+    if not request.form.get('confirm'):
+        existing = request_matcher.match_content(title)
+        if existing:
+            flash(f"'{existing['title']}' ({existing['release_year']}) is already in the catalog.", "info")
+            return redirect(url_for('search', query=existing['title'], requested=title))
 
     conn = get_db_connection()
     if not conn:
@@ -346,10 +551,19 @@ def request_content():
     
     cursor = conn.cursor()
     try:
-        query = "INSERT INTO content_requests (user_id, title) VALUES (%s, %s)"
-        cursor.execute(query, (user_id, title))
+        # a similarly spelled request adds to that title's demand instead of a new row to review
+        group_id = request_matcher.match_group(cursor, title)
+        new_group = group_id is None
+        group_id, created = content_requests.add_request(cursor, user_id, title, group_id)
+        if created:
+            user_stats.apply(cursor, user_id, request_count=1)
         conn.commit()
-        flash(f"Your request for '{title}' has been submitted!", "success")
+        if new_group:
+            request_matcher.add_group(group_id, title)
+        if created:
+            flash(f"Your request for '{title}' has been submitted!", "success")
+        else:
+            flash(f"You have already requested '{title}'.", "info")
     except mysql.connector.Error as err:
         flash(f"An error occurred: {err}", "error")
         conn.rollback()
@@ -362,96 +576,267 @@ def request_content():
 @app.route('/dashboard')
 @login_required
 def dashboard():
+    # next-page positions for the watchlist and ratings panels, a bad token just starts over
+    try:
+        watchlist_after = decode_cursor(request.args.get('watchlist_after'))
+    except ValueError:
+        watchlist_after = None
+    try:
+        ratings_after = decode_cursor(request.args.get('ratings_after'))
+    except ValueError:
+        ratings_after = None
+
+    try:
+        data, timings = load_dashboard(profiler.bind(get_db_connection), dashboard_executor, session['user_id'],
+                                       watchlist_after=watchlist_after,
+                                       ratings_after=ratings_after,
+                                       page_size=DASHBOARD_PAGE_SIZE)
+    except (DashboardLoadError, mysql.connector.Error) as err:
+        print(f"Error loading dashboard: {err}")
+        return "Database connection failed", 500
+
+    response = make_response(render_template('dashboard.html', 
+                           watchlist=data['watchlist'], 
+                           watchlist_next=data['watchlist_next'],
+                           my_ratings=data['my_ratings'],
+                           ratings_next=data['ratings_next'],
+                           watchlist_count=data['watchlist_count'],
+                           avg_rating=data['avg_rating'],
+                           profile=data['profile'],
+                           recent_searches=data['recent_searches'],
+                           my_reports=data['my_reports'],
+                           my_requests=data['my_requests'],
+                           recommendations=data['recommendations']))
+    # per-panel load times, visible in the browser's network tab
+    response.headers['Server-Timing'] = server_timing_header(timings)
+    return response
+
+@app.route('/dashboard/watchlist.json')
+@login_required
+def watchlist_page():
+    # json paging for the watchlist, pass ?fields=overview to include the overview text
+    return _dashboard_page_json(
+        lambda cursor, after, limit: fetch_watchlist_page(
+            cursor, session['user_id'], after, limit,
+            include_overview='overview' in request.args.get('fields', '').split(',')
+        )
+    )
+
+@app.route('/dashboard/ratings.json')
+@login_required
+def ratings_page():
+    return _dashboard_page_json(
+        lambda cursor, after, limit: fetch_ratings_page(cursor, session['user_id'], after, limit)
+    )
+
+def _dashboard_page_json(fetch_page):
+    try:
+        after = decode_cursor(request.args.get('after'))
+        limit = min(int(request.args.get('limit', DASHBOARD_PAGE_SIZE)), 100)
+    except ValueError:
+        return jsonify({'error': 'Invalid page cursor or limit.'}), 400
+    if limit < 1:
+        return jsonify({'error': 'Invalid page cursor or limit.'}), 400
+
     conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'Database connection failed'}), 500
     cursor = conn.cursor(dictionary=True)
-    user_id = session['user_id']
+    try:
+        rows, next_cursor = fetch_page(cursor, after, limit)
+    finally:
+        cursor.close()
+        conn.close()
 
-    watchlist_query = """
-        SELECT 
-            c.*,
-            n.note_text
-        FROM 
-            user_watchlist w
-        JOIN 
-            content c ON w.content_id = c.content_id
-        LEFT JOIN
-            content_notes n ON w.user_id = n.user_id AND w.content_id = n.content_id
-        WHERE 
-            w.user_id = %s
-    """
-    cursor.execute(watchlist_query, (user_id,))
-    watchlist = cursor.fetchall()
-
-    ratings_query = """
-        SELECT c.title, r.rating, r.created_at
-        FROM user_ratings r
-        JOIN content c ON r.content_id = c.content_id
-        WHERE r.user_id = %s
-        ORDER BY r.created_at DESC
-    """
-    cursor.execute(ratings_query, (user_id,))
-    my_ratings = cursor.fetchall()
-    
-    stats_watchlist_query = "SELECT COUNT(*) as total_count FROM user_watchlist WHERE user_id = %s"
-    cursor.execute(stats_watchlist_query, (user_id,))
-    watchlist_count = cursor.fetchone()['total_count']
-    
-    stats_rating_query = "SELECT COALESCE(AVG(rating), 0) as average_rating FROM user_ratings WHERE user_id = %s"
-    cursor.execute(stats_rating_query, (user_id,))
-    avg_rating = cursor.fetchone()['average_rating']
-    avg_rating = round(float(avg_rating), 1)
-
-    # get profile data in order to display on the dashboard
-    profile_query = "SELECT display_name, bio FROM user_profiles WHERE user_id = %s"
-    cursor.execute(profile_query, (user_id,))
-    user_profile = cursor.fetchone()
-
-    search_history_query = """
-        SELECT search_query 
-        FROM search_history 
-        WHERE user_id = %s 
-        GROUP BY search_query
-        ORDER BY MAX(searched_at) DESC 
-        LIMIT 5;
-    """
-    cursor.execute(search_history_query, (user_id,))
-    recent_searches = cursor.fetchall()
-
-    # get the users reports
-    reports_query = """
-        SELECT r.reason, r.status, r.created_at, c.title
-        FROM content_reports r
-        JOIN content c ON r.content_id = c.content_id
-        WHERE r.user_id = %s
-        ORDER BY r.created_at DESC
-        LIMIT 5;
-    """
-    cursor.execute(reports_query, (user_id,))
-    my_reports = cursor.fetchall()
-
-    # content requests
-    requests_query = """
-        SELECT title, status, requested_at
-        FROM content_requests
-        WHERE user_id = %s
-        ORDER BY requested_at DESC
-        LIMIT 5;
-    """
-    cursor.execute(requests_query, (user_id,))
-    my_requests = cursor.fetchall()
-
-    cursor.close()
-    conn.close()
-    
-    return render_template('dashboard.html', 
-                           watchlist=watchlist, 
-                           my_ratings=my_ratings,
-                           watchlist_count=watchlist_count,
-                           avg_rating=avg_rating,
-                           profile=user_profile,
-                           recent_searches=recent_searches,
-                           my_reports=my_reports,
-                           my_requests=my_requests)
+    # make timestamps and decimals json friendly
+    for row in rows:
+        for key, value in row.items():
+            if hasattr(value, 'isoformat'):
+                row[key] = value.isoformat()
+            elif isinstance(value, Decimal):
+                row[key] = float(value)
+
+    return jsonify({'items': rows, 'next': next_cursor})
+
+@app.route('/export/<dataset>.<any(csv, jsonl):fmt>')
+@login_required
+def export_data(dataset, fmt):
+    # streams the whole dataset, e.g. /export/watchlist.csv or /export/ratings.jsonl
+    if dataset not in exports.EXPORT_QUERIES:
+        abort(404)
+    conn = get_db_connection()
+    if not conn:
+        return "Database connection failed", 500
+    # the connection stays checked out until the last row is sent, the generator closes it
+    response = Response(exports.stream_export(conn, dataset, fmt, session['user_id'], EXPORT_BATCH_SIZE),
+                        mimetype=exports.FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/import', methods=['GET', 'POST'])
+@login_required
+def import_data():
+    # bulk watchlist / ratings upload, matched by title and year
+    if request.method == 'GET':
+        return render_template('import.html', targets=bulk_import.IMPORT_TARGETS)
+
+    upload = request.files.get('file')
+    target = request.form.get('target', 'watchlist')
+    rating_scale = request.form.get('rating_scale', '5')
+    if not upload or not upload.filename:
+        flash("Choose a file to import.", "error")
+        return redirect(url_for('import_data'))
+    if target not in bulk_import.IMPORT_TARGETS or rating_scale not in ('5', '10'):
+        abort(400)
+
+    try:
+        entries = bulk_import.read_upload(upload.stream, upload.filename, IMPORT_MAX_ROWS)
+    except bulk_import.ImportFileError as err:
+        flash(str(err), "error")
+        return redirect(url_for('import_data'))
+
+    index = title_index.get()
+    if index is None:
+        return "Database connection failed", 500
+    report = bulk_import.plan_import(index, entries, target, int(rating_scale))
+
+    conn = get_db_connection()
+    if not conn:
+        return "Database connection failed", 500
+    try:
+        if target == 'watchlist':
+            batches = bulk_import.write_watchlist(conn, session['user_id'], report['content_ids'], IMPORT_BATCH_SIZE)
+        else:
+            batches = bulk_import.write_ratings(conn, session['user_id'], report['ratings'], IMPORT_BATCH_SIZE)
+        for batch in batches:
+            report['written'] += batch['written']
+            report['added'] += batch['added']
+            report['batches'] += 1
+            # committed, move the titles in this process's ranking right away
+            ranking_service.reload(conn, batch.get('changed', ()))
+    except mysql.connector.Error as err:
+        # the batches before this one are committed and stay
+        print(f"Error importing {target}: {err}")
+        conn.rollback()
+        report['error'] = str(err)
+    finally:
+        conn.close()
+
+    return render_template('import.html', targets=bulk_import.IMPORT_TARGETS, report=report)
+
+@app.route('/admin/requests')
+@admin_required
+def most_requested():
+    # content requests collapsed by title, most requested first
+    status = request.args.get('status', 'Pending')
+    if status not in content_requests.REQUEST_STATUSES:
+        abort(400)
+    conn = get_db_connection()
+    if not conn:
+        return "Database connection failed", 500
+    cursor = conn.cursor(dictionary=True)
+    try:
+        groups = content_requests.most_requested(cursor, status, limit=100)
+    finally:
+        cursor.close()
+        conn.close()
+    # titles that showed up in the catalog since they were requested
+    for group in groups:
+        group['in_catalog'] = request_matcher.match_content(group['title']) if status == 'Pending' else None
+    return render_template('admin_requests.html', groups=groups, status=status,
+                           statuses=content_requests.REQUEST_STATUSES)
+
+@app.route('/admin/requests/<int:group_id>/status', methods=['POST'])
+@admin_required
+def set_request_status(group_id):
+    status = request.form.get('status')
+    if status not in content_requests.REQUEST_STATUSES:
+        abort(400)
+    conn = get_db_connection()
+    if not conn:
+        return "Database connection failed", 500
+    cursor = conn.cursor()
+    try:
+        updated = content_requests.set_status(cursor, group_id, status)
+        conn.commit()
+        flash(f"Marked {updated} request(s) as {status}.", "success")
+    except mysql.connector.Error as err:
+        flash(f"An error occurred while updating the requests: {err}", "error")
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+    return redirect(request.referrer or url_for('most_requested'))
+
+@app.route('/admin/pool')
+@admin_required
+def pool_stats():
+    # connection pool usage, for sizing DB_POOL_SIZE / DB_POOL_MAX_OVERFLOW
+    return jsonify(db_pool.stats())
+
+@app.route('/admin/cache')
+@admin_required
+def cache_stats():
+    # hit/miss counters for this worker process
+    return jsonify(app_cache.stats())
+
+@app.route('/admin/write-behind')
+@admin_required
+def write_behind_stats():
+    # queue depth and flush counters for the search_history / action_log buffer
+    return jsonify(telemetry.stats())
+
+@app.route('/admin/search-cache')
+@admin_required
+def search_cache_stats():
+    # hit rate and the most requested cached queries, for sizing SEARCH_CACHE_MAX_ENTRIES
+    return jsonify(search_cache.stats())
+
+@app.route('/admin/password-hasher')
+@admin_required
+def password_hasher_stats():
+    # queue depth, rejections and hash latency, for sizing PASSWORD_HASH_WORKERS
+    return jsonify(password_hasher.stats())
+
+@app.route('/admin/metrics')
+@admin_required
+def request_metrics():
+    # per-endpoint and per-query latency histograms, needs PROFILING_ENABLED=true
+    if request.args.get('reset'):
+        profiler.reset()
+    return jsonify(profiler.stats())
+
+@app.route('/admin/sessions')
+@admin_required
+def session_stats():
+    # session cache hit rate, batched expiry refreshes and sweep counts for this process
+    return jsonify(session_store.stats())
+
+@app.route('/admin/users/<int:user_id>/sessions/revoke', methods=['POST'])
+@admin_required
+def revoke_user_sessions(user_id):
+    # log a user out everywhere, other processes pick it up within SESSION_CACHE_TTL
+    return jsonify({'user_id': user_id, 'revoked': session_store.revoke_user(user_id)})
+
+# full text search over the content table, the default search backend
+FULLTEXT_SEARCH_QUERY = """
+    SELECT content_id, title, release_year, content_type
+    FROM content 
+    WHERE MATCH(title, overview) AGAINST(%s IN NATURAL LANGUAGE MODE)
+    LIMIT 50;
+"""
+
+def get_search_index(cursor):
+    # built on first use, then brought in line with added, edited and deleted content every SEARCH_INDEX_REFRESH seconds
+    if search_index.built_at is None or time.time() - search_index.built_at > SEARCH_INDEX_REFRESH:
+        with search_index_lock:
+            if search_index.built_at is None or time.time() - search_index.built_at > SEARCH_INDEX_REFRESH:
+                first_build = search_index.built_at is None
+                if search_index.build(cursor) and not first_build:
+                    # the catalog changed, cached results may be stale
+                    search_cache.invalidate()
+    return search_index
 
 @app.route('/search')
 def search():
@@ -459,33 +844,93 @@ def search():
     search_query = request.args.get('query', '').strip()
     
     if search_query:
-        conn = get_db_connection()
-        if not conn:
-            return "Database connection failed", 500
-        cursor = conn.cursor(dictionary=True)
+        results = search_cache.get(search_query)
 
-        # save the search query if the user is logged in
+        # save the search query if the user is logged in, written behind the request
         if 'user_id' in session:
-            log_query = "INSERT INTO search_history (user_id, search_query) VALUES (%s, %s)"
-            cursor.execute(log_query, (session['user_id'], search_query))
-            conn.commit()
-
-        sql_query = """
-            SELECT content_id, title, release_year, content_type
-            FROM content 
-            WHERE MATCH(title, overview) AGAINST(%s IN NATURAL LANGUAGE MODE)
-            LIMIT 50;
-        """
-        cursor.execute(sql_query, (search_query,))
-        results = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
+            telemetry.add('search_history', session['user_id'], search_query)
+
+        # the database is only needed on a cache miss
+        if results is None:
+            conn = get_db_connection()
+            if not conn:
+                return "Database connection failed", 500
+            cursor = conn.cursor(dictionary=True)
+
+            try:
+                if SEARCH_BACKEND == 'inverted':
+                    # in-process BM25 index, see search_engine.py
+                    results = get_search_index(cursor).search(search_query, limit=50)
+                else:
+                    cursor.execute(FULLTEXT_SEARCH_QUERY, (search_query,))
+                    results = cursor.fetchall()
+            finally:
+                cursor.close()
+                conn.close()
+            search_cache.set(search_query, results)
         
         return render_template('search.html', results=results, search_query=search_query)
 
     return render_template('search.html')
 
+@app.route('/search/suggest')
+def search_suggest():
+    # typeahead for the search box, called on every keystroke
+    prefix = request.args.get('q', '')
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        limit = 10
+    return jsonify(autocomplete.suggest(prefix, limit))
+
+@app.route('/top')
+def top_rated():
+    # top rated per genre or content type, a slice of the in-memory ranking
+    genre = request.args.get('genre', type=int)
+    content_type = request.args.get('type') or None
+    limit = min(max(request.args.get('limit', 25, type=int), 1), 100)
+
+    top_content = ranking_service.top(limit=limit, genre=genre, content_type=content_type)
+    if top_content is None:
+        return "Database connection failed", 500
+
+    return render_template('top.html',
+                           top_content=top_content,
+                           genres=ranking_service.ranking.genres(),
+                           content_types=ranking_service.ranking.content_types(),
+                           genre=genre,
+                           content_type=content_type)
+
+@app.route('/browse')
+def browse():
+    # filter the catalog by type, genre, director and release years, each click
+    # is a few bitmap operations on the in-memory facets (see browse.py); facet
+    # links in the page change one of these args and keep the rest
+    args = {
+        'type': request.args.get('type') or None,
+        'genre': request.args.get('genre', type=int),
+        'director': request.args.get('director', type=int),
+        'year_from': request.args.get('year_from', type=int),
+        'year_to': request.args.get('year_to', type=int),
+    }
+    page = max(request.args.get('page', 1, type=int), 1)
+
+    result = browse_service.browse(content_type=args['type'], genre=args['genre'], director=args['director'],
+                                   year_from=args['year_from'], year_to=args['year_to'],
+                                   offset=(page - 1) * BROWSE_PAGE_SIZE, limit=BROWSE_PAGE_SIZE)
+    if result is None:
+        return "Database connection failed", 500
+
+    return render_template('browse.html',
+                           results=result['results'],
+                           total=result['total'],
+                           facets=result['facets'],
+                           args=args,
+                           genre_name=browse_service.index.name_of('genre', args['genre']),
+                           director_name=browse_service.index.name_of('director', args['director']),
+                           page=page,
+                           has_next=page * BROWSE_PAGE_SIZE < result['total'])
+
 if __name__ == '__main__':
     # check command line arguments
     if len(sys.argv) > 1 and sys.argv[1] == '--drop':
@@ -508,5 +953,14 @@ if __name__ == '__main__':
         except mysql.connector.Error as err:
             print(f"Error: {err}")
     else:
+        # build the search index up front instead of on the first search
+        if SEARCH_BACKEND == 'inverted':
+            conn = get_db_connection()
+            if conn:
+                cursor = conn.cursor()
+                print(f"Indexed {get_search_index(cursor).stats()['documents']} content items for search.")
+                cursor.close()
+                conn.close()
+
         # run the web server as normal
         app.run(debug=True, port=5001)
\ No newline at end of file
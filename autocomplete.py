@@ -0,0 +1,140 @@
+import heapq
+import re
+import time
+from array import array
+from bisect import bisect_left
+
+from index_service import IndexService
+
+NON_WORD_RE = re.compile(r"[\W_]+")
+LEADING_ARTICLES = ('the ', 'a ', 'an ')
+
+# titles and their popularity, popularity = number of ratings + watchlist adds
+POPULARITY_QUERY = """
+    SELECT
+        c.content_id,
+        c.title,
+        c.release_year,
+        c.content_type,
+        COALESCE(s.rating_count, 0) + COALESCE(w.adds, 0) AS popularity
+    FROM
+        content c
+    LEFT JOIN
+        content_rating_stats s ON s.content_id = c.content_id
+    LEFT JOIN
+        (SELECT content_id, COUNT(*) AS adds FROM user_watchlist GROUP BY content_id) w
+        ON w.content_id = c.content_id
+"""
+
+def normalize_title(text):
+    """
+    Case-folds text and turns punctuation and runs of whitespace into single
+    spaces, so 'Spider-Man' and 'spider man' compare equal.
+    """
+    return NON_WORD_RE.sub(' ', text.casefold()).strip()
+
+
+class TitleAutocomplete:
+    """
+    Prefix lookup over content titles, ranked by popularity.
+
+    Titles are kept in a sorted array of normalized keys (titles starting
+    with an article are also keyed without it) next to an array of
+    popularity ranks, so a prefix is two binary searches plus a top-N pick.
+    The top-N for every prefix up to `precompute_depth` characters is
+    computed ahead of time since those ranges cover most of the catalog.
+    """
+
+    def __init__(self, top_n=10, precompute_depth=2):
+        self.top_n = top_n
+        self.precompute_depth = precompute_depth
+        # swapped in as one tuple so lookups never see a half-built index
+        self._index = ([], array('I'), [], {})
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._index[2])
+
+    def build(self, cursor):
+        """
+        Loads titles and popularity from the database and rebuilds the index.
+        """
+        cursor.execute(POPULARITY_QUERY)
+        rows = [row if isinstance(row, dict) else dict(zip(cursor.column_names, row))
+                for row in cursor.fetchall()]
+        self.build_from_rows(rows)
+
+    def build_from_rows(self, rows):
+        # rank 0 is the most popular title, ties go to the shorter (then alphabetically first) title
+        rows = sorted(rows, key=lambda r: (-int(r['popularity'] or 0), len(r['title'] or ''), r['title'] or ''))
+        docs = [{
+            'content_id': row['content_id'],
+            'title': row['title'],
+            'release_year': row['release_year'],
+            'content_type': row['content_type'],
+        } for row in rows]
+
+        entries = []
+        for rank, doc in enumerate(docs):
+            key = normalize_title(doc['title'] or '')
+            if not key:
+                continue
+            entries.append((key, rank))
+            for article in LEADING_ARTICLES:
+                if key.startswith(article):
+                    entries.append((key[len(article):], rank))
+        entries.sort()
+
+        keys = [key for key, _ in entries]
+        ranks = array('I', (rank for _, rank in entries))
+
+        # docs are visited most popular first, so each bucket fills with its top N
+        short_prefixes = {}
+        for key, rank in sorted(entries, key=lambda entry: entry[1]):
+            for depth in range(1, min(self.precompute_depth, len(key)) + 1):
+                bucket = short_prefixes.setdefault(key[:depth], [])
+                if len(bucket) < self.top_n and rank not in bucket:
+                    bucket.append(rank)
+
+        self._index = (keys, ranks, docs, short_prefixes)
+        self.built_at = time.time()
+
+    def suggest(self, prefix, limit=None):
+        """
+        Returns up to `limit` content rows whose title starts with `prefix`,
+        most popular first.
+        """
+        limit = min(limit or self.top_n, self.top_n)
+        prefix = normalize_title(prefix)
+        if not prefix:
+            return []
+
+        keys, ranks, docs, short_prefixes = self._index
+        if len(prefix) <= self.precompute_depth:
+            best = short_prefixes.get(prefix, [])[:limit]
+        else:
+            lo = bisect_left(keys, prefix)
+            hi = bisect_left(keys, prefix + '\uffff', lo)
+            best = heapq.nsmallest(limit, set(ranks[lo:hi]))
+        return [docs[rank] for rank in best]
+
+
+class AutocompleteService(IndexService):
+    """
+    Holds a TitleAutocomplete and rebuilds it on a background thread once it
+    is older than `refresh_seconds`, so popularity stays current.
+    """
+
+    description = 'autocomplete index'
+
+    def __init__(self, get_connection, top_n=10, refresh_seconds=600):
+        super().__init__(get_connection, refresh_seconds)
+        self.index = TitleAutocomplete(top_n=top_n)
+
+    def suggest(self, prefix, limit=None):
+        if not self.ensure_fresh():
+            return []
+        return self.index.suggest(prefix, limit)
+
+    def build(self, cursor):
+        self.index.build(cursor)
@@ -0,0 +1,242 @@
+"""
+Runs EXPLAIN on every query the main routes issue and flags full table scans,
+filesorts and temporary tables.
+
+usage:
+    python benchmarks/load_test.py seed
+    python benchmarks/explain_queries.py [--min-rows 100] [--strict] [--json FILE]
+
+The routes are driven in-process through Flask's test client as a seeded
+benchmark user (see load_test.py), with every statement they send captured
+together with its parameters. Each distinct statement is then EXPLAINed with
+the parameters it was first seen with. A plan step is flagged when it scans a
+whole table, sorts with a filesort or builds a temporary table while
+examining at least --min-rows rows (small lookup tables are fine to scan).
+The background index builds (search, autocomplete, browse, ranking, import
+and request titles) are run before capturing, since reading whole tables is their job.
+
+With --strict the script exits with 1 when anything is flagged, so it can
+guard a CI run.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+
+import mysql.connector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from load_test import BENCH_EMAIL, BENCH_PASSWORD, connect
+from profiling import normalize_sql
+
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE', 'WITH')
+
+
+def route_requests(content_id, genre_id):
+    # (route name, method, path, form data), in the order they are driven
+    return [
+        ('home', 'GET', '/', None),
+        ('top', 'GET', '/top', None),
+        ('top_genre', 'GET', f"/top?genre={genre_id}", None),
+        ('search', 'GET', '/search?query=love', None),
+        ('suggest', 'GET', '/search/suggest?q=lo', None),
+        ('browse', 'GET', '/browse', None),
+        ('browse_filtered', 'GET', f"/browse?type=Movie&genre={genre_id}&year_from=1990&year_to=2009", None),
+        ('dashboard', 'GET', '/dashboard', None),
+        ('dashboard_watchlist', 'GET', '/dashboard/watchlist.json', None),
+        ('dashboard_ratings', 'GET', '/dashboard/ratings.json', None),
+        ('profile', 'GET', '/profile', None),
+        ('export_watchlist', 'GET', '/export/watchlist.csv', None),
+        ('export_ratings', 'GET', '/export/ratings.jsonl', None),
+        ('export_notes', 'GET', '/export/notes.csv', None),
+        ('export_searches', 'GET', '/export/searches.jsonl', None),
+        ('rate', 'POST', f"/rate/{content_id}", {'rating': '4.5'}),
+        ('watchlist_add', 'POST', f"/watchlist/add/{content_id}", None),
+        ('note', 'POST', f"/notes/save/{content_id}", {'note_text': 'explain harness'}),
+        ('watchlist_remove', 'POST', f"/watchlist/remove/{content_id}", None),
+        ('report', 'POST', f"/report/{content_id}", {'reason': 'Other'}),
+        ('request', 'POST', '/request', {'title': 'Explain Harness Request'}),
+        ('import_ratings', 'POST', '/import',
+         {'target': 'ratings', 'file': (io.BytesIO(f"content_id,rating\n{content_id},4.0\n".encode()), 'ratings.csv')}),
+        ('import_watchlist', 'POST', '/import',
+         {'target': 'watchlist', 'file': (io.BytesIO(f"content_id\n{content_id}\n".encode()), 'watchlist.csv')}),
+    ]
+
+
+class CapturingCursor:
+    """
+    Passes everything through to the real cursor, recording each statement
+    and its parameters under the route currently being driven.
+    """
+
+    def __init__(self, cursor, capture):
+        self._cursor = cursor
+        self._capture = capture
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._capture(operation, params)
+        return self._cursor.execute(operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        seq_params = list(seq_params)
+        if seq_params:
+            self._capture(operation, seq_params[0])
+        return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class CapturingConnection:
+    def __init__(self, conn, capture):
+        self._conn = conn
+        self._capture = capture
+
+    def cursor(self, *args, **kwargs):
+        return CapturingCursor(self._conn.cursor(*args, **kwargs), self._capture)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def capture_route_queries(app_module, requests):
+    """
+    Drives `requests` through the app and returns {route: {normalized sql: (sql, params)}}.
+    """
+    captured = {}
+    current = {'route': None}
+    lock = threading.Lock()
+
+    def capture(sql, params):
+        if isinstance(sql, (bytes, bytearray)):
+            sql = sql.decode('utf-8', 'replace')
+        route = current['route']
+        if route is None or not sql.lstrip().upper().startswith(EXPLAINABLE):
+            return
+        with lock:
+            captured.setdefault(route, {}).setdefault(normalize_sql(sql), (sql, params))
+
+    original = app_module.get_db_connection
+
+    def get_db_connection():
+        conn = original()
+        return CapturingConnection(conn, capture) if conn else conn
+
+    # the routes (and the dashboard's executor threads) look the helper up at call time
+    app_module.get_db_connection = get_db_connection
+    try:
+        client = app_module.app.test_client()
+        status = client.post('/login', data={'email': BENCH_EMAIL.format(0), 'password': BENCH_PASSWORD}).status_code
+        if status >= 400:
+            sys.exit(f"Could not log in as {BENCH_EMAIL.format(0)} (HTTP {status}), run `load_test.py seed` first.")
+        for route, method, path, data in requests:
+            current['route'] = route
+            response = client.open(path, method=method, data=data)
+            if response.status_code >= 500:
+                print(f"    {route}: HTTP {response.status_code}")
+        current['route'] = None
+    finally:
+        app_module.get_db_connection = original
+    return captured
+
+
+def explain(cursor, sql, params, min_rows):
+    """
+    Returns (plan rows, flags) for one statement.
+    """
+    cursor.execute("EXPLAIN " + sql, params)
+    plan = cursor.fetchall()
+    flags = []
+    for step in plan:
+        table = step.get('table') or ''
+        rows = int(step.get('rows') or 0)
+        extra = step.get('Extra') or ''
+        # derived tables and unions are intermediate results, their inputs are checked on their own steps
+        if table.startswith('<') or rows < min_rows:
+            continue
+        if step.get('type') == 'ALL':
+            flags.append(f"full scan of {table} (~{rows} rows)")
+        elif step.get('type') == 'index' and 'Using index' not in extra:
+            flags.append(f"full index scan of {table} (~{rows} rows)")
+        if 'Using filesort' in extra:
+            flags.append(f"filesort on {table} (~{rows} rows)")
+        if 'Using temporary' in extra:
+            flags.append(f"temporary table for {table} (~{rows} rows)")
+    return plan, flags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help="database to use instead of DB_NAME")
+    parser.add_argument('--min-rows', type=int, default=100,
+                        help="plan steps examining fewer rows than this are never flagged")
+    parser.add_argument('--strict', action='store_true', help="exit with 1 when anything is flagged")
+    parser.add_argument('--json', metavar='FILE', help="also write the report as JSON")
+    args = parser.parse_args()
+
+    if args.database:
+        os.environ['DB_NAME'] = args.database
+    import app as app_module
+    app_module.app.config['TESTING'] = True
+
+    conn = connect(args.database)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT content_id FROM content ORDER BY content_id LIMIT 1")
+    row = cursor.fetchone()
+    if row is None:
+        sys.exit("The catalog is empty, run setup_database.py and `load_test.py seed` first.")
+    cursor.execute("SELECT genre_id FROM genres ORDER BY genre_id LIMIT 1")
+    genre = cursor.fetchone()
+
+    # the in-memory indexes load whole tables on purpose, build them before capturing
+    app_module.autocomplete.refresh()
+    app_module.browse_service.refresh()
+    app_module.ranking_service.refresh()
+    app_module.title_index.refresh()
+    app_module.request_matcher.refresh()
+
+    print("--> Driving the routes...")
+    captured = capture_route_queries(app_module, route_requests(row['content_id'], genre['genre_id'] if genre else 0))
+
+    report = {}
+    flagged = 0
+    for route, statements in captured.items():
+        print(f"\n{route}: {len(statements)} statements")
+        report[route] = []
+        for shape, (sql, params) in statements.items():
+            try:
+                plan, flags = explain(cursor, sql, params, args.min_rows)
+            except mysql.connector.Error as err:
+                print(f"    [skipped] {shape[:120]}: {err}")
+                continue
+            report[route].append({'sql': shape, 'flags': flags, 'plan': plan})
+            if flags:
+                flagged += 1
+                print(f"    [!!!] {shape[:160]}")
+                for flag in flags:
+                    print(f"          {flag}")
+                for step in plan:
+                    print(f"          {step.get('table')}: type={step.get('type')} key={step.get('key')} "
+                          f"possible_keys={step.get('possible_keys')} rows={step.get('rows')} "
+                          f"extra={step.get('Extra')}")
+            else:
+                print(f"    [ok]  {shape[:160]}")
+    cursor.close()
+    conn.close()
+
+    print(f"\n--> {flagged} statements flagged.")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, default=str)
+        print(f"--> Report saved to {args.json}")
+    if args.strict and flagged:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmarks the streaming ingest pipeline (ingest.py) on a synthetic
+movies.csv, optionally against the old three-pass regex splitter.
+
+usage: python benchmarks/ingest_benchmark.py [--rows 1000000] [--memory] [--legacy] [--workers 4]
+
+No database is needed: rows are parsed, fanned out to the catalog sinks and
+counted by a writer that discards them.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingest import SOURCES, CatalogSinks, movie_records, parallel_records
+
+MOVIE_COLUMNS = ['budget', 'genres', 'homepage', 'id', 'keywords', 'original_language', 'original_title',
+                 'overview', 'popularity', 'production_companies', 'production_countries', 'release_date',
+                 'revenue', 'runtime', 'spoken_languages', 'status', 'tagline', 'title', 'vote_average',
+                 'vote_count']
+GENRES = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Family',
+          'Fantasy', 'History', 'Horror', 'Music', 'Mystery', 'Romance', 'Science Fiction', 'Thriller']
+WORDS = ('a young man sets out on a journey across the sea to find his lost father, '
+         'while "the council" plots against him and an old friend returns').split()
+
+
+def write_synthetic_movies(path, rows, seed=7):
+    # same columns and quoting as the TMDB file: JSON genre lists, quoted commas and quotes
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(MOVIE_COLUMNS)
+        for i in range(1, rows + 1):
+            genres = [{'id': g, 'name': GENRES[g]} for g in rng.sample(range(len(GENRES)), rng.randint(1, 3))]
+            overview = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 80)))
+            title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title()
+            writer.writerow([
+                1000000, json.dumps(genres), '', i, '[]', 'en', title, overview, 1.5, '[]', '[]',
+                f"{rng.randint(1920, 2024)}-01-01", 0, 100, '[]', 'Released', '', title, 6.5, 100
+            ])
+
+
+class NullWriter:
+    parents = []
+
+    def write(self, row):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def run_pipeline(path):
+    sinks = CatalogSinks(lambda table, columns: NullWriter())
+    for movie in movie_records(path):
+        sinks.add_movie(movie)
+    sinks.close()
+    return sinks.counts
+
+
+def run_parallel(path, workers):
+    sinks = CatalogSinks(lambda table, columns: NullWriter())
+    movies_only = [source for source in SOURCES if source[0] == 'movies.csv']
+    for method, record in parallel_records(os.path.dirname(path), workers, sources=movies_only):
+        getattr(sinks, method)(record)
+    sinks.close()
+    return sinks.counts
+
+
+def run_legacy(path):
+    # the old setup_database.py approach: one find() pass for genres, two regex passes for content
+    csv_regex = re.compile(r',(?=(?:[^\"]*\"[^\"]*\")*[^\"]*$)')
+    genres = set()
+    with open(path, 'r', encoding='utf-8') as file:
+        next(file)
+        for line in file:
+            start, end = line.find('"[{"'), line.find('}]"')
+            if start != -1 and end != -1:
+                try:
+                    genres.update(g['name'] for g in json.loads(line[start:end + 3].strip('"').replace('""', '"')))
+                except ValueError:
+                    pass
+    movies = {}
+    for _ in range(2):
+        with open(path, 'r', encoding='utf-8') as file:
+            header = next(file).strip().split(',')
+            h = {name: i for i, name in enumerate(header)}
+            for line in file:
+                try:
+                    fields = csv_regex.split(line)
+                    movies[int(fields[h['id']])] = fields[h['title']]
+                except (ValueError, IndexError):
+                    continue
+    return {'genres': len(genres), 'content': len(movies)}
+
+
+def measure(label, func, path, trace_memory):
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = func(path)
+    elapsed = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    memory = f", peak memory {peak / 2 ** 20:.1f} MiB" if peak is not None else ""
+    print(f"{label:<10} {elapsed:8.2f}s{memory}  {result}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--memory', action='store_true', help="track peak memory (slower)")
+    parser.add_argument('--legacy', action='store_true', help="also time the old regex splitter")
+    parser.add_argument('--workers', type=int, default=0, help="also time parsing in this many processes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'movies.csv')
+        start = time.perf_counter()
+        write_synthetic_movies(path, args.rows)
+        size = os.path.getsize(path) / 2 ** 20
+        print(f"--> Generated {args.rows} rows ({size:.0f} MiB) in {time.perf_counter() - start:.1f}s")
+
+        measure('pipeline', run_pipeline, path, args.memory)
+        if args.workers:
+            measure(f'{args.workers} procs', lambda p: run_parallel(p, args.workers), path, args.memory)
+        if args.legacy:
+            measure('legacy', run_legacy, path, args.memory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+"""
+Load test for the main Flask routes.
+
+usage:
+    python benchmarks/load_test.py seed [--users 200] [--catalog 5000]
+    python benchmarks/load_test.py run [--concurrency 16] [--duration 30] [--url http://127.0.0.1:5001]
+                                       [--save-baseline FILE] [--baseline FILE] [--max-regression 0.25]
+
+`seed` adds synthetic titles (when the catalog has fewer than --catalog) and
+--users benchmark users with watchlists, ratings and search history to the
+database in .env. Earlier benchmark users are deleted first, real users and
+the real catalog are left alone.
+
+`run` logs each virtual user in, then drives /, /search, /dashboard,
+/rate/<id> and /watchlist/add/<id> in a weighted mix for --duration seconds
+and reports throughput and p50/p95/p99 latency per route. Without --url the
+app is driven in-process through Flask's test client (same database, no
+server needed). --save-baseline stores the results; --baseline compares
+against a stored run and exits with 1 when a route got slower or lost
+throughput by more than --max-regression.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+from http.cookiejar import CookieJar
+
+import mysql.connector
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bulk_load import InsertWriter
+import leaderboard
+import user_stats
+
+BENCH_EMAIL = 'bench-user-{}@example.com'
+BENCH_PASSWORD = 'bench-password'
+WORDS = ('night river house last city dark love war story king return shadow road winter '
+         'secret fire island summer girl man world star lost blood stone dream').split()
+SEARCH_WORDS = ('love', 'war', 'night', 'city', 'king', 'star wars', 'dark knight', 'summer', 'lost')
+
+# route name -> weight in the request mix
+DEFAULT_MIX = {'home': 30, 'search': 25, 'dashboard': 20, 'rate': 15, 'watchlist_add': 10}
+
+
+def connect(database=None):
+    load_dotenv()
+    return mysql.connector.connect(
+        host=os.getenv('DB_HOST'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        database=database or os.getenv('DB_NAME')
+    )
+
+
+def seed(args):
+    from werkzeug.security import generate_password_hash
+
+    rng = random.Random(args.seed)
+    conn = connect(args.database)
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT COUNT(*) FROM content")
+    existing = cursor.fetchone()[0]
+    if existing < args.catalog:
+        cursor.execute("SELECT COALESCE(MAX(content_id), 0) FROM content")
+        next_id = cursor.fetchone()[0] + 1
+        writer = InsertWriter(cursor, 'content',
+                              ('content_id', 'source_id', 'content_type', 'title', 'overview', 'release_year'))
+        for i in range(args.catalog - existing):
+            title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title()
+            overview = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(15, 40)))
+            writer.write((next_id + i, f"bench-{next_id + i}", rng.choice(('Movie', 'TV Show')),
+                          title, overview, rng.randint(1950, 2024)))
+        writer.close()
+        print(f"--> Added {args.catalog - existing} synthetic titles.")
+
+    cursor.execute("SELECT content_id FROM content")
+    content_ids = [row[0] for row in cursor.fetchall()]
+
+    # start from a clean set of benchmark users, their rows cascade away with them
+    cursor.execute("DELETE FROM users WHERE email LIKE %s", (BENCH_EMAIL.format('%'),))
+    password_hash = generate_password_hash(BENCH_PASSWORD, os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256'))
+    cursor.executemany("INSERT INTO users (email, password_hash) VALUES (%s, %s)",
+                       [(BENCH_EMAIL.format(i), password_hash) for i in range(args.users)])
+    cursor.execute("SELECT user_id FROM users WHERE email LIKE %s", (BENCH_EMAIL.format('%'),))
+    user_ids = [row[0] for row in cursor.fetchall()]
+
+    watchlist = InsertWriter(cursor, 'user_watchlist', ('user_id', 'content_id', 'added_at'))
+    ratings = InsertWriter(cursor, 'user_ratings', ('user_id', 'content_id', 'rating', 'created_at'))
+    searches = InsertWriter(cursor, 'search_history', ('user_id', 'search_query', 'searched_at'))
+    now = datetime.now()
+    for user_id in user_ids:
+        # a long tail: most users have a handful of items, some have hundreds
+        for content_id in rng.sample(content_ids, min(len(content_ids), int(rng.paretovariate(1.2) * 10))):
+            watchlist.write((user_id, content_id, now - timedelta(minutes=rng.randint(0, 500000))))
+        for content_id in rng.sample(content_ids, min(len(content_ids), int(rng.paretovariate(1.2) * 8))):
+            ratings.write((user_id, content_id, rng.randint(2, 10) / 2,
+                           now - timedelta(minutes=rng.randint(0, 500000))))
+        for _ in range(rng.randint(0, 20)):
+            searches.write((user_id, rng.choice(SEARCH_WORDS), now - timedelta(minutes=rng.randint(0, 500000))))
+    for writer in (watchlist, ratings, searches):
+        writer.close()
+
+    # the seeded rows bypass the routes, so bring the aggregates back in line
+    leaderboard.rebuild(cursor)
+    user_stats.rebuild(cursor)
+    conn.commit()
+    cursor.close()
+    conn.close()
+    print(f"--> Seeded {len(user_ids)} benchmark users.")
+
+
+class InProcessClient:
+    # drives the app through Flask's test client, one per virtual user
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self._client.open(path, method=method, data=data)
+        return response.status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    # drives a running server, keeping cookies per virtual user and not following redirects
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self._opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()), _NoRedirect)
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self._opener.open(req, timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as err:
+            return err.code
+
+
+def build_requests(rng, content_ids):
+    return {
+        'home': lambda: ('GET', '/', None),
+        'search': lambda: ('GET', '/search?' + urllib.parse.urlencode({'query': rng.choice(SEARCH_WORDS)}), None),
+        'dashboard': lambda: ('GET', '/dashboard', None),
+        'rate': lambda: ('POST', f"/rate/{rng.choice(content_ids)}", {'rating': str(rng.randint(2, 10) / 2)}),
+        'watchlist_add': lambda: ('POST', f"/watchlist/add/{rng.choice(content_ids)}", None),
+    }
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))]
+
+
+def run(args):
+    conn = connect(args.database)
+    cursor = conn.cursor()
+    cursor.execute("SELECT content_id FROM content")
+    content_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT COUNT(*) FROM users WHERE email LIKE %s", (BENCH_EMAIL.format('%'),))
+    user_count = cursor.fetchone()[0]
+    cursor.close()
+    conn.close()
+    if not user_count:
+        sys.exit("No benchmark users, run `load_test.py seed` first.")
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)
+    else:
+        if args.database:
+            os.environ['DB_NAME'] = args.database
+        from app import app
+        make_client = lambda: InProcessClient(app)
+
+    mix = dict(DEFAULT_MIX)
+    for item in args.mix or []:
+        name, weight = item.split('=')
+        mix[name] = int(weight)
+    routes = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in routes]
+
+    samples = {name: [] for name in routes}
+    errors = {name: 0 for name in routes}
+    lock = threading.Lock()
+    timing = {}
+
+    def start_clock():
+        # runs once every virtual user has logged in, before any of them is released
+        now = time.monotonic()
+        timing['record_from'] = now + args.warmup
+        timing['end'] = now + args.warmup + args.duration
+
+    start_barrier = threading.Barrier(args.concurrency + 1, action=start_clock)
+
+    def virtual_user(index):
+        rng = random.Random(args.seed + index)
+        client = make_client()
+        status = client.request('POST', '/login', {'email': BENCH_EMAIL.format(index % user_count),
+                                                   'password': BENCH_PASSWORD})
+        if status >= 400:
+            print(f"Virtual user {index} could not log in (HTTP {status}).")
+        requests = build_requests(rng, content_ids)
+        start_barrier.wait()
+        local_samples = {name: [] for name in routes}
+        local_errors = dict.fromkeys(routes, 0)
+        while time.monotonic() < timing['end']:
+            name = rng.choices(routes, weights)[0]
+            method, path, data = requests[name]()
+            started = time.perf_counter()
+            try:
+                status = client.request(method, path, data)
+            except Exception:
+                status = 599
+            elapsed = (time.perf_counter() - started) * 1000
+            # requests finishing in the warm-up window aren't recorded
+            if time.monotonic() >= timing['record_from']:
+                local_samples[name].append(elapsed)
+                if status >= 400:
+                    local_errors[name] += 1
+        with lock:
+            for name in routes:
+                samples[name].extend(local_samples[name])
+                errors[name] += local_errors[name]
+
+    threads = [threading.Thread(target=virtual_user, args=(i,), daemon=True) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    for thread in threads:
+        thread.join()
+
+    results = {}
+    for name in routes:
+        values = sorted(samples[name])
+        results[name] = {
+            'requests': len(values),
+            'errors': errors[name],
+            'rps': round(len(values) / args.duration, 2),
+            'p50_ms': round(percentile(values, 50), 2),
+            'p95_ms': round(percentile(values, 95), 2),
+            'p99_ms': round(percentile(values, 99), 2),
+        }
+    total = sum(r['requests'] for r in results.values())
+    report = {
+        'config': {'concurrency': args.concurrency, 'duration': args.duration,
+                   'target': args.url or 'in-process', 'mix': mix},
+        'total_rps': round(total / args.duration, 2),
+        'routes': results,
+    }
+
+    print(f"{'route':<15} {'reqs':>7} {'errors':>7} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, r in results.items():
+        print(f"{name:<15} {r['requests']:>7} {r['errors']:>7} {r['rps']:>8} "
+              f"{r['p50_ms']:>7}ms {r['p95_ms']:>7}ms {r['p99_ms']:>7}ms")
+    print(f"{'total':<15} {total:>7} {'':>7} {report['total_rps']:>8}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f"--> Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, report, args.max_regression, args.min_delta_ms)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"--> No regressions against {args.baseline}")
+
+
+def compare(baseline, report, max_regression, min_delta_ms):
+    """
+    Lists routes whose p95/p99 latency grew, or whose throughput shrank, by
+    more than `max_regression` (a fraction). Latency changes smaller than
+    `min_delta_ms` are ignored as noise.
+    """
+    regressions = []
+    for name, old in baseline['routes'].items():
+        new = report['routes'].get(name)
+        if new is None:
+            continue
+        for metric in ('p95_ms', 'p99_ms'):
+            if new[metric] > old[metric] * (1 + max_regression) and new[metric] - old[metric] >= min_delta_ms:
+                regressions.append(f"{name} {metric}: {old[metric]} -> {new[metric]}")
+        if old['rps'] and new['rps'] < old['rps'] * (1 - max_regression):
+            regressions.append(f"{name} rps: {old['rps']} -> {new['rps']}")
+        if new['errors'] > old['errors']:
+            regressions.append(f"{name} errors: {old['errors']} -> {new['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help="database to use instead of DB_NAME")
+    parser.add_argument('--seed', type=int, default=7, help="random seed")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = commands.add_parser('seed')
+    seed_parser.add_argument('--users', type=int, default=200)
+    seed_parser.add_argument('--catalog', type=int, default=5000, help="minimum number of titles")
+
+    run_parser = commands.add_parser('run')
+    run_parser.add_argument('--url', help="base URL of a running server, default is in-process")
+    run_parser.add_argument('--concurrency', type=int, default=16)
+    run_parser.add_argument('--duration', type=float, default=30, help="seconds measured")
+    run_parser.add_argument('--warmup', type=float, default=5, help="seconds run before measuring")
+    run_parser.add_argument('--mix', nargs='*', help="route weights, e.g. home=50 rate=0")
+    run_parser.add_argument('--save-baseline', metavar='FILE')
+    run_parser.add_argument('--baseline', metavar='FILE')
+    run_parser.add_argument('--max-regression', type=float, default=0.25)
+    run_parser.add_argument('--min-delta-ms', type=float, default=2.0)
+
+    args = parser.parse_args()
+    if args.command == 'seed':
+        seed(args)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
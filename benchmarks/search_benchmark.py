@@ -0,0 +1,105 @@
+"""
+Compares the in-process inverted index (search_engine.py) with the MySQL
+FULLTEXT query used by /search.
+
+usage: python benchmarks/search_benchmark.py [--queries N] [--repeat N] [query ...]
+
+Without explicit queries, words are sampled from content titles.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import mysql.connector
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from search_engine import SearchIndex, tokenize
+
+FULLTEXT_QUERY = """
+    SELECT content_id, title, release_year, content_type
+    FROM content
+    WHERE MATCH(title, overview) AGAINST(%s IN NATURAL LANGUAGE MODE)
+    LIMIT 50;
+"""
+
+def sample_queries(cursor, count, seed=42):
+    # one and two word queries built from real titles
+    cursor.execute("SELECT title FROM content")
+    words = sorted({w for (title,) in cursor.fetchall() for w in tokenize(title) if len(w) > 3})
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        n = 1 if i % 2 == 0 else 2
+        queries.append(' '.join(rng.sample(words, n)))
+    return queries
+
+def time_queries(run, queries, repeat):
+    timings = []
+    results = {}
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            results[query] = run(query)
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings, results
+
+def summarize(label, timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{label:<10} n={len(timings):<6} mean={statistics.mean(timings):8.3f}ms "
+          f"p50={statistics.median(timings):8.3f}ms p95={p95:8.3f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('queries', nargs='*')
+    parser.add_argument('--queries', dest='query_count', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    load_dotenv()
+    conn = mysql.connector.connect(
+        host=os.getenv('DB_HOST'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        database=os.getenv('DB_NAME')
+    )
+    cursor = conn.cursor(dictionary=True)
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.build(cursor)
+    print(f"--> Built inverted index in {(time.perf_counter() - start) * 1000:.0f}ms: {index.stats()}")
+
+    plain_cursor = conn.cursor()
+    queries = args.queries or sample_queries(plain_cursor, args.query_count)
+    plain_cursor.close()
+
+    def run_fulltext(query):
+        cursor.execute(FULLTEXT_QUERY, (query,))
+        return cursor.fetchall()
+
+    fulltext_timings, fulltext_results = time_queries(run_fulltext, queries, args.repeat)
+    inverted_timings, inverted_results = time_queries(lambda q: index.search(q, 50), queries, args.repeat)
+
+    summarize('fulltext', fulltext_timings)
+    summarize('inverted', inverted_timings)
+
+    # how similar the two result sets are (FULLTEXT and BM25 rank differently)
+    overlaps = []
+    for query in queries:
+        a = {row['content_id'] for row in fulltext_results[query]}
+        b = {row['content_id'] for row in inverted_results[query]}
+        if a or b:
+            overlaps.append(len(a & b) / len(a | b))
+    if overlaps:
+        print(f"--> Mean result overlap (Jaccard): {statistics.mean(overlaps):.2f}")
+
+    cursor.close()
+    conn.close()
+
+if __name__ == '__main__':
+    main()
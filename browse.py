@@ -0,0 +1,221 @@
+import re
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from itertools import islice
+
+from index_service import IndexService
+
+SET_BIT_RE = re.compile('1')
+
+CONTENT_QUERY = """
+    SELECT content_id, title, release_year, content_type
+    FROM content
+    ORDER BY title, content_id
+"""
+
+GENRES_QUERY = """
+    SELECT g.genre_id, g.genre_name, cg.content_id
+    FROM content_genres cg
+    JOIN genres g ON g.genre_id = cg.genre_id
+"""
+
+DIRECTORS_QUERY = """
+    SELECT d.director_id, d.director_name, cd.content_id
+    FROM content_directors cd
+    JOIN directors d ON d.director_id = cd.director_id
+"""
+
+def _rows(cursor):
+    return [row if isinstance(row, dict) else dict(zip(cursor.column_names, row))
+            for row in cursor.fetchall()]
+
+def _positions(bits, offset=0, limit=None):
+    # numbers of the set bits, lowest first, i.e. titles in alphabetical order
+    digits = bin(bits)[:1:-1]
+    stop = None if limit is None else offset + limit
+    return [match.start() for match in islice(SET_BIT_RE.finditer(digits), offset, stop)]
+
+
+class FacetIndex:
+    """
+    In-memory facets over the catalog for the browse pages.
+
+    Titles are numbered in title order, and every content type, genre,
+    release year and decade is a bitmap over those numbers held in a Python
+    int. Filtering is a handful of ANDs, a facet count is int.bit_count(),
+    and the set bits of the result come out already sorted by title.
+
+    Most directors have one or two titles, so they are kept as sorted arrays
+    of title numbers instead and only turned into a bitmap when filtered on.
+    """
+
+    def __init__(self, directors_shown=20):
+        self.directors_shown = directors_shown
+        # swapped in as one tuple so lookups never see a half-built index
+        self._index = None
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._index[0]) if self._index else 0
+
+    def build(self, cursor):
+        """
+        Loads titles, genres and directors from the database and rebuilds the index.
+        """
+        cursor.execute(CONTENT_QUERY)
+        content = _rows(cursor)
+        cursor.execute(GENRES_QUERY)
+        genres = _rows(cursor)
+        cursor.execute(DIRECTORS_QUERY)
+        directors = _rows(cursor)
+        self.build_from_rows(content, genres, directors)
+
+    def build_from_rows(self, content, genre_rows, director_rows):
+        docs = [{
+            'content_id': row['content_id'],
+            'title': row['title'],
+            'release_year': row['release_year'],
+            'content_type': row['content_type'],
+        } for row in content]
+        doc_by_content_id = {doc['content_id']: i for i, doc in enumerate(docs)}
+        everything = (1 << len(docs)) - 1
+
+        types = {}
+        years = {}
+        for i, doc in enumerate(docs):
+            types[doc['content_type']] = types.get(doc['content_type'], 0) | (1 << i)
+            if doc['release_year'] is not None:
+                year = int(doc['release_year'])
+                years[year] = years.get(year, 0) | (1 << i)
+
+        # year ranges: up_to[i] holds every title released in sorted_years[i] or earlier
+        sorted_years = sorted(years)
+        up_to = []
+        bits = 0
+        for year in sorted_years:
+            bits |= years[year]
+            up_to.append(bits)
+        decades = {}
+        for year, bits in years.items():
+            decades[year - year % 10] = decades.get(year - year % 10, 0) | bits
+
+        genres = {}
+        for row in genre_rows:
+            i = doc_by_content_id.get(row['content_id'])
+            if i is not None:
+                name, bits = genres.get(row['genre_id'], (row['genre_name'], 0))
+                genres[row['genre_id']] = (name, bits | (1 << i))
+
+        directors = {}
+        doc_directors = [()] * len(docs)
+        for row in director_rows:
+            i = doc_by_content_id.get(row['content_id'])
+            if i is not None:
+                directors.setdefault(row['director_id'], (row['director_name'], array('I')))[1].append(i)
+                doc_directors[i] += (row['director_id'],)
+        for _, numbers in directors.values():
+            numbers[:] = array('I', sorted(numbers))
+        # the unfiltered director list is the same on every visit
+        top_directors = Counter({director_id: len(numbers) for director_id, (_, numbers) in directors.items()})
+
+        self._index = (docs, everything, types, sorted_years, up_to, decades, genres,
+                       directors, doc_directors, top_directors)
+        self.built_at = time.time()
+
+    def browse(self, content_type=None, genre=None, director=None, year_from=None, year_to=None,
+               offset=0, limit=25):
+        """
+        Returns the page of titles matching every given filter, their total,
+        and the facet counts. Each facet is counted with every filter except
+        its own applied, so the page can offer switching to another value.
+        """
+        if self._index is None:
+            return {'total': 0, 'results': [], 'facets': {'content_type': [], 'genre': [],
+                                                         'director': [], 'decade': []}}
+        (docs, everything, types, sorted_years, up_to, decades, genres,
+         directors, doc_directors, top_directors) = self._index
+
+        filters = {}
+        if content_type is not None:
+            filters['content_type'] = types.get(content_type, 0)
+        if genre is not None:
+            filters['genre'] = genres.get(genre, (None, 0))[1]
+        if director is not None:
+            filters['director'] = sum(1 << i for i in directors.get(director, (None, ()))[1])
+        if year_from is not None or year_to is not None:
+            lo = bisect_left(sorted_years, year_from) if year_from is not None else 0
+            hi = bisect_right(sorted_years, year_to) - 1 if year_to is not None else len(sorted_years) - 1
+            filters['year'] = up_to[hi] & ~(up_to[lo - 1] if lo > 0 else 0) if lo <= hi else 0
+
+        def matching(skip=None):
+            bits = everything
+            for name, value in filters.items():
+                if name != skip:
+                    bits &= value
+            return bits
+
+        selected = matching()
+        results = [docs[i] for i in _positions(selected, offset, limit)]
+
+        by_type = matching('content_type')
+        by_genre = matching('genre')
+        by_decade = matching('year')
+        facets = {
+            'content_type': [(value, value, (by_type & bits).bit_count()) for value, bits in sorted(types.items())],
+            'genre': sorted(((genre_id, name, (by_genre & bits).bit_count())
+                             for genre_id, (name, bits) in genres.items()),
+                            key=lambda facet: (-facet[2], facet[1])),
+            'decade': [(decade, f"{decade}s", (by_decade & bits).bit_count())
+                       for decade, bits in sorted(decades.items(), reverse=True)],
+        }
+
+        by_director = matching('director')
+        if by_director == everything:
+            counts = top_directors
+        else:
+            counts = Counter()
+            for i in _positions(by_director):
+                counts.update(doc_directors[i])
+        facets['director'] = [(director_id, directors[director_id][0], count)
+                              for director_id, count in counts.most_common(self.directors_shown)]
+
+        # values with nothing left to show are left out, unless they are the ones selected
+        selected_values = {'content_type': content_type, 'genre': genre, 'director': director}
+        for name, values in facets.items():
+            facets[name] = [facet for facet in values
+                            if facet[2] or facet[0] == selected_values.get(name)]
+
+        return {'total': selected.bit_count(), 'results': results, 'facets': facets}
+
+    def name_of(self, facet, value):
+        # display name of a genre or director, for the page heading
+        if self._index is None:
+            return None
+        names = self._index[6] if facet == 'genre' else self._index[7]
+        return names.get(value, (None,))[0]
+
+
+class BrowseService(IndexService):
+    """
+    Holds a FacetIndex and rebuilds it on a background thread once it is
+    older than `refresh_seconds`, so catalog changes show up.
+    """
+
+    description = 'browse facets'
+
+    def __init__(self, get_connection, directors_shown=20, refresh_seconds=600):
+        super().__init__(get_connection, refresh_seconds)
+        self.index = FacetIndex(directors_shown=directors_shown)
+
+    def browse(self, **filters):
+        """
+        FacetIndex.browse(), or None when the facets could not be built.
+        """
+        if not self.ensure_fresh():
+            return None
+        return self.index.browse(**filters)
+
+    def build(self, cursor):
+        self.index.build(cursor)
@@ -0,0 +1,363 @@
+import csv
+import io
+import json
+import time
+import unicodedata
+from decimal import Decimal, ROUND_HALF_UP
+
+import leaderboard
+import user_stats
+from autocomplete import normalize_title, LEADING_ARTICLES
+from index_service import IndexService
+
+TITLES_QUERY = "SELECT content_id, title, release_year, content_type FROM content"
+
+# accepted column names, the first ones are what /export writes, the others
+# what other services commonly put in their exports (matched case-insensitively)
+COLUMN_ALIASES = {
+    'content_id': ('content_id',),
+    'title': ('title', 'name', 'primary title', 'original title'),
+    'year': ('release_year', 'year', 'release year'),
+    'content_type': ('content_type', 'type', 'title type'),
+    'rating': ('rating', 'your rating', 'my rating'),
+}
+
+CONTENT_TYPES = {
+    'movie': 'Movie',
+    'film': 'Movie',
+    'tv show': 'TV Show',
+    'tv series': 'TV Show',
+    'tvseries': 'TV Show',
+    'tv mini series': 'TV Show',
+    'tvminiseries': 'TV Show',
+    'series': 'TV Show',
+}
+
+IMPORT_TARGETS = ('watchlist', 'ratings')
+
+
+class ImportFileError(Exception):
+    """
+    Raised when an uploaded file can't be read at all (unknown columns, bad
+    encoding, too many rows). Problems with single rows end up in the report.
+    """
+
+
+def match_key(title):
+    """
+    normalize_title() that also drops accents and a leading article, so
+    'The Amélie' and 'amelie' land on the same key.
+    """
+    text = unicodedata.normalize('NFKD', title or '')
+    key = normalize_title(''.join(char for char in text if not unicodedata.combining(char)))
+    for article in LEADING_ARTICLES:
+        if key.startswith(article):
+            return key[len(article):]
+    return key
+
+
+class TitleIndex:
+    """
+    Every title in the catalog by match_key(), for matching uploaded
+    title/year pairs without a query per row.
+    """
+
+    def __init__(self):
+        # swapped in as one tuple so lookups never see a half-built index
+        self._index = ({}, {})
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._index[1])
+
+    def build(self, cursor):
+        cursor.execute(TITLES_QUERY)
+        rows = [row if isinstance(row, dict) else dict(zip(cursor.column_names, row))
+                for row in cursor.fetchall()]
+        self.build_from_rows(rows)
+
+    def build_from_rows(self, rows):
+        by_key, by_id = {}, {}
+        for row in rows:
+            doc = {
+                'content_id': row['content_id'],
+                'title': row['title'],
+                'release_year': row['release_year'],
+                'content_type': row['content_type'],
+            }
+            by_id[doc['content_id']] = doc
+            key = match_key(doc['title'])
+            if key:
+                by_key.setdefault(key, []).append(doc)
+        self._index = (by_key, by_id)
+        self.built_at = time.time()
+
+    def get(self, content_id):
+        return self._index[1].get(content_id)
+
+    def match(self, title, year=None, content_type=None):
+        """
+        Returns the titles an uploaded entry could be: one is a match,
+        several are ambiguous, none means it is missing from the catalog.
+        The year may be off by one (services disagree on festival vs
+        release dates) when no title has the exact year.
+        """
+        candidates = self._index[0].get(match_key(title), [])
+        if content_type is not None:
+            candidates = [doc for doc in candidates if doc['content_type'] == content_type]
+        if year is None:
+            return candidates
+        exact = [doc for doc in candidates if doc['release_year'] == year]
+        if exact:
+            return exact
+        return [doc for doc in candidates
+                if doc['release_year'] is not None and abs(doc['release_year'] - year) <= 1]
+
+
+class TitleIndexService(IndexService):
+    """
+    Holds a TitleIndex and rebuilds it on a background thread once it is
+    older than `refresh_seconds`, so newly added titles can be matched.
+    """
+
+    description = 'title index'
+
+    def __init__(self, get_connection, refresh_seconds=600):
+        super().__init__(get_connection, refresh_seconds)
+        self.index = TitleIndex()
+
+    def get(self):
+        """
+        Returns the index, or None when it has never been built and
+        building it failed.
+        """
+        if not self.ensure_fresh():
+            return None
+        return self.index
+
+    def build(self, cursor):
+        self.index.build(cursor)
+
+
+def read_upload(stream, filename, max_rows):
+    """
+    Reads an uploaded CSV file (with a header row) or, for a .jsonl/.json
+    file name, JSON lines. Returns a list of entries, dictionaries with
+    the COLUMN_ALIASES keys plus the entry's line number.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    entries = []
+    try:
+        if filename.lower().endswith(('.jsonl', '.json')):
+            for number, line in enumerate(text, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    raise ImportFileError(f"Line {number} is not valid JSON.")
+                if not isinstance(record, dict):
+                    raise ImportFileError(f"Line {number} is not a JSON object.")
+                entries.append(_entry(number, {str(key).strip().lower(): value for key, value in record.items()}))
+                if len(entries) > max_rows:
+                    raise ImportFileError(f"Files can have at most {max_rows} rows.")
+        else:
+            reader = csv.reader(text)
+            header = [column.strip().lower() for column in next(reader, [])]
+            if not any(alias in header for alias in COLUMN_ALIASES['title'] + COLUMN_ALIASES['content_id']):
+                raise ImportFileError("The file needs a 'title' (or 'content_id') column.")
+            for row in reader:
+                if not any(value.strip() for value in row):
+                    continue
+                entries.append(_entry(reader.line_num, dict(zip(header, row))))
+                if len(entries) > max_rows:
+                    raise ImportFileError(f"Files can have at most {max_rows} rows.")
+    except UnicodeDecodeError:
+        raise ImportFileError("The file must be UTF-8 encoded.")
+    except csv.Error as err:
+        raise ImportFileError(f"The file is not valid CSV: {err}")
+    finally:
+        # the upload stream belongs to the request, don't close it with the wrapper
+        text.detach()
+    return entries
+
+
+def _entry(line, record):
+    entry = {'line': line}
+    for field, aliases in COLUMN_ALIASES.items():
+        value = next((record[alias] for alias in aliases if alias in record), None)
+        # JSON lines can hold numbers where CSV has text: 1984 as a title, 1999.0 as a year
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        if value is not None and not isinstance(value, str):
+            value = str(value)
+        if isinstance(value, str):
+            value = value.strip()
+        entry[field] = None if value in (None, '') else value
+    return entry
+
+
+def _parse_int(value):
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        return None
+
+
+def parse_rating(value, scale=5):
+    """
+    Turns an uploaded rating on a 1-`scale` scale into the app's 1.0-5.0
+    scale, rounded to one decimal like DECIMAL(3,1). Returns None when it
+    isn't a number in range.
+    """
+    # 'nan', 'inf' and huge exponents are numbers to Decimal, but not ratings
+    try:
+        rating = Decimal(str(value).strip())
+        if not rating.is_finite():
+            return None
+        rating = (rating * 5 / scale).quantize(Decimal('0.1'), rounding=ROUND_HALF_UP)
+    except ArithmeticError:
+        return None
+    if not Decimal('1.0') <= rating <= Decimal('5.0'):
+        return None
+    return rating
+
+
+def plan_import(index, entries, target, rating_scale=5):
+    """
+    Matches every entry against the title index. Returns the report shown
+    to the user: what matched, what was ambiguous (with the candidates),
+    what is missing and what couldn't be read, plus what to write
+    ('content_ids' for the watchlist, 'ratings' {content_id: rating}, on the
+    app's scale).
+    """
+    report = {
+        'target': target,
+        'rows': len(entries),
+        'matched': [],
+        'ambiguous': [],
+        'missing': [],
+        'invalid': [],
+        'duplicates': 0,
+        'content_ids': [],
+        'ratings': {},
+        'ratings_by_line': {},
+        'written': 0,
+        'added': 0,
+        'batches': 0,
+        'error': None,
+    }
+    seen = set()
+    for entry in entries:
+        if target == 'ratings':
+            if entry['rating'] is None:
+                report['invalid'].append((entry, "no rating"))
+                continue
+            rating = parse_rating(entry['rating'], rating_scale)
+            if rating is None:
+                report['invalid'].append((entry, f"rating must be between 1 and {rating_scale}"))
+                continue
+            report['ratings_by_line'][entry['line']] = rating
+
+        year = None
+        if entry['year'] is not None:
+            year = _parse_int(entry['year'])
+            if year is None:
+                report['invalid'].append((entry, "year is not a number"))
+                continue
+
+        if entry['content_id'] is not None:
+            content_id = _parse_int(entry['content_id'])
+            doc = index.get(content_id) if content_id is not None else None
+            candidates = [doc] if doc else []
+        elif entry['title'] is not None:
+            content_type = CONTENT_TYPES.get(str(entry['content_type'] or '').strip().lower())
+            candidates = index.match(entry['title'], year, content_type)
+        else:
+            report['invalid'].append((entry, "no title"))
+            continue
+
+        if not candidates:
+            report['missing'].append(entry)
+            continue
+        if len(candidates) > 1:
+            report['ambiguous'].append((entry, candidates))
+            continue
+
+        content = candidates[0]
+        report['matched'].append((entry, content))
+        if content['content_id'] in seen:
+            # the same title twice, for ratings the last one wins
+            report['duplicates'] += 1
+        else:
+            seen.add(content['content_id'])
+            report['content_ids'].append(content['content_id'])
+        if target == 'ratings':
+            report['ratings'][content['content_id']] = rating
+    return report
+
+
+def _log_batch(cursor, user_id, action_type, item_count):
+    # one audit row per batch instead of one per title
+    cursor.execute(
+        "INSERT INTO action_log (user_id, action_type, target_id, item_count) VALUES (%s, %s, NULL, %s)",
+        (user_id, action_type, item_count)
+    )
+
+
+def write_watchlist(conn, user_id, content_ids, batch_size=500):
+    """
+    Adds `content_ids` to a user's watchlist in transactions of `batch_size`
+    titles: one multi-row upsert, the user's counter and one action_log row
+    per batch. Yields {'written', 'added'} after each commit, so a failure
+    part way leaves the earlier batches in place and accounted for.
+    """
+    cursor = conn.cursor()
+    try:
+        for start in range(0, len(content_ids), batch_size):
+            chunk = sorted(content_ids[start:start + batch_size])
+            placeholders = ', '.join(['%s'] * len(chunk))
+            # lock what is already there so the counter only counts the new rows
+            cursor.execute(
+                f"SELECT content_id FROM user_watchlist WHERE user_id = %s AND content_id IN ({placeholders}) FOR UPDATE",
+                [user_id] + chunk
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            added = [content_id for content_id in chunk if content_id not in existing]
+            if added:
+                cursor.execute(f"""
+                    INSERT INTO user_watchlist (user_id, content_id)
+                    VALUES {', '.join(['(%s, %s)'] * len(added))}
+                    ON DUPLICATE KEY UPDATE added_at = added_at
+                """, [value for content_id in added for value in (user_id, content_id)])
+                user_stats.apply(cursor, user_id, watchlist_count=len(added))
+            _log_batch(cursor, user_id, 'USER_IMPORTED_WATCHLIST', len(added))
+            conn.commit()
+            yield {'written': len(chunk), 'added': len(added)}
+    finally:
+        cursor.close()
+
+
+def write_ratings(conn, user_id, ratings, batch_size=500):
+    """
+    Writes {content_id: rating} for a user in transactions of `batch_size`
+    titles through leaderboard.save_ratings(), keeping content_rating_stats
+    and the user's counters in step, with one action_log row per batch.
+    Yields {'written', 'added', 'changed'} after each commit, 'changed' being
+    the titles whose rating totals moved, for the in-memory ranking.
+    """
+    cursor = conn.cursor()
+    content_ids = list(ratings)
+    try:
+        for start in range(0, len(content_ids), batch_size):
+            chunk = content_ids[start:start + batch_size]
+            changes = leaderboard.save_ratings(cursor, user_id, {content_id: ratings[content_id] for content_id in chunk})
+            added = [change for change in changes if change[1] is None]
+            rating_sum = sum((new - old if old is not None else new for _, old, new in changes), Decimal(0))
+            user_stats.apply(cursor, user_id, rating_count=len(added), rating_sum=rating_sum)
+            changed = [content_id for content_id, old, new in changes if old != new]
+            _log_batch(cursor, user_id, 'USER_IMPORTED_RATINGS', len(changed))
+            conn.commit()
+            yield {'written': len(chunk), 'added': len(added), 'changed': changed}
+    finally:
+        cursor.close()
@@ -0,0 +1,167 @@
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from ingest import ingest_catalog
+
+# rows per multi-row INSERT statement
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class StageTimer:
+    """
+    Times each stage of a load and prints a summary at the end.
+    """
+
+    def __init__(self):
+        self.timings = []
+
+    @contextmanager
+    def stage(self, name):
+        print(f"--> [{name}] ...")
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        self.timings.append((name, elapsed))
+        print(f"--> [{name}] done in {elapsed:.2f}s")
+
+    def summary(self):
+        total = sum(elapsed for _, elapsed in self.timings)
+        print("--- [LOAD TIMINGS] ---")
+        for name, elapsed in self.timings:
+            print(f"    {name:<32} {elapsed:8.2f}s")
+        print(f"    {'total':<32} {total:8.2f}s")
+
+
+@contextmanager
+def deferred_checks(cursor):
+    """
+    Turns off foreign key and unique checks for the session while bulk
+    loading. The IDs are generated consistently up front, so the checks
+    would only slow the load down.
+    """
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+    cursor.execute("SET UNIQUE_CHECKS = 0")
+    try:
+        yield
+    finally:
+        cursor.execute("SET UNIQUE_CHECKS = 1")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+
+
+class InsertWriter:
+    """
+    Buffers rows for one table and writes them with a multi-row INSERT every
+    `chunk_size` rows (executemany turns INSERT ... VALUES into one statement).
+    Parent writers are flushed first so foreign keys are always satisfied.
+    With `update_columns` rows that hit an existing key update those columns
+    instead (INSERT ... ON DUPLICATE KEY UPDATE).
+    """
+
+    def __init__(self, cursor, table, columns, chunk_size=DEFAULT_CHUNK_SIZE, update_columns=()):
+        self.cursor = cursor
+        self.chunk_size = chunk_size
+        self.parents = []
+        self.sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        if update_columns:
+            self.sql += " ON DUPLICATE KEY UPDATE " + ', '.join(f"{c} = VALUES({c})" for c in update_columns)
+        self._rows = []
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        for parent in self.parents:
+            parent.flush()
+        self.cursor.executemany(self.sql, self._rows)
+        self._rows = []
+
+    def close(self):
+        self.flush()
+
+
+class LoadDataWriter:
+    """
+    Streams rows for one table into a tab separated staging file and loads it
+    with LOAD DATA LOCAL INFILE on flush, so memory stays flat however big
+    the table is.
+    """
+
+    def __init__(self, cursor, table, columns):
+        self.cursor = cursor
+        self.table = table
+        self.columns = columns
+        self.parents = []
+        self._file = None
+        self._pending = 0
+
+    def write(self, row):
+        if self._file is None:
+            self._file = tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix=f'_{self.table}.tsv',
+                                                     delete=False, newline='')
+        self._file.write('\t'.join(_staging_value(value) for value in row))
+        self._file.write('\n')
+        self._pending += 1
+
+    def flush(self):
+        if not self._pending:
+            return
+        for parent in self.parents:
+            parent.flush()
+        self._file.close()
+        try:
+            # tab separated, with MySQL's default escaping and \N for NULL
+            self.cursor.execute(f"""
+                LOAD DATA LOCAL INFILE %s INTO TABLE {self.table}
+                CHARACTER SET utf8mb4
+                FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+                LINES TERMINATED BY '\\n'
+                ({', '.join(self.columns)})
+            """, (self._file.name,))
+        finally:
+            os.remove(self._file.name)
+            self._file = None
+            self._pending = 0
+
+    def close(self):
+        self.flush()
+
+
+def _staging_value(value):
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def bulk_populate(cursor, data_dir='data', load_data=False, chunk_size=DEFAULT_CHUNK_SIZE, workers=1):
+    """
+    Streams the catalog in with the ingest pipeline (see ingest.py) while
+    foreign key/unique checks are off and the FULLTEXT index is dropped.
+    Rows go through multi-row INSERTs, or LOAD DATA LOCAL INFILE when
+    load_data is set.
+    """
+    timer = StageTimer()
+
+    if load_data:
+        writer_factory = lambda table, columns: LoadDataWriter(cursor, table, columns)
+    else:
+        writer_factory = lambda table, columns: InsertWriter(cursor, table, columns, chunk_size)
+
+    # the FULLTEXT index is built once at the end instead of row by row
+    with timer.stage('drop FULLTEXT index'):
+        cursor.execute("ALTER TABLE content DROP INDEX title")
+
+    with deferred_checks(cursor):
+        counts = ingest_catalog(cursor, writer_factory, data_dir, timer, workers)
+
+    with timer.stage('rebuild FULLTEXT index'):
+        cursor.execute("ALTER TABLE content ADD FULLTEXT title (title, overview)")
+
+    timer.summary()
+    return counts
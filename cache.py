@@ -0,0 +1,236 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryBackend:
+    """
+    In-process LRU store. Each worker process gets its own copy.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            # evict the least recently used entries
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+
+class SQLiteBackend:
+    """
+    Local shared store backed by a SQLite file, so every worker process on
+    the same machine (and setup_database.py) sees the same entries.
+    Values are pickled; LRU order is tracked with a last_access column.
+    """
+
+    def __init__(self, path, max_entries=1024, table='cache_entries'):
+        self.path = path
+        self.max_entries = max_entries
+        self.table = table
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                key         TEXT PRIMARY KEY,
+                value       BLOB NOT NULL,
+                expires_at  REAL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_lru ON {table} (last_access)")
+
+    def _conn(self):
+        # sqlite connections can't be shared across threads, keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute(
+            f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= now:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            return None
+        conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+        return pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        conn = self._conn()
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+            (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expires_at, now)
+        )
+        # evict the least recently used entries past the limit
+        conn.execute(f"""
+            DELETE FROM {self.table} WHERE key IN (
+                SELECT key FROM {self.table} ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+
+    def delete(self, key):
+        self._conn().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix):
+        escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        self._conn().execute(
+            f"DELETE FROM {self.table} WHERE key LIKE ? ESCAPE '\\'", (escaped + '%',)
+        )
+
+    def clear(self):
+        self._conn().execute(f"DELETE FROM {self.table}")
+
+    def keys(self):
+        return [row[0] for row in self._conn().execute(f"SELECT key FROM {self.table}")]
+
+
+class Cache:
+    """
+    TTL cache in front of a pluggable backend, with explicit invalidation
+    and hit/miss counters per namespace (the part of the key before ':').
+    `None` is never cached, so a `None` from get() always means a miss.
+    """
+
+    def __init__(self, backend, default_ttl=60):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as err:
+            # a broken cache should never take a page down
+            print(f"Cache read failed for '{key}': {err}")
+            value = None
+        self._count(key, 'hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key, value, ttl=None):
+        if value is None:
+            return
+        try:
+            self.backend.set(key, value, ttl if ttl is not None else self.default_ttl)
+        except Exception as err:
+            print(f"Cache write failed for '{key}': {err}")
+
+    def get_or_set(self, key, loader, ttl=None):
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key):
+        self._safe(self.backend.delete, key)
+        self._count(key, 'invalidations')
+
+    def invalidate_prefix(self, prefix):
+        self._safe(self.backend.delete_prefix, prefix)
+        self._count(prefix, 'invalidations')
+
+    def clear(self):
+        self._safe(self.backend.clear)
+
+    def stats(self):
+        """
+        Returns {namespace: {'hits', 'misses', 'invalidations', 'hit_rate'}}
+        for this process.
+        """
+        with self._lock:
+            stats = {}
+            for namespace, counters in self._counters.items():
+                lookups = counters['hits'] + counters['misses']
+                stats[namespace] = dict(counters, hit_rate=round(counters['hits'] / lookups, 3) if lookups else 0.0)
+            return stats
+
+    def _count(self, key, counter):
+        namespace = key.split(':', 1)[0]
+        with self._lock:
+            counters = self._counters.setdefault(namespace, {'hits': 0, 'misses': 0, 'invalidations': 0})
+            counters[counter] += 1
+
+    def _safe(self, func, *args):
+        try:
+            func(*args)
+        except Exception as err:
+            print(f"Cache invalidation failed: {err}")
+
+
+def cache_from_env(name=None):
+    """
+    Builds the cache described by CACHE_BACKEND ('memory' or 'sqlite'),
+    CACHE_PATH, CACHE_MAX_ENTRIES and CACHE_DEFAULT_TTL.
+
+    A named cache (e.g. 'search') gets its own entries, so it can't evict
+    anyone else's, and reads its size and TTL from <NAME>_CACHE_MAX_ENTRIES
+    and <NAME>_CACHE_TTL when they are set.
+    """
+    backend_name = os.getenv('CACHE_BACKEND', 'memory').lower()
+    max_entries = int(os.getenv('CACHE_MAX_ENTRIES', 1024))
+    default_ttl = int(os.getenv('CACHE_DEFAULT_TTL', 60))
+    table = 'cache_entries'
+    if name:
+        max_entries = int(os.getenv(f'{name.upper()}_CACHE_MAX_ENTRIES', max_entries))
+        default_ttl = int(os.getenv(f'{name.upper()}_CACHE_TTL', default_ttl))
+        table = f'{name}_cache_entries'
+
+    if backend_name == 'sqlite':
+        backend = SQLiteBackend(os.getenv('CACHE_PATH', 'cache.sqlite3'), max_entries=max_entries, table=table)
+    elif backend_name == 'memory':
+        backend = MemoryBackend(max_entries=max_entries)
+    else:
+        raise ValueError(f"Unknown CACHE_BACKEND '{backend_name}', expected 'memory' or 'sqlite'.")
+
+    return Cache(backend, default_ttl=default_ttl)
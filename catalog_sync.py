@@ -0,0 +1,257 @@
+from contextlib import nullcontext
+
+from bulk_load import DEFAULT_CHUNK_SIZE, InsertWriter
+from ingest import catalog_records, content_hash, movie_content, show_content
+import user_stats
+
+CONTENT_COLUMNS = ('content_id', 'content_type', 'title', 'overview', 'release_year', 'source_id', 'content_hash')
+
+# bridge table, its dimension column, and the dimension table it points at
+BRIDGES = {
+    'Movie': ('content_genres', 'genre_id', 'genres'),
+    'TV Show': ('content_directors', 'director_id', 'directors'),
+}
+
+
+class SyncAborted(Exception):
+    pass
+
+
+def ensure_hash_column(cursor):
+    """
+    Adds content.content_hash to databases created before it existed. Rows
+    without a hash are treated as changed, so the first sync fills them in.
+    """
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = 'content' AND column_name = 'content_hash'
+    """)
+    if not cursor.fetchone()[0]:
+        cursor.execute("ALTER TABLE content ADD COLUMN content_hash CHAR(32) NULL")
+
+
+class CatalogSync:
+    """
+    Receives the same record stream as CatalogSinks (ingest.py), but diffs it
+    against what is already in the database instead of loading from scratch.
+
+    Existing titles are matched on source_id and skipped when their stored
+    content_hash is unchanged. New and changed titles are upserted, and only
+    the bridge rows of changed titles are compared and rewritten. Genres and
+    directors are matched by name. Whatever was not seen in the files is
+    reported by removed_content_ids().
+    """
+
+    def __init__(self, cursor, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.cursor = cursor
+        self.chunk_size = chunk_size
+
+        cursor.execute("SELECT source_id, content_id, content_hash FROM content")
+        self.existing = {source_id: (content_id, stored_hash) for source_id, content_id, stored_hash in cursor}
+        self.dimension_ids = {}
+        self.next_ids = {}
+        for table, id_column, name_column in (('genres', 'genre_id', 'genre_name'),
+                                              ('directors', 'director_id', 'director_name')):
+            cursor.execute(f"SELECT {name_column}, {id_column} FROM {table}")
+            self.dimension_ids[table] = dict(cursor.fetchall())
+            self.next_ids[table] = max(self.dimension_ids[table].values(), default=0) + 1
+        self.next_ids['content'] = max((cid for cid, _ in self.existing.values()), default=0) + 1
+
+        self.writers = {
+            'genres': InsertWriter(cursor, 'genres', ('genre_id', 'genre_name'), chunk_size),
+            'directors': InsertWriter(cursor, 'directors', ('director_id', 'director_name'), chunk_size),
+            'content': InsertWriter(cursor, 'content', CONTENT_COLUMNS, chunk_size,
+                                    update_columns=CONTENT_COLUMNS[1:]),
+            'award_staging': InsertWriter(cursor, 'award_staging', ('source_id', 'year', 'category'), chunk_size),
+        }
+        self.seen_source_ids = set()
+        # content_id -> (content_type, dimension ids) for every new or changed title
+        self.bridge_updates = {}
+        self.new_content_ids = set()
+        self.counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0,
+                       'bridges_added': 0, 'bridges_removed': 0, 'awards_added': 0, 'awards_removed': 0}
+
+    def add_movie(self, movie):
+        self._sync_content(*movie_content(movie))
+
+    def add_show(self, show):
+        self._sync_content(*show_content(show))
+
+    def add_award(self, award):
+        self.writers['award_staging'].write((str(award.tmdb_id), award.year, award.category))
+
+    def _sync_content(self, source_id, row, names):
+        # first occurrence of a source id wins, same as a full load
+        if source_id in self.seen_source_ids:
+            return
+        self.seen_source_ids.add(source_id)
+
+        new_hash = content_hash(*row, names)
+        content_id, stored_hash = self.existing.get(source_id, (None, None))
+        if stored_hash == new_hash:
+            self.counts['unchanged'] += 1
+            return
+
+        if content_id is None:
+            content_id = self.next_ids['content']
+            self.next_ids['content'] += 1
+            self.new_content_ids.add(content_id)
+            self.counts['inserted'] += 1
+        else:
+            self.counts['updated'] += 1
+
+        self.writers['content'].write((content_id,) + row + (source_id, new_hash))
+        dimension = BRIDGES[row[0]][2]
+        self.bridge_updates[content_id] = (row[0], {self._dimension_id(dimension, name) for name in names})
+
+    def _dimension_id(self, table, name):
+        ids = self.dimension_ids[table]
+        dim_id = ids.get(name)
+        if dim_id is None:
+            dim_id = ids[name] = self.next_ids[table]
+            self.next_ids[table] += 1
+            self.writers[table].write((dim_id, name))
+        return dim_id
+
+    def removed_content_ids(self):
+        return [content_id for source_id, (content_id, _) in self.existing.items()
+                if source_id not in self.seen_source_ids]
+
+    def close(self):
+        """
+        Writes the buffered rows, then brings the bridges of new and changed
+        titles in line by adding and removing only the pairs that differ.
+        """
+        for writer in self.writers.values():
+            writer.close()
+
+        chunk_size = self.chunk_size
+        changed = [cid for cid in self.bridge_updates if cid not in self.new_content_ids]
+        stored = {}
+        for start in range(0, len(changed), chunk_size):
+            chunk = changed[start:start + chunk_size]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            for table, id_column, _ in BRIDGES.values():
+                self.cursor.execute(f"SELECT content_id, {id_column} FROM {table} WHERE content_id IN ({placeholders})",
+                                    chunk)
+                for content_id, dim_id in self.cursor.fetchall():
+                    stored.setdefault((table, content_id), set()).add(dim_id)
+
+        additions, removals = {}, {}
+        for content_id, (content_type, wanted) in self.bridge_updates.items():
+            table, _, _ = BRIDGES[content_type]
+            # a title that switched type keeps nothing in the other bridge
+            for other_table, _, _ in BRIDGES.values():
+                have = stored.get((other_table, content_id), set())
+                want = wanted if other_table == table else set()
+                additions.setdefault(other_table, []).extend((content_id, d) for d in want - have)
+                removals.setdefault(other_table, []).extend((content_id, d) for d in have - want)
+
+        for table, id_column, _ in BRIDGES.values():
+            if removals.get(table):
+                self.cursor.executemany(f"DELETE FROM {table} WHERE content_id = %s AND {id_column} = %s",
+                                        removals[table])
+                self.counts['bridges_removed'] += len(removals[table])
+            writer = InsertWriter(self.cursor, table, ('content_id', id_column), chunk_size)
+            for pair in sorted(additions.get(table, ())):
+                writer.write(pair)
+            writer.close()
+            self.counts['bridges_added'] += len(additions.get(table, ()))
+
+
+def sync_catalog(cursor, data_dir='data', timer=None, workers=1, allow_mass_delete=False,
+                 max_delete_fraction=0.2):
+    """
+    Brings an existing catalog in line with the source files without touching
+    user data: new titles are inserted, changed ones updated, unchanged ones
+    skipped by hash, and titles that disappeared from the files are deleted
+    (their ratings, watchlist entries and awards go with them).
+
+    If more than `max_delete_fraction` of the catalog would be deleted the
+    sync stops with SyncAborted before deleting anything, since that usually
+    means a truncated source file; pass allow_mass_delete=True to go ahead.
+    Returns the counts of what changed.
+    """
+    stage = timer.stage if timer else (lambda name: nullcontext())
+
+    ensure_hash_column(cursor)
+    cursor.execute("""
+        CREATE TEMPORARY TABLE IF NOT EXISTS award_staging (
+            seq         INT AUTO_INCREMENT PRIMARY KEY,
+            source_id   VARCHAR(50) NOT NULL,
+            year        INT NOT NULL,
+            category    VARCHAR(255) NOT NULL
+        )
+    """)
+    cursor.execute("TRUNCATE TABLE award_staging")
+
+    with stage('load current catalog'):
+        sync = CatalogSync(cursor)
+
+    with stage('diff source files'):
+        for method, record in catalog_records(data_dir, workers):
+            getattr(sync, method)(record)
+
+    removed = sync.removed_content_ids()
+    if removed and not allow_mass_delete and len(removed) > max_delete_fraction * len(sync.existing):
+        raise SyncAborted(f"{len(removed)} of {len(sync.existing)} titles would be deleted, "
+                          f"re-run with --allow-mass-delete if that is intended.")
+
+    with stage('write changes'):
+        sync.close()
+
+    with stage('delete removed titles'):
+        # the watchlist entries and ratings of removed titles cascade away, so their users' counters change
+        affected_users = set()
+        for start in range(0, len(removed), DEFAULT_CHUNK_SIZE):
+            chunk = removed[start:start + DEFAULT_CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"""
+                SELECT user_id FROM user_watchlist WHERE content_id IN ({placeholders})
+                UNION SELECT user_id FROM user_ratings WHERE content_id IN ({placeholders})
+                UNION SELECT user_id FROM content_reports WHERE content_id IN ({placeholders})
+            """, chunk * 3)
+            affected_users.update(row[0] for row in cursor.fetchall())
+            cursor.execute(f"DELETE FROM content WHERE content_id IN ({placeholders})", chunk)
+            sync.counts['deleted'] += cursor.rowcount
+        user_stats.recount(cursor, sorted(affected_users))
+        # genres and directors nothing points at anymore
+        cursor.execute("""
+            DELETE g FROM genres g
+            LEFT JOIN content_genres cg ON cg.genre_id = g.genre_id
+            WHERE cg.genre_id IS NULL
+        """)
+        cursor.execute("""
+            DELETE d FROM directors d
+            LEFT JOIN content_directors cd ON cd.director_id = d.director_id
+            WHERE cd.director_id IS NULL
+        """)
+
+    with stage('sync awards'):
+        # awards are keyed by (title, year, category); drop the ones no longer in the file, add the new ones
+        cursor.execute("""
+            DELETE a FROM awards a
+            WHERE NOT EXISTS (
+                SELECT 1 FROM award_staging s
+                JOIN content c ON c.source_id = s.source_id AND c.content_type = 'Movie'
+                WHERE c.content_id = a.content_id AND s.year = a.year AND s.category = a.category
+            )
+        """)
+        sync.counts['awards_removed'] = cursor.rowcount
+        cursor.execute("""
+            INSERT INTO awards (content_id, year, category)
+            SELECT c.content_id, s.year, s.category
+            FROM award_staging s
+            JOIN content c ON c.source_id = s.source_id AND c.content_type = 'Movie'
+            WHERE NOT EXISTS (
+                SELECT 1 FROM awards a
+                WHERE a.content_id = c.content_id AND a.year = s.year AND a.category = s.category
+            )
+            ORDER BY s.seq
+        """)
+        sync.counts['awards_added'] = cursor.rowcount
+        cursor.execute("DROP TEMPORARY TABLE award_staging")
+
+    for name, count in sync.counts.items():
+        print(f"--> {name}: {count}")
+    return sync.counts
@@ -0,0 +1,366 @@
+import math
+import os
+import re
+import sys
+import threading
+
+import mysql.connector
+from dotenv import load_dotenv
+
+from bulk_import import match_key, TITLES_QUERY
+from index_service import IndexService
+
+# requests for the same title, however it was spelled, collapse into one group;
+# request_count is the number of distinct users asking for it
+GROUPS_TABLE = """
+    CREATE TABLE IF NOT EXISTS content_request_groups (
+        group_id            INT AUTO_INCREMENT PRIMARY KEY,
+        title               VARCHAR(255) NOT NULL,
+        title_key           VARCHAR(255) NOT NULL,
+        status              ENUM('Pending', 'Added', 'Rejected') NOT NULL DEFAULT 'Pending',
+        request_count       INT NOT NULL DEFAULT 0,
+        first_requested_at  TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        last_requested_at   TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY uq_request_groups_key (title_key),
+        INDEX idx_request_groups_demand (status, request_count, last_requested_at)
+    )
+"""
+
+MOST_REQUESTED_QUERY = """
+    SELECT group_id, title, status, request_count, first_requested_at, last_requested_at,
+           (SELECT COUNT(DISTINCT r.title) FROM content_requests r WHERE r.group_id = g.group_id) AS spellings
+    FROM content_request_groups g
+    WHERE status = %s
+    ORDER BY request_count DESC, last_requested_at DESC
+    LIMIT %s
+"""
+
+REQUEST_STATUSES = ('Pending', 'Added', 'Rejected')
+
+TRAILING_YEAR_RE = re.compile(r"^(.+?) (?:19|20)\d\d$")
+ROMAN_NUMERALS = {'ii', 'iii', 'iv', 'vi', 'vii', 'viii', 'ix', 'x', 'xi', 'xii'}
+
+
+def request_key(title):
+    """
+    match_key() without a trailing year, so 'Dune (2021)' and 'dune' are
+    the same request.
+    """
+    key = match_key(title)
+    match = TRAILING_YEAR_RE.match(key)
+    return match.group(1) if match else key
+
+
+def trigrams(key):
+    # padded like pg_trgm, so the start of a title weighs a bit more than its middle
+    padded = f"  {key} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def number_tokens(key):
+    # sequels differ by a token or two, 'toy story 2' must never match 'toy story 3'
+    return frozenset(token for token in key.split() if token.isdigit() or token in ROMAN_NUMERALS)
+
+
+class TrigramIndex:
+    """
+    Fuzzy lookup of short strings by trigram (Jaccard) similarity.
+
+    Every key is stored as its set of trigrams, with a posting list per
+    trigram. A key needs at least ceil(threshold * n) of the query's n
+    trigrams in common to reach the threshold, so only the postings of the
+    query's rarest n - ceil(threshold * n) + 1 trigrams have to be read to
+    find every candidate; the candidates are then scored exactly. Keys whose
+    numbers (sequel numbers, roman numerals) differ never match, and neither
+    do keys where one is the other plus whole words ('dark knight' and
+    'dark knight rises').
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._grams = {}
+        self._numbers = {}
+        self._words = {}
+        # requests add keys while other threads search
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._grams)
+
+    def add(self, item_id, key):
+        if not key or item_id in self._grams:
+            return
+        grams = trigrams(key)
+        with self._lock:
+            self._grams[item_id] = grams
+            self._numbers[item_id] = number_tokens(key)
+            self._words[item_id] = frozenset(key.split())
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(item_id)
+
+    def search(self, key, threshold, limit=5):
+        """
+        Returns up to `limit` (item_id, similarity) pairs with a similarity
+        of at least `threshold`, most similar first.
+        """
+        if not key:
+            return []
+        grams = trigrams(key)
+        numbers = number_tokens(key)
+        words = frozenset(key.split())
+        needed = max(1, math.ceil(threshold * len(grams)))
+        with self._lock:
+            rarest = sorted(grams, key=lambda gram: len(self._postings.get(gram, ())))[:len(grams) - needed + 1]
+            candidates = set()
+            for gram in rarest:
+                candidates.update(self._postings.get(gram, ()))
+            scored = []
+            for item_id in candidates:
+                other = self._grams[item_id]
+                shared = len(grams & other)
+                similarity = shared / (len(grams) + len(other) - shared)
+                other_words = self._words[item_id]
+                if (similarity >= threshold and self._numbers[item_id] == numbers
+                        and not words < other_words and not other_words < words):
+                    scored.append((-similarity, item_id))
+        scored.sort()
+        return [(item_id, -score) for score, item_id in scored[:limit]]
+
+
+class RequestMatcher(IndexService):
+    """
+    Trigram indexes over the catalog's titles and the request groups, used
+    to turn away requests for titles that already exist and to add a request
+    to the group of a similarly spelled one. Both are rebuilt on a background
+    thread once older than `refresh_seconds`; groups created by other
+    processes are also picked up on a miss (see match_group()).
+    """
+
+    description = 'request matcher'
+
+    def __init__(self, get_connection, threshold=0.6, refresh_seconds=600):
+        super().__init__(get_connection, refresh_seconds)
+        self.threshold = threshold
+        # swapped in as one tuple so lookups never see a half-built index
+        self._indexes = None
+        self._catch_up_lock = threading.Lock()
+
+    def _get(self):
+        if not self.ensure_fresh():
+            return None
+        return self._indexes
+
+    def build(self, cursor):
+        cursor.execute(TITLES_QUERY)
+        titles = {row['content_id']: row for row in cursor.fetchall()}
+        content_index = TrigramIndex()
+        for content_id, row in titles.items():
+            content_index.add(content_id, request_key(row['title']))
+        groups = {'index': TrigramIndex(), 'titles': {}, 'max_id': 0}
+        self._load_groups(cursor, groups)
+        self._indexes = (content_index, titles, groups)
+
+    def _load_groups(self, cursor, groups):
+        cursor.execute("SELECT group_id, title, title_key FROM content_request_groups WHERE group_id > %s",
+                       (groups['max_id'],))
+        for row in cursor.fetchall():
+            if isinstance(row, dict):
+                row = (row['group_id'], row['title'], row['title_key'])
+            self._add_group(groups, *row)
+
+    def _add_group(self, groups, group_id, title, key):
+        groups['index'].add(group_id, key)
+        groups['titles'][group_id] = title
+        groups['max_id'] = max(groups['max_id'], group_id)
+
+    def match_content(self, title):
+        """
+        Returns the catalog title (a content row) most similar to `title`,
+        or None.
+        """
+        indexes = self._get()
+        if indexes is None:
+            return None
+        content_index, titles, _ = indexes
+        best = content_index.search(request_key(title), self.threshold, limit=1)
+        return titles[best[0][0]] if best else None
+
+    def match_group(self, cursor, title):
+        """
+        Returns the id of the request group most similar to `title`, or None.
+        On a miss, groups created since the last load (possibly by another
+        process) are read first, a primary key range scan.
+        """
+        indexes = self._get()
+        if indexes is None:
+            return None
+        groups = indexes[2]
+        key = request_key(title)
+        best = groups['index'].search(key, self.threshold, limit=1)
+        if not best:
+            with self._catch_up_lock:
+                self._load_groups(cursor, groups)
+            best = groups['index'].search(key, self.threshold, limit=1)
+        return best[0][0] if best else None
+
+    def add_group(self, group_id, title):
+        # max_id stays put, groups other processes created below this id are still to be read
+        indexes = self._indexes
+        if indexes is not None:
+            indexes[2]['index'].add(group_id, request_key(title))
+            indexes[2]['titles'][group_id] = title
+
+
+def add_request(cursor, user_id, title, group_id=None):
+    """
+    Records a user's request in `group_id`, or in a new group for `title`,
+    inside the caller's transaction. Returns (group_id, created), created
+    is False when the user had already asked for this group (nothing is
+    written then).
+    """
+    if group_id is None:
+        # the unique key makes a concurrent request for the same spelling land in one group
+        cursor.execute("""
+            INSERT INTO content_request_groups (title, title_key) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE group_id = LAST_INSERT_ID(group_id)
+        """, (title, request_key(title)))
+        group_id = cursor.lastrowid
+
+    cursor.execute("SELECT 1 FROM content_requests WHERE group_id = %s AND user_id = %s LIMIT 1",
+                   (group_id, user_id))
+    if cursor.fetchall():
+        return group_id, False
+
+    # a request for a title moderators already decided on shows their decision straight away
+    cursor.execute("""
+        INSERT INTO content_requests (user_id, title, group_id, status)
+        SELECT %s, %s, group_id, status FROM content_request_groups WHERE group_id = %s
+    """, (user_id, title, group_id))
+    cursor.execute("""
+        UPDATE content_request_groups
+        SET request_count = request_count + 1, last_requested_at = CURRENT_TIMESTAMP
+        WHERE group_id = %s
+    """, (group_id,))
+    return group_id, True
+
+
+def most_requested(cursor, status='Pending', limit=100):
+    """
+    Request groups with the given status, most requested first.
+    """
+    cursor.execute(MOST_REQUESTED_QUERY, (status, limit))
+    return cursor.fetchall()
+
+
+def set_status(cursor, group_id, status):
+    """
+    Sets a group's status and the status of every request in it, which is
+    what each user sees on their dashboard. Returns the number of requests
+    updated.
+    """
+    cursor.execute("UPDATE content_request_groups SET status = %s WHERE group_id = %s", (status, group_id))
+    cursor.execute("UPDATE content_requests SET status = %s WHERE group_id = %s", (status, group_id))
+    return cursor.rowcount
+
+
+def backfill(cursor, threshold=0.6):
+    """
+    Puts every request without a group into one, matching fuzzily against
+    the existing groups and the ones created along the way, then recounts
+    the demand of every group. Used when upgrading a database that has
+    ungrouped requests.
+    """
+    index = TrigramIndex()
+    cursor.execute("SELECT group_id, title_key FROM content_request_groups")
+    for group_id, key in cursor.fetchall():
+        index.add(group_id, key)
+
+    cursor.execute("SELECT request_id, title, status FROM content_requests WHERE group_id IS NULL ORDER BY request_id")
+    requests = cursor.fetchall()
+    assignments = []
+    statuses = {}
+    for request_id, title, status in requests:
+        key = request_key(title)
+        if not key:
+            # nothing to match on ('!!!'), left without a group
+            continue
+        best = index.search(key, threshold, limit=1)
+        if best:
+            group_id = best[0][0]
+        else:
+            cursor.execute("""
+                INSERT INTO content_request_groups (title, title_key) VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE group_id = LAST_INSERT_ID(group_id)
+            """, (title, key))
+            group_id = cursor.lastrowid
+            index.add(group_id, key)
+        assignments.append((group_id, request_id))
+        statuses.setdefault(group_id, set()).add(status)
+
+    for start in range(0, len(assignments), 1000):
+        cursor.executemany("UPDATE content_requests SET group_id = %s WHERE request_id = %s",
+                           assignments[start:start + 1000])
+    # a group stays pending while any of its requests is, otherwise it takes their outcome
+    for group_id, seen in statuses.items():
+        if 'Pending' in seen:
+            continue
+        status = 'Added' if 'Added' in seen else 'Rejected'
+        cursor.execute("UPDATE content_request_groups SET status = %s WHERE group_id = %s AND status = 'Pending'",
+                       (status, group_id))
+
+    recount(cursor)
+    return len(assignments)
+
+
+def recount(cursor):
+    """
+    Recomputes every group's request_count and request times from content_requests.
+    """
+    cursor.execute("""
+        UPDATE content_request_groups g
+        JOIN (
+            SELECT group_id, COUNT(DISTINCT user_id) AS users, MIN(requested_at) AS first_at, MAX(requested_at) AS last_at
+            FROM content_requests
+            WHERE group_id IS NOT NULL
+            GROUP BY group_id
+        ) r ON r.group_id = g.group_id
+        SET g.request_count = r.users, g.first_requested_at = r.first_at, g.last_requested_at = r.last_at
+    """)
+    return cursor.rowcount
+
+
+if __name__ == '__main__':
+    # usage: python content_requests.py --backfill | --top
+    load_dotenv()
+    if len(sys.argv) < 2 or sys.argv[1] not in ('--backfill', '--top'):
+        print("Usage: python content_requests.py --backfill | --top")
+        sys.exit(1)
+
+    try:
+        conn = mysql.connector.connect(
+            host=os.getenv('DB_HOST'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            database=os.getenv('DB_NAME')
+        )
+    except mysql.connector.Error as err:
+        print(f"Error connecting to database: {err}")
+        sys.exit(1)
+
+    cursor = conn.cursor()
+    try:
+        if sys.argv[1] == '--backfill':
+            print("--> Grouping requests without a group...")
+            grouped = backfill(cursor, float(os.getenv('REQUEST_MATCH_THRESHOLD', 0.6)))
+            conn.commit()
+            print(f"[SUCCESS] Grouped {grouped} requests.")
+        else:
+            for group_id, title, status, count, first_at, last_at, spellings in most_requested(cursor, limit=20):
+                print(f"    {count:>6}  {title}  ({spellings} spellings, last {last_at:%Y-%m-%d})")
+    except mysql.connector.Error as err:
+        print(f"[ERROR] {err}")
+        conn.rollback()
+        sys.exit(1)
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,222 @@
+import time
+from datetime import datetime
+
+# watchlist and rating history are paged with keyset pagination on
+# (timestamp, content_id), newest first
+WATCHLIST_PAGE_QUERY = """
+    SELECT
+        w.content_id,
+        w.added_at,
+        c.title,
+        c.content_type,
+        c.release_year,{overview}
+        n.note_text
+    FROM
+        user_watchlist w
+    JOIN
+        content c ON w.content_id = c.content_id
+    LEFT JOIN
+        content_notes n ON w.user_id = n.user_id AND w.content_id = n.content_id
+    WHERE
+        w.user_id = %s{keyset}
+    ORDER BY
+        w.added_at DESC, w.content_id DESC
+    LIMIT %s
+"""
+
+RATINGS_PAGE_QUERY = """
+    SELECT r.content_id, c.title, r.rating, r.created_at
+    FROM user_ratings r
+    JOIN content c ON r.content_id = c.content_id
+    WHERE r.user_id = %s{keyset}
+    ORDER BY r.created_at DESC, r.content_id DESC
+    LIMIT %s
+"""
+
+# the remaining panels, as (query, fetch mode)
+DASHBOARD_SECTIONS = {
+    # totals across all pages, so they can't be derived from the page rows; read
+    # from the counters the write routes maintain (user_stats.py), no row yet means no activity
+    'stats': ("""
+        SELECT watchlist_count, rating_count, rating_sum
+        FROM user_stats
+        WHERE user_id = %(user_id)s
+    """, 'one'),
+
+    # get profile data in order to display on the dashboard
+    'profile': ("SELECT display_name, bio FROM user_profiles WHERE user_id = %(user_id)s", 'one'),
+
+    'recent_searches': ("""
+        SELECT search_query
+        FROM search_history
+        WHERE user_id = %(user_id)s
+        GROUP BY search_query
+        ORDER BY MAX(searched_at) DESC
+        LIMIT 5;
+    """, 'all'),
+
+    # get the users reports
+    'my_reports': ("""
+        SELECT r.reason, r.status, r.created_at, c.title
+        FROM content_reports r
+        JOIN content c ON r.content_id = c.content_id
+        WHERE r.user_id = %(user_id)s
+        ORDER BY r.created_at DESC
+        LIMIT 5;
+    """, 'all'),
+
+    # "because you watched": the precomputed neighbours (recommendations.py) of the
+    # user's latest rated (3+) and watchlisted titles, minus what they already have
+    'recommendations': ("""
+        SELECT
+            s.neighbor_id AS content_id,
+            c.title,
+            c.content_type,
+            c.release_year,
+            SUM(s.score * seeds.weight) AS score
+        FROM (
+            (SELECT content_id, rating / 5 AS weight
+             FROM user_ratings
+             WHERE user_id = %(user_id)s AND rating >= 3
+             ORDER BY created_at DESC
+             LIMIT 50)
+            UNION ALL
+            (SELECT content_id, 0.6 AS weight
+             FROM user_watchlist
+             WHERE user_id = %(user_id)s
+             ORDER BY added_at DESC
+             LIMIT 50)
+        ) seeds
+        JOIN content_similarity s ON s.content_id = seeds.content_id
+        JOIN content c ON c.content_id = s.neighbor_id
+        WHERE NOT EXISTS (SELECT 1 FROM user_ratings r WHERE r.user_id = %(user_id)s AND r.content_id = s.neighbor_id)
+          AND NOT EXISTS (SELECT 1 FROM user_watchlist w WHERE w.user_id = %(user_id)s AND w.content_id = s.neighbor_id)
+        GROUP BY s.neighbor_id, c.title, c.content_type, c.release_year
+        ORDER BY score DESC
+        LIMIT 10;
+    """, 'all'),
+
+    # content requests
+    'my_requests': ("""
+        SELECT title, status, requested_at
+        FROM content_requests
+        WHERE user_id = %(user_id)s
+        ORDER BY requested_at DESC
+        LIMIT 5;
+    """, 'all'),
+}
+
+class DashboardLoadError(Exception):
+    """
+    Raised when a dashboard panel could not be loaded.
+    """
+
+def encode_cursor(timestamp, content_id):
+    """
+    Builds the opaque 'next page' token for a (timestamp, content_id) position.
+    """
+    return f"{timestamp.isoformat()}~{content_id}"
+
+def decode_cursor(token):
+    """
+    Parses a token made by encode_cursor. Returns None for an empty token
+    and raises ValueError for a malformed one.
+    """
+    if not token:
+        return None
+    timestamp, content_id = token.rsplit('~', 1)
+    return datetime.fromisoformat(timestamp), int(content_id)
+
+def fetch_watchlist_page(cursor, user_id, after=None, limit=25, include_overview=False):
+    """
+    Returns (rows, next_cursor) for one page of a user's watchlist. The
+    overview text is only selected when asked for.
+    """
+    return _fetch_page(
+        cursor, WATCHLIST_PAGE_QUERY, 'w.added_at', 'w.content_id', 'added_at',
+        user_id, after, limit, overview="\n        c.overview," if include_overview else ""
+    )
+
+def fetch_ratings_page(cursor, user_id, after=None, limit=25):
+    """
+    Returns (rows, next_cursor) for one page of a user's rating history.
+    """
+    return _fetch_page(
+        cursor, RATINGS_PAGE_QUERY, 'r.created_at', 'r.content_id', 'created_at',
+        user_id, after, limit
+    )
+
+def load_dashboard(get_connection, executor, user_id, watchlist_after=None, ratings_after=None, page_size=25):
+    """
+    Fetches every dashboard panel concurrently, each on its own pooled
+    connection, so the page costs roughly one round-trip instead of eight.
+    Returns (data, timings) where timings maps panel name -> milliseconds.
+    """
+    sections = {
+        'watchlist': lambda cursor: fetch_watchlist_page(cursor, user_id, watchlist_after, page_size),
+        'my_ratings': lambda cursor: fetch_ratings_page(cursor, user_id, ratings_after, page_size),
+    }
+    for name, (query, fetch) in DASHBOARD_SECTIONS.items():
+        sections[name] = _query_section(query, fetch, user_id)
+
+    futures = {
+        name: executor.submit(_load_section, get_connection, loader)
+        for name, loader in sections.items()
+    }
+
+    data, timings = {}, {}
+    for name, future in futures.items():
+        data[name], timings[name] = future.result()
+
+    data['watchlist'], data['watchlist_next'] = data['watchlist']
+    data['my_ratings'], data['ratings_next'] = data['my_ratings']
+    stats = data.pop('stats') or {'watchlist_count': 0, 'rating_count': 0, 'rating_sum': 0}
+    data['watchlist_count'] = stats['watchlist_count']
+    data['avg_rating'] = round(float(stats['rating_sum']) / stats['rating_count'], 1) if stats['rating_count'] else 0.0
+
+    return data, timings
+
+def server_timing_header(timings):
+    """
+    Formats panel timings for the Server-Timing response header, so they
+    show up in the browser's network tab.
+    """
+    return ', '.join(f"{name};dur={ms:.1f}" for name, ms in timings.items())
+
+def _fetch_page(cursor, query, time_column, id_column, time_key, user_id, after, limit, overview=""):
+    keyset, params = "", [user_id]
+    if after is not None:
+        keyset = f"\n        AND ({time_column} < %s OR ({time_column} = %s AND {id_column} < %s))"
+        params += [after[0], after[0], after[1]]
+
+    # one extra row tells us whether there is a next page
+    cursor.execute(query.format(overview=overview, keyset=keyset), params + [limit + 1])
+    rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][time_key], rows[-1]['content_id'])
+    return rows, next_cursor
+
+def _query_section(query, fetch, user_id):
+    def loader(cursor):
+        cursor.execute(query, {'user_id': user_id})
+        rows = cursor.fetchall()
+        if fetch == 'one':
+            return rows[0] if rows else None
+        return rows
+    return loader
+
+def _load_section(get_connection, loader):
+    start = time.perf_counter()
+    conn = get_connection()
+    if not conn:
+        raise DashboardLoadError("Database connection failed")
+    cursor = conn.cursor(dictionary=True)
+    try:
+        rows = loader(cursor)
+    finally:
+        cursor.close()
+        conn.close()
+    return rows, (time.perf_counter() - start) * 1000
@@ -0,0 +1,246 @@
+import threading
+import time
+import weakref
+from collections import deque
+
+import mysql.connector
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no connection could be checked out of the pool before
+    the checkout timeout expired.
+    """
+
+
+class PooledConnection:
+    """
+    Thin wrapper around a pooled mysql connection. Everything is delegated to
+    the real connection except close(), which hands it back to the pool.
+    """
+
+    def __init__(self, pool, raw_conn, created_at):
+        self._pool = pool
+        self._raw = raw_conn
+        self._created_at = created_at
+        # a wrapper dropped without close() (an exception skipped it) still frees its slot
+        self._finalizer = weakref.finalize(self, pool._reclaim, raw_conn)
+
+    def close(self):
+        # closing twice is a no-op, just like a plain connection
+        if self._raw is not None:
+            self._finalizer.detach()
+            raw, self._raw = self._raw, None
+            self._pool._release(raw, self._created_at)
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise mysql.connector.errors.OperationalError("Connection has been returned to the pool.")
+        return getattr(self._raw, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._raw, name, value)
+
+
+class ConnectionPool:
+    """
+    A bounded pool of MySQL connections.
+
+    Keeps up to `size` idle connections around and allows `max_overflow` extra
+    connections while under load (those are closed on release instead of being
+    kept). A checkout waits at most `timeout` seconds for a free slot. Idle
+    connections are pinged before being handed out when `pre_ping` is set and
+    replaced once they are older than `recycle` seconds.
+    """
+
+    # number of recent checkout latencies kept around for percentiles
+    LATENCY_SAMPLES = 1024
+
+    def __init__(self, connect_args, size=5, max_overflow=10, timeout=30.0,
+                 recycle=3600, pre_ping=True):
+        self.connect_args = dict(connect_args)
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._open = 0
+        self._in_use = 0
+        self._waiting = 0
+
+        # counters for stats()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._recycled = 0
+        self._ping_failures = 0
+        self._reclaimed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._recent_waits = deque(maxlen=self.LATENCY_SAMPLES)
+
+    def connect(self):
+        """
+        Checks out a connection, blocking up to `timeout` seconds if the pool
+        is exhausted. Raises PoolTimeout if nothing frees up in time.
+        """
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        raw, created_at = None, None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    # LIFO so the warmest connection gets reused first
+                    raw, created_at = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"Timed out after {self.timeout}s waiting for a database connection "
+                        f"({self._in_use} in use, {self._waiting} waiting)."
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+
+        # network work (connect, ping) happens outside the lock
+        try:
+            if raw is None:
+                raw, created_at = self._new_connection()
+            else:
+                raw, created_at = self._validate(raw, created_at)
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.perf_counter() - start
+        with self._cond:
+            self._checkouts += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+            self._recent_waits.append(waited)
+
+        return PooledConnection(self, raw, created_at)
+
+    def _new_connection(self):
+        return mysql.connector.connect(**self.connect_args), time.monotonic()
+
+    def _validate(self, raw, created_at):
+        # recycle connections that have been around too long
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            self._discard(raw)
+            with self._cond:
+                self._recycled += 1
+            return self._new_connection()
+
+        # health check on borrow
+        if self.pre_ping:
+            try:
+                raw.ping(reconnect=False)
+            except mysql.connector.Error:
+                self._discard(raw)
+                with self._cond:
+                    self._ping_failures += 1
+                return self._new_connection()
+
+        return raw, created_at
+
+    def _release(self, raw, created_at):
+        healthy = True
+        try:
+            # never hand a half-finished transaction or unread result to the next borrower
+            if raw.unread_result:
+                raw.consume_results()
+            if raw.in_transaction:
+                raw.rollback()
+        except mysql.connector.Error:
+            healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            if healthy and len(self._idle) < self.size:
+                self._idle.append((raw, created_at))
+                raw = None
+            else:
+                self._open -= 1
+            self._cond.notify()
+
+        # overflow or broken connections get closed
+        if raw is not None:
+            self._discard(raw)
+
+    def _reclaim(self, raw):
+        # runs from the garbage collector, the connection's state is unknown so it is closed, not reused
+        self._discard(raw)
+        with self._cond:
+            self._in_use -= 1
+            self._open -= 1
+            self._reclaimed += 1
+            self._cond.notify()
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except mysql.connector.Error:
+            pass
+
+    def dispose(self):
+        """
+        Closes every idle connection. Connections that are checked out are
+        closed when they get returned.
+        """
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for raw, _ in idle:
+            self._discard(raw)
+
+    def stats(self):
+        """
+        Returns a snapshot of the pool state and checkout latency, used for
+        sizing the pool.
+        """
+        with self._cond:
+            waits = sorted(self._recent_waits)
+            checkouts = self._checkouts
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'waiting': self._waiting,
+                'checkouts': checkouts,
+                'timeouts': self._timeouts,
+                'recycled': self._recycled,
+                'ping_failures': self._ping_failures,
+                'reclaimed': self._reclaimed,
+                'checkout_ms_avg': round(self._total_wait / checkouts * 1000, 3) if checkouts else 0.0,
+                'checkout_ms_p50': round(_percentile(waits, 50) * 1000, 3),
+                'checkout_ms_p95': round(_percentile(waits, 95) * 1000, 3),
+                'checkout_ms_max': round(self._max_wait * 1000, 3),
+            }
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
@@ -0,0 +1,122 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+import mysql.connector
+
+# what a user can export, each ordered oldest first so exports are stable
+EXPORT_QUERIES = {
+    'watchlist': """
+        SELECT
+            w.content_id,
+            c.title,
+            c.content_type,
+            c.release_year,
+            w.added_at,
+            n.note_text,
+            n.updated_at AS note_updated_at
+        FROM user_watchlist w
+        JOIN content c ON c.content_id = w.content_id
+        LEFT JOIN content_notes n ON n.user_id = w.user_id AND n.content_id = w.content_id
+        WHERE w.user_id = %s
+        ORDER BY w.added_at, w.content_id
+    """,
+    'ratings': """
+        SELECT r.content_id, c.title, c.content_type, c.release_year, r.rating, r.created_at
+        FROM user_ratings r
+        JOIN content c ON c.content_id = r.content_id
+        WHERE r.user_id = %s
+        ORDER BY r.created_at, r.content_id
+    """,
+    'notes': """
+        SELECT n.content_id, c.title, n.note_text, n.created_at, n.updated_at
+        FROM content_notes n
+        JOIN content c ON c.content_id = n.content_id
+        WHERE n.user_id = %s
+        ORDER BY n.created_at, n.content_id
+    """,
+    'searches': """
+        SELECT search_query, searched_at
+        FROM search_history
+        WHERE user_id = %s
+        ORDER BY searched_at, history_id
+    """,
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+# a slow client must not get the query killed halfway through the export
+NET_WRITE_TIMEOUT = 600
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def stream_export(conn, dataset, fmt, user_id, batch_size=500):
+    """
+    Yields one of a user's datasets as CSV (with a header row) or JSON lines,
+    a batch of rows at a time.
+
+    The rows come from an unbuffered cursor, so MySQL sends them as they are
+    read and only one batch is held in memory however long the export is.
+    `conn` is used for the whole stream and closed at the end, also when the
+    client goes away early (the generator is closed then).
+    """
+    cursor = None
+    old_timeout = None
+    try:
+        cursor = conn.cursor(buffered=False)
+        # the connection goes back to the pool afterwards, so the old timeout is put back
+        cursor.execute("SELECT @@SESSION.net_write_timeout")
+        old_timeout = cursor.fetchone()[0]
+        cursor.execute("SET SESSION net_write_timeout = %s", (NET_WRITE_TIMEOUT,))
+        cursor.execute(EXPORT_QUERIES[dataset], (user_id,))
+        columns = cursor.column_names
+
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield buffer.getvalue()
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            if fmt == 'csv':
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows([_csv_value(value) for value in row] for row in rows)
+                yield buffer.getvalue()
+            else:
+                yield ''.join(json.dumps({column: _json_value(value) for column, value in zip(columns, row)},
+                                         ensure_ascii=False) + '\n' for row in rows)
+    finally:
+        try:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except mysql.connector.Error:
+                    # an abandoned stream leaves unread rows and the cursor refuses
+                    # to close, they have to be read before the next statement
+                    conn.consume_results()
+            if old_timeout is not None:
+                cursor = conn.cursor()
+                cursor.execute("SET SESSION net_write_timeout = %s", (old_timeout,))
+                cursor.close()
+        except mysql.connector.Error as err:
+            print(f"Error resetting the export connection: {err}")
+        finally:
+            conn.close()
@@ -0,0 +1,62 @@
+import threading
+import time
+
+
+class IndexService:
+    """
+    Base for the services that hold an in-memory index built from the
+    database (autocomplete, ranking, browse facets, ...).
+
+    The first caller builds the index synchronously and concurrent first
+    callers wait for that build. After that the index is rebuilt on a
+    background thread once it is older than `refresh_seconds`, while
+    lookups keep using the old one. Subclasses implement build(cursor)
+    and name the index in `description` for error messages.
+    """
+
+    description = 'index'
+
+    def __init__(self, get_connection, refresh_seconds=600):
+        self.get_connection = get_connection
+        self.refresh_seconds = refresh_seconds
+        self.built_at = None
+        self._lock = threading.Lock()
+
+    def build(self, cursor):
+        raise NotImplementedError
+
+    def ensure_fresh(self):
+        """
+        Builds the index if it never was and schedules a rebuild if it is
+        stale. Returns False when there is still no index to serve.
+        """
+        built_at = self.built_at
+        if built_at is None:
+            self.refresh(wait=True)
+            return self.built_at is not None
+        if time.time() - built_at > self.refresh_seconds and not self._lock.locked():
+            threading.Thread(target=self.refresh, daemon=True).start()
+        return True
+
+    def refresh(self, wait=False):
+        # only one rebuild at a time, concurrent callers keep using the old index
+        if not self._lock.acquire(blocking=wait):
+            return
+        try:
+            if wait and self.built_at is not None:
+                # built by the caller we waited for
+                return
+            conn = self.get_connection()
+            if not conn:
+                return
+            cursor = conn.cursor(dictionary=True)
+            try:
+                self.build(cursor)
+                self.built_at = time.time()
+            except Exception as err:
+                print(f"Error rebuilding {self.description}: {err}")
+            finally:
+                cursor.close()
+                conn.close()
+        finally:
+            self._lock.release()
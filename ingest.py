@@ -0,0 +1,349 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import sys
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+# movies.csv overviews can be long, the default field limit is 128KB
+csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+
+MovieRecord = namedtuple('MovieRecord', 'tmdb_id title overview release_year genres')
+ShowRecord = namedtuple('ShowRecord', 'show_id title release_year directors')
+AwardRecord = namedtuple('AwardRecord', 'tmdb_id year category')
+
+# column lists for every table the pipeline writes
+CATALOG_TABLES = {
+    'genres': ('genre_id', 'genre_name'),
+    'directors': ('director_id', 'director_name'),
+    'content': ('content_id', 'content_type', 'title', 'overview', 'release_year', 'source_id', 'content_hash'),
+    'content_genres': ('content_id', 'genre_id'),
+    'content_directors': ('content_id', 'director_id'),
+    'award_staging': ('source_id', 'year', 'category'),
+}
+
+# a bridge row can only be written once the rows it points at are
+PARENT_TABLES = {
+    'content_genres': ('content', 'genres'),
+    'content_directors': ('content', 'directors'),
+}
+
+
+def content_hash(content_type, title, overview, release_year, names):
+    """
+    Fingerprint of everything the catalog stores for one title, including its
+    genre or director names, so a sync can skip rows that haven't changed.
+    """
+    payload = json.dumps([content_type, title, overview, release_year, list(names)], ensure_ascii=False)
+    return hashlib.md5(payload.encode('utf-8')).hexdigest()
+
+
+def movie_content(movie):
+    """
+    The content row values and genre names a movie record is stored as.
+    """
+    genres = list(dict.fromkeys(movie.genres))
+    row = ('Movie', movie.title, movie.overview, movie.release_year)
+    return str(movie.tmdb_id), row, genres
+
+
+def show_content(show):
+    """
+    The content row values and director names a show record is stored as.
+    """
+    directors = list(dict.fromkeys(show.directors))
+    row = ('TV Show', show.title, None, show.release_year)
+    return show.show_id, row, directors
+
+
+def read_csv(path):
+    """
+    Streams a CSV file as dict rows, one at a time. Quoted commas, doubled
+    quotes and newlines inside fields are handled by the csv module.
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        yield from csv.DictReader(file)
+
+
+def _year(value):
+    value = (value or '').strip()[:4]
+    return int(value) if value.isdigit() else None
+
+
+def _movie_record(row):
+    try:
+        genres = []
+        if row.get('genres'):
+            genres = [g['name'] for g in json.loads(row['genres']) if g.get('name')]
+        return MovieRecord(int(row['id']), row['title'], row['overview'],
+                           _year(row.get('release_date')), genres)
+    except (ValueError, TypeError, KeyError, json.JSONDecodeError):
+        return None
+
+
+def _show_record(row):
+    directors_string = row.get('director')
+    directors = [name.strip() for name in directors_string.split(',')] if directors_string else []
+    return ShowRecord(row.get('show_id'), row.get('title'), _year(row.get('release_year')), directors)
+
+
+def _award_record(row):
+    try:
+        tmdb_id_str = row.get('tmdb_id')
+        if tmdb_id_str and tmdb_id_str.strip():
+            return AwardRecord(int(tmdb_id_str), int(row.get('Year')), row.get('Category'))
+    except (ValueError, TypeError):
+        pass
+    return None
+
+
+# source file, row -> record converter, and the sink method that takes the records
+SOURCES = (
+    ('movies.csv', _movie_record, 'add_movie'),
+    ('netflix_shows.csv', _show_record, 'add_show'),
+    ('oscars.csv', _award_record, 'add_award'),
+)
+_CONVERTERS = {filename: convert for filename, convert, _ in SOURCES}
+
+
+def movie_records(path):
+    """
+    Yields a MovieRecord per valid row of movies.csv.
+    """
+    return (r for r in map(_movie_record, read_csv(path)) if r is not None)
+
+
+def show_records(path):
+    """
+    Yields a ShowRecord per row of netflix_shows.csv.
+    """
+    return (r for r in map(_show_record, read_csv(path)) if r is not None)
+
+
+def award_records(path):
+    """
+    Yields an AwardRecord per oscars.csv row that is linked to a TMDB movie.
+    """
+    return (r for r in map(_award_record, read_csv(path)) if r is not None)
+
+
+def split_csv(path, chunk_bytes):
+    """
+    Splits a CSV file into byte ranges of roughly `chunk_bytes` that each
+    start and end on a record boundary (a newline outside of quotes).
+    Returns (header, [(start, end), ...]).
+    """
+    ranges = []
+    with open(path, 'rb') as file:
+        header = next(csv.reader([file.readline().decode('utf-8')]))
+        start = pos = file.tell()
+        in_quotes = False
+        for line in file:
+            pos += len(line)
+            # an odd number of quotes flips whether the record continues on the next line
+            if line.count(b'"') % 2:
+                in_quotes = not in_quotes
+            if not in_quotes and pos - start >= chunk_bytes:
+                ranges.append((start, pos))
+                start = pos
+        if pos > start:
+            ranges.append((start, pos))
+    return header, ranges
+
+
+def parse_chunk(filename, path, start, end, header):
+    """
+    Parses one byte range of a source file into records. Runs in a worker
+    process, so it only takes and returns picklable values.
+    """
+    with open(path, 'rb') as file:
+        file.seek(start)
+        text = file.read(end - start).decode('utf-8')
+    convert = _CONVERTERS[filename]
+    rows = csv.DictReader(io.StringIO(text, newline=''), fieldnames=header)
+    return [r for r in map(convert, rows) if r is not None]
+
+
+def parallel_records(data_dir, workers, chunk_bytes=8 * 2 ** 20, sources=SOURCES):
+    """
+    Parses every source file in a process pool, large files split into
+    chunks, and yields (sink method, record) in exactly the order a single
+    pass over the files would. Only a few chunks are in flight at a time.
+    """
+    tasks = []
+    for filename, _, method in sources:
+        path = os.path.join(data_dir, filename)
+        header, ranges = split_csv(path, chunk_bytes)
+        tasks.extend((method, (filename, path, start, end, header)) for start, end in ranges)
+
+    window = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for method, args in tasks:
+            pending.append((method, pool.submit(parse_chunk, *args)))
+            if len(pending) >= window:
+                method_done, future = pending.popleft()
+                for record in future.result():
+                    yield method_done, record
+        while pending:
+            method_done, future = pending.popleft()
+            for record in future.result():
+                yield method_done, record
+
+
+def catalog_records(data_dir, workers=1):
+    """
+    Yields (sink method, record) for every source file in load order, parsed
+    in a process pool when workers > 1.
+    """
+    if workers > 1:
+        yield from parallel_records(data_dir, workers)
+        return
+    for filename, convert, method in SOURCES:
+        for row in read_csv(os.path.join(data_dir, filename)):
+            record = convert(row)
+            if record is not None:
+                yield method, record
+
+
+class CatalogSinks:
+    """
+    Receives parsed records and fans them out to one writer per table,
+    handing out IDs as it goes. Only the genre/director name -> id maps and
+    the set of seen source ids are kept in memory; rows themselves are
+    written as they stream through.
+
+    `writer_factory(table, columns)` returns an object with write(row),
+    flush() and close(); see bulk_load.py for the INSERT and LOAD DATA writers.
+    """
+
+    def __init__(self, writer_factory, first_ids=None):
+        first_ids = first_ids or {}
+        self.writers = {table: writer_factory(table, columns) for table, columns in CATALOG_TABLES.items()}
+        for table, parents in PARENT_TABLES.items():
+            self.writers[table].parents = [self.writers[parent] for parent in parents]
+
+        self.genre_ids = {}
+        self.director_ids = {}
+        self.seen_source_ids = set()
+        self.next_ids = {
+            'genres': first_ids.get('genres', 1),
+            'directors': first_ids.get('directors', 1),
+            'content': first_ids.get('content', 1),
+        }
+        self.counts = dict.fromkeys(CATALOG_TABLES, 0)
+
+    def _dimension_id(self, table, ids, name):
+        dim_id = ids.get(name)
+        if dim_id is None:
+            dim_id = ids[name] = self._next_id(table)
+            self._write(table, (dim_id, name))
+        return dim_id
+
+    def _next_id(self, table):
+        next_id = self.next_ids[table]
+        self.next_ids[table] += 1
+        return next_id
+
+    def _write(self, table, row):
+        self.writers[table].write(row)
+        self.counts[table] += 1
+
+    def _new_content(self, source_id):
+        # first occurrence of a source id wins, repeats are skipped
+        if source_id in self.seen_source_ids:
+            return None
+        self.seen_source_ids.add(source_id)
+        return self._next_id('content')
+
+    def add_movie(self, movie):
+        source_id, row, genres = movie_content(movie)
+        content_id = self._new_content(source_id)
+        if content_id is None:
+            return
+        self._write('content', (content_id,) + row + (source_id, content_hash(*row, genres)))
+        for genre in genres:
+            self._write('content_genres', (content_id, self._dimension_id('genres', self.genre_ids, genre)))
+
+    def add_show(self, show):
+        source_id, row, directors = show_content(show)
+        content_id = self._new_content(source_id)
+        if content_id is None:
+            return
+        self._write('content', (content_id,) + row + (source_id, content_hash(*row, directors)))
+        for director in directors:
+            self._write('content_directors',
+                        (content_id, self._dimension_id('directors', self.director_ids, director)))
+
+    def add_award(self, award):
+        # resolved to a content_id in SQL through content.source_id afterwards
+        self._write('award_staging', (str(award.tmdb_id), award.year, award.category))
+
+    def close(self):
+        # parents first so bridge rows never point at unwritten rows
+        for table in CATALOG_TABLES:
+            self.writers[table].close()
+
+
+def ingest_catalog(cursor, writer_factory, data_dir='data', timer=None, workers=1):
+    """
+    Loads genres, directors, content, bridges and awards by streaming each
+    source file exactly once. With workers > 1 the files are parsed in a
+    process pool; records still reach the sinks in file order, so IDs and
+    rows come out identical to the single process path.
+    Returns the number of rows written per table.
+    """
+    stage = timer.stage if timer else (lambda name: nullcontext())
+
+    cursor.execute("""
+        CREATE TEMPORARY TABLE IF NOT EXISTS award_staging (
+            seq         INT AUTO_INCREMENT PRIMARY KEY,
+            source_id   VARCHAR(50) NOT NULL,
+            year        INT NOT NULL,
+            category    VARCHAR(255) NOT NULL
+        )
+    """)
+    cursor.execute("TRUNCATE TABLE award_staging")
+
+    # continue numbering after whatever is already there (nothing, on a fresh database)
+    first_ids = {}
+    for table, id_column in (('genres', 'genre_id'), ('directors', 'director_id'), ('content', 'content_id')):
+        cursor.execute(f"SELECT COALESCE(MAX({id_column}), 0) + 1 FROM {table}")
+        first_ids[table] = cursor.fetchone()[0]
+
+    sinks = CatalogSinks(writer_factory, first_ids)
+
+    if workers > 1:
+        with stage(f'parse and stream sources ({workers} processes)'):
+            for method, record in catalog_records(data_dir, workers):
+                getattr(sinks, method)(record)
+    else:
+        for filename, convert, method in SOURCES:
+            with stage(f'stream {filename}'):
+                add = getattr(sinks, method)
+                for row in read_csv(os.path.join(data_dir, filename)):
+                    record = convert(row)
+                    if record is not None:
+                        add(record)
+    with stage('flush writers'):
+        sinks.close()
+
+    with stage('resolve awards'):
+        cursor.execute("""
+            INSERT INTO awards (content_id, year, category)
+            SELECT c.content_id, s.year, s.category
+            FROM award_staging s
+            JOIN content c ON c.source_id = s.source_id AND c.content_type = 'Movie'
+            ORDER BY s.seq
+        """)
+        sinks.counts['awards'] = cursor.rowcount
+        cursor.execute("DROP TEMPORARY TABLE award_staging")
+
+    counts = dict(sinks.counts)
+    counts.pop('award_staging')
+    for table, count in counts.items():
+        print(f"--> {table}: {count} rows")
+    return counts
@@ -0,0 +1,224 @@
+import os
+import sys
+import mysql.connector
+from dotenv import load_dotenv
+
+def save_rating(cursor, user_id, content_id, rating):
+    """
+    Inserts or updates a user's rating and applies the difference to
+    content_rating_stats. Runs inside the caller's transaction, so the
+    caller commits (or rolls back) both writes together.
+    Returns (old_rating, new_rating), old_rating is None for a first rating.
+    """
+    # lock the user's existing rating row (if any) so the delta is exact
+    cursor.execute(
+        "SELECT rating FROM user_ratings WHERE user_id = %s AND content_id = %s FOR UPDATE",
+        (user_id, content_id)
+    )
+    row = cursor.fetchone()
+    old_rating = _value(row, 'rating')
+
+    rating_query = """
+        INSERT INTO user_ratings (user_id, content_id, rating)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE rating = VALUES(rating)
+    """
+    cursor.execute(rating_query, (user_id, content_id, rating))
+
+    # read back the stored value, DECIMAL(3,1) may have rounded the input
+    cursor.execute(
+        "SELECT rating FROM user_ratings WHERE user_id = %s AND content_id = %s",
+        (user_id, content_id)
+    )
+    new_rating = _value(cursor.fetchone(), 'rating')
+
+    if old_rating is None:
+        sum_delta, count_delta = new_rating, 1
+    else:
+        sum_delta, count_delta = new_rating - old_rating, 0
+
+    stats_query = """
+        INSERT INTO content_rating_stats (content_id, rating_sum, rating_count)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            rating_sum = rating_sum + VALUES(rating_sum),
+            rating_count = rating_count + VALUES(rating_count)
+    """
+    cursor.execute(stats_query, (content_id, sum_delta, count_delta))
+
+    return old_rating, new_rating
+
+def save_ratings(cursor, user_id, ratings):
+    """
+    The batched save_rating(): writes {content_id: rating} for one user with
+    one multi-row upsert and applies the differences to content_rating_stats
+    in one more, inside the caller's transaction.
+    Returns [(content_id, old_rating, new_rating)], old_rating is None for a first rating.
+    """
+    content_ids = sorted(ratings)
+    if not content_ids:
+        return []
+    placeholders = ', '.join(['%s'] * len(content_ids))
+
+    # lock the user's existing rating rows, in key order so concurrent writers can't deadlock
+    cursor.execute(
+        f"SELECT content_id, rating FROM user_ratings WHERE user_id = %s AND content_id IN ({placeholders}) FOR UPDATE",
+        [user_id] + content_ids
+    )
+    old_ratings = {_column(row, 'content_id', 0): _column(row, 'rating', 1) for row in cursor.fetchall()}
+
+    cursor.execute(f"""
+        INSERT INTO user_ratings (user_id, content_id, rating)
+        VALUES {', '.join(['(%s, %s, %s)'] * len(content_ids))}
+        ON DUPLICATE KEY UPDATE rating = VALUES(rating)
+    """, [value for content_id in content_ids for value in (user_id, content_id, ratings[content_id])])
+
+    # read back the stored values, DECIMAL(3,1) may have rounded the input
+    cursor.execute(
+        f"SELECT content_id, rating FROM user_ratings WHERE user_id = %s AND content_id IN ({placeholders})",
+        [user_id] + content_ids
+    )
+    new_ratings = {_column(row, 'content_id', 0): _column(row, 'rating', 1) for row in cursor.fetchall()}
+
+    changes = []
+    deltas = []
+    for content_id in content_ids:
+        old_rating, new_rating = old_ratings.get(content_id), new_ratings[content_id]
+        changes.append((content_id, old_rating, new_rating))
+        if old_rating is None:
+            deltas.append((content_id, new_rating, 1))
+        elif new_rating != old_rating:
+            deltas.append((content_id, new_rating - old_rating, 0))
+
+    if deltas:
+        cursor.execute(f"""
+            INSERT INTO content_rating_stats (content_id, rating_sum, rating_count)
+            VALUES {', '.join(['(%s, %s, %s)'] * len(deltas))}
+            ON DUPLICATE KEY UPDATE
+                rating_sum = rating_sum + VALUES(rating_sum),
+                rating_count = rating_count + VALUES(rating_count)
+        """, [value for delta in deltas for value in delta])
+
+    return changes
+
+def rating_totals_many(cursor, content_ids):
+    """
+    Returns the current content_rating_stats totals of several titles with
+    their details and genre ids, as dictionaries, for keeping the in-memory
+    ranking in step (see ranking.py).
+    """
+    if not content_ids:
+        return []
+    cursor.execute(f"""
+        SELECT
+            c.content_id,
+            c.title,
+            c.release_year,
+            c.content_type,
+            s.rating_sum,
+            s.rating_count,
+            (SELECT GROUP_CONCAT(cg.genre_id) FROM content_genres cg WHERE cg.content_id = c.content_id) AS genre_ids
+        FROM content_rating_stats s
+        JOIN content c ON c.content_id = s.content_id
+        WHERE s.content_id IN ({', '.join(['%s'] * len(content_ids))})
+    """, list(content_ids))
+    return [row if isinstance(row, dict) else dict(zip(cursor.column_names, row)) for row in cursor.fetchall()]
+
+def rebuild(cursor):
+    """
+    Recomputes content_rating_stats from scratch out of user_ratings.
+    Used for backfilling and for repairing drift.
+    """
+    cursor.execute("DELETE FROM content_rating_stats")
+    cursor.execute("""
+        INSERT INTO content_rating_stats (content_id, rating_sum, rating_count)
+        SELECT content_id, SUM(rating), COUNT(*)
+        FROM user_ratings
+        GROUP BY content_id
+    """)
+    return cursor.rowcount
+
+def check_consistency(cursor):
+    """
+    Compares content_rating_stats against a fresh aggregate of user_ratings.
+    Returns a list of (content_id, stored_sum, stored_count, actual_sum, actual_count)
+    for every row that disagrees, an empty list means the aggregate is in sync.
+    """
+    mismatch_query = """
+        SELECT
+            COALESCE(s.content_id, a.content_id) AS content_id,
+            COALESCE(s.rating_sum, 0) AS stored_sum,
+            COALESCE(s.rating_count, 0) AS stored_count,
+            COALESCE(a.actual_sum, 0) AS actual_sum,
+            COALESCE(a.actual_count, 0) AS actual_count
+        FROM content_rating_stats s
+        LEFT JOIN (
+            SELECT content_id, SUM(rating) AS actual_sum, COUNT(*) AS actual_count
+            FROM user_ratings GROUP BY content_id
+        ) a ON s.content_id = a.content_id
+        WHERE a.content_id IS NULL AND s.rating_count <> 0
+           OR s.rating_sum <> a.actual_sum
+           OR s.rating_count <> a.actual_count
+        UNION ALL
+        SELECT a.content_id, 0, 0, a.actual_sum, a.actual_count
+        FROM (
+            SELECT content_id, SUM(rating) AS actual_sum, COUNT(*) AS actual_count
+            FROM user_ratings GROUP BY content_id
+        ) a
+        LEFT JOIN content_rating_stats s ON s.content_id = a.content_id
+        WHERE s.content_id IS NULL
+    """
+    cursor.execute(mismatch_query)
+    return cursor.fetchall()
+
+def _value(row, key):
+    # works for both tuple and dictionary cursors
+    if row is None:
+        return None
+    return row[key] if isinstance(row, dict) else row[0]
+
+def _column(row, key, position):
+    return row[key] if isinstance(row, dict) else row[position]
+
+if __name__ == '__main__':
+    # usage: python leaderboard.py --rebuild | --check
+    load_dotenv()
+    if len(sys.argv) < 2 or sys.argv[1] not in ('--rebuild', '--check'):
+        print("Usage: python leaderboard.py --rebuild | --check")
+        sys.exit(1)
+
+    try:
+        conn = mysql.connector.connect(
+            host=os.getenv('DB_HOST'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            database=os.getenv('DB_NAME')
+        )
+    except mysql.connector.Error as err:
+        print(f"Error connecting to database: {err}")
+        sys.exit(1)
+
+    cursor = conn.cursor()
+    try:
+        if sys.argv[1] == '--rebuild':
+            print("--> Rebuilding 'content_rating_stats' from 'user_ratings'...")
+            rows = rebuild(cursor)
+            conn.commit()
+            print(f"[SUCCESS] Leaderboard rebuilt ({rows} content rows).")
+        else:
+            mismatches = check_consistency(cursor)
+            if mismatches:
+                print(f"[!!!] {len(mismatches)} content rows are out of sync:")
+                for content_id, stored_sum, stored_count, actual_sum, actual_count in mismatches:
+                    print(f"    content_id={content_id}: stored {stored_sum}/{stored_count}, "
+                          f"actual {actual_sum}/{actual_count}")
+                print("--> Run 'python leaderboard.py --rebuild' to repair.")
+                sys.exit(2)
+            print("[SUCCESS] Leaderboard is consistent with 'user_ratings'.")
+    except mysql.connector.Error as err:
+        print(f"[ERROR] {err}")
+        conn.rollback()
+        sys.exit(1)
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,277 @@
+import argparse
+import hashlib
+import importlib.util
+import os
+import re
+import sys
+import time
+
+import mysql.connector
+from dotenv import load_dotenv
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_RE = re.compile(r"^(\d{4})_(\w+)\.(sql|py)$")
+
+# only one process migrates at a time, a second deploy waits this long and gives up
+LOCK_NAME = 'movie_app.schema_migrations'
+LOCK_TIMEOUT = 60
+
+MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version         INT PRIMARY KEY,
+        name            VARCHAR(255) NOT NULL,
+        checksum        CHAR(32) NOT NULL,
+        applied_at      TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+class MigrationError(Exception):
+    """
+    Raised when migrations can't be applied, e.g. another process holds the
+    migration lock or a migration failed part way.
+    """
+
+
+class Migration:
+    """
+    One file in migrations/, named NNNN_description.sql or NNNN_description.py.
+
+    A .sql file is a list of statements separated by semicolons. A .py file
+    defines upgrade(cursor) and can use the helpers in this module to check
+    the live schema first. MySQL commits every DDL statement on its own, so a
+    migration that fails half way can't be rolled back; write them so that
+    running them again finishes the job (CREATE TABLE IF NOT EXISTS,
+    add_index(), add_column()).
+    """
+
+    def __init__(self, path):
+        match = MIGRATION_RE.match(os.path.basename(path))
+        self.path = path
+        self.version = int(match.group(1))
+        self.name = match.group(2)
+        self.kind = match.group(3)
+
+    def __repr__(self):
+        return f"{self.version:04d}_{self.name}"
+
+    def checksum(self):
+        with open(self.path, 'rb') as file:
+            return hashlib.md5(file.read()).hexdigest()
+
+    def apply(self, cursor):
+        if self.kind == 'sql':
+            with open(self.path, 'r', encoding='utf-8') as file:
+                for statement in split_statements(file.read()):
+                    cursor.execute(statement)
+        else:
+            spec = importlib.util.spec_from_file_location(f"migration_{self.version:04d}", self.path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            module.upgrade(cursor)
+
+
+def split_statements(script):
+    # drops -- comment lines, then splits on semicolons (the migrations don't quote any)
+    lines = [line for line in script.splitlines() if not line.strip().startswith('--')]
+    return [statement.strip() for statement in '\n'.join(lines).split(';') if statement.strip()]
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """
+    Returns the migrations in `directory`, ordered by version.
+    """
+    migrations = [Migration(os.path.join(directory, filename))
+                  for filename in os.listdir(directory) if MIGRATION_RE.match(filename)]
+    migrations.sort(key=lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise MigrationError(f"Duplicate migration versions in {directory}.")
+    return migrations
+
+
+def applied_migrations(cursor):
+    """
+    Returns {version: checksum} for every migration recorded as applied.
+    """
+    cursor.execute(MIGRATIONS_TABLE)
+    cursor.execute("SELECT version, checksum FROM schema_migrations")
+    return {version: checksum for version, checksum in cursor.fetchall()}
+
+
+def pending_migrations(cursor, migrations=None):
+    applied = applied_migrations(cursor)
+    return [migration for migration in (migrations or discover()) if migration.version not in applied]
+
+
+def migrate(cursor, migrations=None, dry_run=False):
+    """
+    Applies every pending migration in order, recording each one in
+    schema_migrations once it has run. Returns the migrations applied (or,
+    with dry_run, the ones that would be).
+    """
+    _acquire_lock(cursor)
+    try:
+        pending = pending_migrations(cursor, migrations)
+        if dry_run:
+            return pending
+        for migration in pending:
+            print(f"--> Applying {migration}...")
+            start = time.perf_counter()
+            try:
+                migration.apply(cursor)
+            except mysql.connector.Error as err:
+                raise MigrationError(f"{migration} failed: {err}") from err
+            _record(cursor, migration)
+            print(f"    done in {time.perf_counter() - start:.2f}s")
+        return pending
+    finally:
+        _release_lock(cursor)
+
+
+def stamp(cursor, migrations=None):
+    """
+    Records every migration as applied without running it, for a database
+    just created from schema.sql (which already contains all of them).
+    """
+    pending = pending_migrations(cursor, migrations)
+    for migration in pending:
+        _record(cursor, migration)
+    return pending
+
+
+def status(cursor, migrations=None):
+    """
+    Returns (migration, state) for every migration file, state being
+    'applied', 'pending' or 'modified' (applied, but the file changed since).
+    """
+    applied = applied_migrations(cursor)
+    result = []
+    for migration in migrations or discover():
+        if migration.version not in applied:
+            state = 'pending'
+        elif applied[migration.version] != migration.checksum():
+            state = 'modified'
+        else:
+            state = 'applied'
+        result.append((migration, state))
+    return result
+
+
+def _record(cursor, migration):
+    cursor.execute("INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                   (migration.version, migration.name, migration.checksum()))
+    cursor.execute("COMMIT")
+
+
+def _acquire_lock(cursor):
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+    if cursor.fetchone()[0] != 1:
+        raise MigrationError(f"Another process is applying migrations (lock '{LOCK_NAME}').")
+
+
+def _release_lock(cursor):
+    cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+    cursor.fetchone()
+
+
+# helpers for .py migrations, each checks the live schema so it is safe to run twice
+
+def table_exists(cursor, table):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name = %s
+    """, (table,))
+    return cursor.fetchone()[0] > 0
+
+
+def column_exists(cursor, table, column):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+
+def index_exists(cursor, table, index):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, index))
+    return cursor.fetchone()[0] > 0
+
+
+def add_index(cursor, table, index, columns):
+    """
+    Adds an index unless it already exists. Built online (InnoDB keeps
+    taking reads and writes on the table while it builds).
+    """
+    if index_exists(cursor, table, index):
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD INDEX {index} ({', '.join(columns)}), ALGORITHM=INPLACE, LOCK=NONE")
+    return True
+
+
+def drop_index(cursor, table, index):
+    """
+    Drops an index if it exists. Done in place without locking the table.
+    """
+    if not index_exists(cursor, table, index):
+        return False
+    cursor.execute(f"ALTER TABLE {table} DROP INDEX {index}, ALGORITHM=INPLACE, LOCK=NONE")
+    return True
+
+
+def add_column(cursor, table, column, definition):
+    """
+    Adds a column unless it already exists.
+    """
+    if column_exists(cursor, table, column):
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Apply the schema migrations in migrations/ to the database in .env.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--status', action='store_true', help="list applied and pending migrations")
+    mode.add_argument('--dry-run', action='store_true', help="list the migrations that would be applied")
+    mode.add_argument('--stamp', action='store_true',
+                      help="record every migration as applied without running it (database created from schema.sql)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    try:
+        conn = mysql.connector.connect(
+            host=os.getenv('DB_HOST'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            database=os.getenv('DB_NAME')
+        )
+    except mysql.connector.Error as err:
+        print(f"Error connecting to database: {err}")
+        sys.exit(1)
+
+    cursor = conn.cursor()
+    try:
+        if args.status:
+            for migration, state in status(cursor):
+                print(f"    {state:<9} {migration}")
+        elif args.dry_run:
+            pending = migrate(cursor, dry_run=True)
+            for migration in pending:
+                print(f"    pending   {migration}")
+            print(f"--> {len(pending)} migrations would be applied.")
+        elif args.stamp:
+            stamped = stamp(cursor)
+            print(f"[SUCCESS] Recorded {len(stamped)} migrations as applied.")
+        else:
+            applied = migrate(cursor)
+            print(f"[SUCCESS] Applied {len(applied)} migrations." if applied else "[SUCCESS] Schema is up to date.")
+    except (mysql.connector.Error, MigrationError) as err:
+        print(f"[ERROR] {err}")
+        sys.exit(1)
+    finally:
+        cursor.close()
+        conn.close()
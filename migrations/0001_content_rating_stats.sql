@@ -0,0 +1,15 @@
+-- running rating totals per content, read by the homepage leaderboard (leaderboard.py)
+CREATE TABLE IF NOT EXISTS content_rating_stats (
+    content_id      INT PRIMARY KEY,
+    rating_sum      DECIMAL(12, 1) NOT NULL DEFAULT 0,
+    rating_count    INT NOT NULL DEFAULT 0,
+    avg_rating      DECIMAL(7, 4) AS (IF(rating_count > 0, rating_sum / rating_count, 0)) STORED,
+    INDEX idx_leaderboard (avg_rating, rating_count),
+    FOREIGN KEY (content_id) REFERENCES content(content_id) ON DELETE CASCADE
+);
+
+-- backfill, titles that already have a row are left alone
+INSERT IGNORE INTO content_rating_stats (content_id, rating_sum, rating_count)
+SELECT content_id, SUM(rating), COUNT(*)
+FROM user_ratings
+GROUP BY content_id;
@@ -0,0 +1,7 @@
+from migrate import add_index
+
+
+def upgrade(cursor):
+    # keyset paging of the dashboard's watchlist and rating history
+    add_index(cursor, 'user_watchlist', 'idx_watchlist_user_added', ('user_id', 'added_at', 'content_id'))
+    add_index(cursor, 'user_ratings', 'idx_ratings_user_created', ('user_id', 'created_at', 'content_id'))
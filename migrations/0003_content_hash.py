@@ -0,0 +1,6 @@
+from migrate import add_column
+
+
+def upgrade(cursor):
+    # fingerprint of the source row, lets an incremental sync skip unchanged titles
+    add_column(cursor, 'content', 'content_hash', 'CHAR(32) NULL')
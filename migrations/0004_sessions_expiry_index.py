@@ -0,0 +1,6 @@
+from migrate import add_index
+
+
+def upgrade(cursor):
+    # the session store deletes expired rows in batches
+    add_index(cursor, 'sessions', 'idx_sessions_expires', ('expires_at',))
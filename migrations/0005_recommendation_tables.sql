@@ -0,0 +1,18 @@
+-- top-K most similar titles per title, built by recommendations.py
+CREATE TABLE IF NOT EXISTS content_similarity (
+    content_id      INT NOT NULL,
+    neighbor_id     INT NOT NULL,
+    score           FLOAT NOT NULL,
+    PRIMARY KEY (content_id, neighbor_id),
+    FOREIGN KEY (content_id) REFERENCES content(content_id) ON DELETE CASCADE,
+    FOREIGN KEY (neighbor_id) REFERENCES content(content_id) ON DELETE CASCADE
+);
+
+-- one row per similarity build, incremental refreshes start from the last one
+CREATE TABLE IF NOT EXISTS similarity_refresh (
+    refresh_id          INT AUTO_INCREMENT PRIMARY KEY,
+    started_at          TIMESTAMP NOT NULL,
+    max_content_id      INT NOT NULL,
+    full_rebuild        BOOLEAN NOT NULL,
+    items_recomputed    INT NOT NULL
+);
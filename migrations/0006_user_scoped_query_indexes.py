@@ -0,0 +1,16 @@
+from migrate import add_index
+
+
+def upgrade(cursor):
+    # indexes recommended by benchmarks/explain_queries.py for the per-user
+    # dashboard panels and the homepage, which sorted every matching row
+
+    # recent searches: WHERE user_id GROUP BY search_query ORDER BY MAX(searched_at),
+    # covering, so the groups are read off the index instead of a temporary table
+    add_index(cursor, 'search_history', 'idx_search_history_user_query',
+              ('user_id', 'search_query', 'searched_at'))
+    # latest reports and requests: WHERE user_id ORDER BY time DESC LIMIT 5
+    add_index(cursor, 'content_reports', 'idx_reports_user_created', ('user_id', 'created_at'))
+    add_index(cursor, 'content_requests', 'idx_requests_user_requested', ('user_id', 'requested_at'))
+    # recent oscar winners: ORDER BY year DESC LIMIT 10
+    add_index(cursor, 'awards', 'idx_awards_year', ('year',))
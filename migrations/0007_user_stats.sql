@@ -0,0 +1,21 @@
+-- per-user counters for the dashboard and profile, kept up to date by the routes that write them
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id         INT PRIMARY KEY,
+    watchlist_count INT NOT NULL DEFAULT 0,
+    rating_count    INT NOT NULL DEFAULT 0,
+    rating_sum      DECIMAL(12, 1) NOT NULL DEFAULT 0,
+    report_count    INT NOT NULL DEFAULT 0,
+    request_count   INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+-- backfill, users that already have a row are left alone
+INSERT IGNORE INTO user_stats (user_id, watchlist_count, rating_count, rating_sum, report_count, request_count)
+SELECT
+    u.user_id,
+    (SELECT COUNT(*) FROM user_watchlist w WHERE w.user_id = u.user_id),
+    (SELECT COUNT(*) FROM user_ratings r WHERE r.user_id = u.user_id),
+    (SELECT COALESCE(SUM(rating), 0) FROM user_ratings r WHERE r.user_id = u.user_id),
+    (SELECT COUNT(*) FROM content_reports cr WHERE cr.user_id = u.user_id),
+    (SELECT COUNT(*) FROM content_requests q WHERE q.user_id = u.user_id)
+FROM users u;
@@ -0,0 +1,6 @@
+from migrate import add_column
+
+
+def upgrade(cursor):
+    # bulk imports log one row per batch, with the number of titles it wrote
+    add_column(cursor, 'action_log', 'item_count', 'INT NULL')
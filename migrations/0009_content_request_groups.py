@@ -0,0 +1,141 @@
+import math
+import re
+import unicodedata
+
+from migrate import add_column, add_index
+
+# a copy of the normalization and matching content_requests.py used when this
+# migration was written, so later changes there can't change what it does
+NON_WORD_RE = re.compile(r"[\W_]+")
+TRAILING_YEAR_RE = re.compile(r"^(.+?) (?:19|20)\d\d$")
+LEADING_ARTICLES = ('the ', 'a ', 'an ')
+ROMAN_NUMERALS = {'ii', 'iii', 'iv', 'vi', 'vii', 'viii', 'ix', 'x', 'xi', 'xii'}
+THRESHOLD = 0.6
+
+
+def request_key(title):
+    # case, punctuation, accents, a leading article and a trailing year don't count
+    text = unicodedata.normalize('NFKD', title or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    key = NON_WORD_RE.sub(' ', text.casefold()).strip()
+    for article in LEADING_ARTICLES:
+        if key.startswith(article):
+            key = key[len(article):]
+            break
+    match = TRAILING_YEAR_RE.match(key)
+    return match.group(1) if match else key
+
+
+def trigrams(key):
+    padded = f"  {key} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def number_tokens(key):
+    return frozenset(token for token in key.split() if token.isdigit() or token in ROMAN_NUMERALS)
+
+
+def best_group(groups, postings, key):
+    """
+    The group whose key is most similar to `key` by trigram (Jaccard)
+    similarity, at least THRESHOLD, with the same numbers and not just a
+    word more or less. None if there is none.
+    """
+    if not key:
+        return None
+    grams = trigrams(key)
+    numbers = number_tokens(key)
+    words = frozenset(key.split())
+    needed = max(1, math.ceil(THRESHOLD * len(grams)))
+    rarest = sorted(grams, key=lambda gram: len(postings.get(gram, ())))[:len(grams) - needed + 1]
+    candidates = set()
+    for gram in rarest:
+        candidates.update(postings.get(gram, ()))
+    best = None
+    for group_id in candidates:
+        other_grams, other_numbers, other_words = groups[group_id]
+        shared = len(grams & other_grams)
+        similarity = shared / (len(grams) + len(other_grams) - shared)
+        if (similarity >= THRESHOLD and other_numbers == numbers
+                and not words < other_words and not other_words < words
+                and (best is None or (-similarity, group_id) < best)):
+            best = (-similarity, group_id)
+    return best[1] if best else None
+
+
+def add_group(groups, postings, group_id, key):
+    if not key or group_id in groups:
+        return
+    grams = trigrams(key)
+    groups[group_id] = (grams, number_tokens(key), frozenset(key.split()))
+    for gram in grams:
+        postings.setdefault(gram, set()).add(group_id)
+
+
+def backfill(cursor):
+    # only touches requests without a group, so a rerun is cheap
+    groups, postings = {}, {}
+    cursor.execute("SELECT group_id, title_key FROM content_request_groups")
+    for group_id, key in cursor.fetchall():
+        add_group(groups, postings, group_id, key)
+
+    cursor.execute("SELECT request_id, title, status FROM content_requests WHERE group_id IS NULL ORDER BY request_id")
+    assignments = []
+    statuses = {}
+    for request_id, title, status in cursor.fetchall():
+        key = request_key(title)
+        if not key:
+            # nothing to match on ('!!!'), left without a group
+            continue
+        group_id = best_group(groups, postings, key)
+        if group_id is None:
+            cursor.execute("""
+                INSERT INTO content_request_groups (title, title_key) VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE group_id = LAST_INSERT_ID(group_id)
+            """, (title, key))
+            group_id = cursor.lastrowid
+            add_group(groups, postings, group_id, key)
+        assignments.append((group_id, request_id))
+        statuses.setdefault(group_id, set()).add(status)
+
+    for start in range(0, len(assignments), 1000):
+        cursor.executemany("UPDATE content_requests SET group_id = %s WHERE request_id = %s",
+                           assignments[start:start + 1000])
+    # a group stays pending while any of its requests is, otherwise it takes their outcome
+    for group_id, seen in statuses.items():
+        if 'Pending' in seen:
+            continue
+        status = 'Added' if 'Added' in seen else 'Rejected'
+        cursor.execute("UPDATE content_request_groups SET status = %s WHERE group_id = %s AND status = 'Pending'",
+                       (status, group_id))
+
+    cursor.execute("""
+        UPDATE content_request_groups g
+        JOIN (
+            SELECT group_id, COUNT(DISTINCT user_id) AS users, MIN(requested_at) AS first_at, MAX(requested_at) AS last_at
+            FROM content_requests
+            WHERE group_id IS NOT NULL
+            GROUP BY group_id
+        ) r ON r.group_id = g.group_id
+        SET g.request_count = r.users, g.first_requested_at = r.first_at, g.last_requested_at = r.last_at
+    """)
+
+
+def upgrade(cursor):
+    # duplicate requests for a title collapse into one group with a demand count
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS content_request_groups (
+            group_id            INT AUTO_INCREMENT PRIMARY KEY,
+            title               VARCHAR(255) NOT NULL,
+            title_key           VARCHAR(255) NOT NULL,
+            status              ENUM('Pending', 'Added', 'Rejected') NOT NULL DEFAULT 'Pending',
+            request_count       INT NOT NULL DEFAULT 0,
+            first_requested_at  TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            last_requested_at   TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uq_request_groups_key (title_key),
+            INDEX idx_request_groups_demand (status, request_count, last_requested_at)
+        )
+    """)
+    add_column(cursor, 'content_requests', 'group_id', 'INT NULL')
+    add_index(cursor, 'content_requests', 'idx_requests_group_user', ('group_id', 'user_id'))
+    backfill(cursor)
@@ -0,0 +1,7 @@
+from migrate import drop_index
+
+
+def upgrade(cursor):
+    # the leaderboards are ranked in memory (ranking.py), nothing sorts content_rating_stats
+    # by avg_rating anymore, and every rating write was still paying to keep the index up
+    drop_index(cursor, 'content_rating_stats', 'idx_leaderboard')
@@ -0,0 +1,177 @@
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+from db_pool import _percentile
+
+
+def _worker_context():
+    # forkserver forks the workers from a clean single-threaded server, spawn
+    # starts them from scratch where forkserver isn't available (Windows, macOS)
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+class HasherBusy(Exception):
+    """
+    Raised when too many hashes are already queued, or one didn't finish in
+    time. The caller should answer with a retry-later instead of waiting.
+    """
+
+
+def normalize_method(method):
+    """
+    Spells out werkzeug's defaults, so 'pbkdf2:sha256' becomes
+    'pbkdf2:sha256:1000000'. That is the prefix werkzeug stores in front of
+    the salt, which is how needs_rehash() tells the parameters apart.
+    """
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2':
+        hash_name = parts[1] if len(parts) > 1 else 'sha256'
+        iterations = parts[2] if len(parts) > 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{hash_name}:{iterations}"
+    if parts[0] == 'scrypt':
+        n, r, p = (parts[1:] + [None] * 3)[:3]
+        return f"scrypt:{n or 2 ** 15}:{r or 8}:{p or 1}"
+    raise ValueError(f"Unsupported password hash method '{method}', expected pbkdf2 or scrypt.")
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and checking in a pool of worker processes, so a
+    burst of logins doesn't tie up the request threads (or the GIL).
+
+    At most `max_pending` hashes can be queued or running at once; past that,
+    and when a hash takes longer than `timeout` seconds, HasherBusy is raised.
+    With workers=0 everything runs inline on the calling thread.
+    """
+
+    LATENCY_SAMPLES = 1024
+
+    def __init__(self, method='pbkdf2:sha256', workers=2, max_pending=32, timeout=5.0):
+        self.method = normalize_method(method)
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = 0
+
+        # counters for stats()
+        self._counters = {'hashes': 0, 'checks': 0, 'rehashes': 0, 'rejected': 0, 'timeouts': 0}
+        self._max_pending_seen = 0
+        self._runs = 0
+        self._total_time = 0.0
+        self._max_time = 0.0
+        self._recent_times = deque(maxlen=self.LATENCY_SAMPLES)
+
+    def hash(self, password):
+        self._count('hashes')
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """
+        Returns (matches, needs_rehash). needs_rehash is True when the password
+        matched but was hashed with parameters other than the current ones.
+        """
+        self._count('checks')
+        matches = self._run(check_password_hash, password_hash, password)
+        return matches, matches and self.needs_rehash(password_hash)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.method
+
+    def rehashed(self):
+        # counted by the caller once the new hash is stored
+        self._count('rehashes')
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        """
+        Returns queue depth, rejections and hash latency (queue wait included)
+        for this process.
+        """
+        with self._lock:
+            times = sorted(self._recent_times)
+            return dict(
+                self._counters,
+                method=self.method,
+                workers=self.workers,
+                pending=self._pending,
+                max_pending=self.max_pending,
+                max_pending_seen=self._max_pending_seen,
+                hash_ms_avg=round(self._total_time / self._runs * 1000, 3) if self._runs else 0.0,
+                hash_ms_p50=round(_percentile(times, 50) * 1000, 3),
+                hash_ms_p95=round(_percentile(times, 95) * 1000, 3),
+                hash_ms_max=round(self._max_time * 1000, 3),
+            )
+
+    def _run(self, func, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._counters['rejected'] += 1
+                raise HasherBusy(f"{self._pending} password hashes already pending")
+            self._pending += 1
+            self._max_pending_seen = max(self._max_pending_seen, self._pending)
+            if self.workers and self._executor is None:
+                # started lazily, and never forked from the app process: a fork copies
+                # whatever locks its other threads (db pool, write-behind) hold
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_worker_context())
+            executor = self._executor
+
+        start = time.perf_counter()
+        if executor is None:
+            try:
+                return func(*args)
+            finally:
+                self._finished(start)
+
+        try:
+            future = executor.submit(func, *args)
+        except BrokenProcessPool:
+            self._finished(start)
+            self._reset(executor)
+            raise HasherBusy("password hashing workers died, restarting them")
+        # the slot is only freed once a worker is done with it, even if we stopped waiting
+        future.add_done_callback(lambda _: self._finished(start))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            self._count('timeouts')
+            raise HasherBusy(f"password hash took longer than {self.timeout}s")
+        except BrokenProcessPool:
+            self._reset(executor)
+            raise HasherBusy("password hashing workers died, restarting them")
+
+    def _finished(self, start):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._pending -= 1
+            self._runs += 1
+            self._total_time += elapsed
+            self._max_time = max(self._max_time, elapsed)
+            self._recent_times.append(elapsed)
+
+    def _reset(self, executor):
+        # a new pool is started by the next _run()
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
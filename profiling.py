@@ -0,0 +1,316 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from flask import before_render_template, request, template_rendered
+
+# histogram bucket upper bounds in milliseconds, the last bucket catches everything above
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# distinct normalized statements tracked, anything past this is lumped together
+MAX_QUERY_SHAPES = 500
+
+STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*(?:\?|%s)\s*,)+\s*(?:\?|%s)\s*\)", re.IGNORECASE)
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """
+    Reduces a statement to its shape: literals become ?, IN lists collapse
+    to one placeholder and whitespace is squeezed, so the same query with
+    different parameters is counted once.
+    """
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode('utf-8', 'replace')
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = WHITESPACE_RE.sub(' ', sql).strip()
+    return IN_LIST_RE.sub('IN (?)', sql)
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram with a count, sum and max.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, pct):
+        # upper bound of the bucket the percentile falls in
+        if not self.count:
+            return 0.0
+        target = pct / 100 * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else round(self.max, 3)
+        return round(self.max, 3)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count, 3) if self.count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': round(self.max, 3),
+            'buckets': {f"le_{bound}": n for bound, n in zip(BUCKETS_MS, self.counts)} | {'inf': self.counts[-1]},
+        }
+
+
+class RequestProfile:
+    """
+    Everything measured for one request. Dashboard panels record into it from
+    executor threads, hence the lock.
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.start = time.perf_counter()
+        self.statements = []
+        self.connect_ms = 0.0
+        self.connections = 0
+        self.template_ms = 0.0
+        self._template_starts = {}
+        self._lock = threading.Lock()
+
+    def add_statement(self, sql, ms, rows):
+        with self._lock:
+            self.statements.append([normalize_sql(sql), ms, rows])
+            return len(self.statements) - 1
+
+    def add_fetch(self, index, ms, rows):
+        with self._lock:
+            statement = self.statements[index]
+            statement[1] += ms
+            statement[2] += rows
+
+    def add_connect(self, ms):
+        with self._lock:
+            self.connect_ms += ms
+            self.connections += 1
+
+
+class ProfiledCursor:
+    """
+    Wraps a cursor to time each statement, including fetching its rows.
+    Everything else is passed through to the real cursor.
+    """
+
+    def __init__(self, cursor, profile):
+        self._cursor = cursor
+        self._profile = profile
+        self._statement = None
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            self._statement = self._profile.add_statement(operation, (time.perf_counter() - start) * 1000, 0)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            self._statement = self._profile.add_statement(operation, (time.perf_counter() - start) * 1000, 0)
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone, single=True)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._fetch(lambda: self._cursor.fetchmany(*args, **kwargs))
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def _fetch(self, func, single=False):
+        start = time.perf_counter()
+        result = func()
+        if self._statement is not None:
+            rows = (1 if result is not None else 0) if single else len(result)
+            self._profile.add_fetch(self._statement, (time.perf_counter() - start) * 1000, rows)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class ProfiledConnection:
+    """
+    Wraps a (pooled) connection so the cursors it hands out are profiled.
+    """
+
+    def __init__(self, conn, profile):
+        self._conn = conn
+        self._profile = profile
+
+    def cursor(self, *args, **kwargs):
+        return ProfiledCursor(self._conn.cursor(*args, **kwargs), self._profile)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+
+class Profiler:
+    """
+    Opt-in request and query profiling.
+
+    When enabled, every request records its wall time, connection checkout
+    time, template render time and each SQL statement (normalized text,
+    time including fetches, rows returned). Those are folded into per
+    endpoint and per statement histograms, see stats(). Requests slower than
+    `slow_request_ms` are printed with their query breakdown.
+
+    When disabled, nothing is hooked up and connections are handed out as is.
+    """
+
+    def __init__(self, enabled=False, slow_request_ms=0):
+        self.enabled = enabled
+        self.slow_request_ms = slow_request_ms
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._queries = {}
+
+    def init_app(self, app):
+        if not self.enabled:
+            return
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(lambda exc: self._set_current(None))
+        before_render_template.connect(self._template_started, app)
+        template_rendered.connect(self._template_finished, app)
+
+    def current(self):
+        return getattr(self._local, 'profile', None)
+
+    def wrap_connection(self, conn, checkout_started):
+        """
+        Records the checkout time and returns a profiled connection, when
+        the current thread is working on a profiled request.
+        """
+        profile = self.current()
+        if conn is None or profile is None:
+            return conn
+        profile.add_connect((time.perf_counter() - checkout_started) * 1000)
+        return ProfiledConnection(conn, profile)
+
+    def bind(self, get_connection):
+        """
+        Returns a get_connection that records into the current request's
+        profile from whatever thread calls it (e.g. the dashboard executor).
+        """
+        profile = self.current()
+        if profile is None:
+            return get_connection
+
+        def connect():
+            previous = self.current()
+            self._set_current(profile)
+            try:
+                return get_connection()
+            finally:
+                self._set_current(previous)
+        return connect
+
+    def stats(self):
+        with self._lock:
+            endpoints = {
+                endpoint: {name: histogram.to_dict() for name, histogram in metrics['histograms'].items()}
+                | {'queries': metrics['queries'], 'rows': metrics['rows']}
+                for endpoint, metrics in self._endpoints.items()
+            }
+            queries = sorted(
+                ({'sql': sql, 'rows': entry['rows'], **entry['histogram'].to_dict()}
+                 for sql, entry in self._queries.items()),
+                key=lambda entry: entry['count'] * entry['avg_ms'], reverse=True
+            )
+        return {'enabled': self.enabled, 'endpoints': endpoints, 'queries': queries}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._queries.clear()
+
+    def _set_current(self, profile):
+        self._local.profile = profile
+
+    def _start_request(self):
+        self._set_current(RequestProfile(request.endpoint or request.path))
+
+    def _finish_request(self, response):
+        profile = self.current()
+        if profile is None:
+            return response
+        wall_ms = (time.perf_counter() - profile.start) * 1000
+        with profile._lock:
+            statements = list(profile.statements)
+        sql_ms = sum(ms for _, ms, _ in statements)
+        rows = sum(n for _, _, n in statements)
+
+        with self._lock:
+            metrics = self._endpoints.setdefault(profile.endpoint, {
+                'histograms': {name: Histogram() for name in ('wall', 'sql', 'connect', 'template')},
+                'queries': 0,
+                'rows': 0,
+            })
+            metrics['histograms']['wall'].add(wall_ms)
+            metrics['histograms']['sql'].add(sql_ms)
+            metrics['histograms']['connect'].add(profile.connect_ms)
+            metrics['histograms']['template'].add(profile.template_ms)
+            metrics['queries'] += len(statements)
+            metrics['rows'] += rows
+            for sql, ms, n in statements:
+                if sql not in self._queries and len(self._queries) >= MAX_QUERY_SHAPES:
+                    sql = '(other)'
+                entry = self._queries.setdefault(sql, {'histogram': Histogram(), 'rows': 0})
+                entry['histogram'].add(ms)
+                entry['rows'] += n
+
+        if self.slow_request_ms and wall_ms >= self.slow_request_ms:
+            self._log_slow(profile, wall_ms, sql_ms, statements)
+        return response
+
+    def _log_slow(self, profile, wall_ms, sql_ms, statements):
+        print(f"Slow request {request.method} {request.path} ({profile.endpoint}): {wall_ms:.1f}ms, "
+              f"{len(statements)} queries in {sql_ms:.1f}ms, {profile.connections} connections in "
+              f"{profile.connect_ms:.1f}ms, templates {profile.template_ms:.1f}ms")
+        for sql, ms, rows in sorted(statements, key=lambda s: s[1], reverse=True):
+            print(f"    {ms:8.1f}ms {rows:6d} rows  {sql[:200]}")
+
+    def _template_started(self, sender, template, context, **extra):
+        profile = self.current()
+        if profile is not None:
+            profile._template_starts[id(template)] = time.perf_counter()
+
+    def _template_finished(self, sender, template, context, **extra):
+        profile = self.current()
+        if profile is not None:
+            start = profile._template_starts.pop(id(template), None)
+            if start is not None:
+                profile.template_ms += (time.perf_counter() - start) * 1000
@@ -0,0 +1,270 @@
+import threading
+import time
+from bisect import bisect_left, insort
+
+import mysql.connector
+
+import leaderboard
+from index_service import IndexService
+
+# every rated title, read from the maintained aggregate instead of grouping user_ratings
+RATED_CONTENT_QUERY = """
+    SELECT c.content_id, c.title, c.release_year, c.content_type, s.rating_sum, s.rating_count
+    FROM content_rating_stats s
+    JOIN content c ON c.content_id = s.content_id
+    WHERE s.rating_count > 0
+"""
+
+CONTENT_GENRES_QUERY = """
+    SELECT cg.content_id, g.genre_id, g.genre_name
+    FROM content_genres cg
+    JOIN genres g ON g.genre_id = cg.genre_id
+"""
+
+def _rows(cursor):
+    return [row if isinstance(row, dict) else dict(zip(cursor.column_names, row))
+            for row in cursor.fetchall()]
+
+
+class BayesianRanking:
+    """
+    Top rated lists, overall, per content type and per genre, ranked by a
+    Bayesian average instead of the plain mean:
+
+        score = (prior_weight * prior_mean + rating_sum) / (prior_weight + rating_count)
+
+    so a title needs a fair number of ratings before it can outrank well
+    established ones. prior_mean defaults to the mean of all ratings when
+    the ranking is built, and stays fixed until the next build, so an
+    update only ever moves the title that was rated.
+
+    Each list is a sorted Python list of (-score, -rating_count, content_id)
+    keys. update() moves one title within the lists it belongs to with two
+    binary searches, and top() is a slice.
+    """
+
+    def __init__(self, prior_weight=10, prior_mean=None, min_ratings=1):
+        self.prior_weight = prior_weight
+        self.fixed_prior_mean = prior_mean
+        self.min_ratings = min_ratings
+        self.prior_mean = prior_mean
+        self.built_at = None
+
+        self._items = {}
+        self._lists = {None: []}
+        self._genres = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._lists[None])
+
+    def build(self, cursor):
+        """
+        Loads the rating aggregate, titles and genres and rebuilds every list.
+        """
+        cursor.execute(RATED_CONTENT_QUERY)
+        rated = _rows(cursor)
+        cursor.execute(CONTENT_GENRES_QUERY)
+        genres = _rows(cursor)
+        self.build_from_rows(rated, genres)
+
+    def build_from_rows(self, rated, genre_rows):
+        total_sum = sum(float(row['rating_sum']) for row in rated)
+        total_count = sum(int(row['rating_count']) for row in rated)
+        prior_mean = self.fixed_prior_mean
+        if prior_mean is None:
+            prior_mean = total_sum / total_count if total_count else 3.0
+
+        content_genres = {}
+        genre_names = {}
+        for row in genre_rows:
+            content_genres.setdefault(row['content_id'], []).append(row['genre_id'])
+            genre_names[row['genre_id']] = row['genre_name']
+
+        items = {}
+        for row in rated:
+            items[row['content_id']] = {
+                'content_id': row['content_id'],
+                'title': row['title'],
+                'release_year': row['release_year'],
+                'content_type': row['content_type'],
+                'genres': tuple(content_genres.get(row['content_id'], ())),
+                'rating_sum': float(row['rating_sum']),
+                'num_ratings': int(row['rating_count']),
+            }
+
+        lists = {None: []}
+        for item in items.values():
+            self._score(item, prior_mean)
+            if item['num_ratings'] >= self.min_ratings:
+                for name in self._list_names(item):
+                    lists.setdefault(name, []).append(self._key(item))
+        for keys in lists.values():
+            keys.sort()
+
+        with self._lock:
+            self.prior_mean = prior_mean
+            self._items = items
+            self._lists = lists
+            self._genres = genre_names
+            self.built_at = time.time()
+
+    def update(self, row):
+        """
+        Applies a title's rating totals as just committed to
+        content_rating_stats (see leaderboard.rating_totals_many) and moves it
+        in its lists. A title rated for the first time is added from the row.
+        """
+        content_id = row['content_id']
+        with self._lock:
+            if self.built_at is None:
+                return
+            item = self._items.get(content_id)
+            if item is None:
+                genre_ids = row.get('genre_ids') or ''
+                item = self._items[content_id] = {
+                    'content_id': content_id,
+                    'title': row['title'],
+                    'release_year': row['release_year'],
+                    'content_type': row['content_type'],
+                    'genres': tuple(int(genre_id) for genre_id in str(genre_ids).split(',') if genre_id),
+                    'rating_sum': 0.0,
+                    'num_ratings': 0,
+                }
+            elif item['num_ratings'] >= self.min_ratings:
+                old_key = self._key(item)
+                for name in self._list_names(item):
+                    keys = self._lists[name]
+                    i = bisect_left(keys, old_key)
+                    if i < len(keys) and keys[i] == old_key:
+                        del keys[i]
+
+            item['rating_sum'] = float(row['rating_sum'])
+            item['num_ratings'] = int(row['rating_count'])
+            self._score(item, self.prior_mean)
+            if item['num_ratings'] >= self.min_ratings:
+                new_key = self._key(item)
+                for name in self._list_names(item):
+                    insort(self._lists.setdefault(name, []), new_key)
+
+    def top(self, limit=10, genre=None, content_type=None):
+        """
+        Returns the `limit` best titles overall, or within one genre or
+        content type, in the same shape as the old leaderboard query
+        (plus their score).
+        """
+        if genre is not None:
+            name = ('genre', genre)
+        elif content_type is not None:
+            name = ('type', content_type)
+        else:
+            name = None
+        with self._lock:
+            keys = self._lists.get(name, [])[:limit]
+            return [self._row(self._items[content_id]) for _, _, content_id in keys]
+
+    def genres(self):
+        # genres that have at least one ranked title, by name
+        with self._lock:
+            return sorted(((genre_id, name) for genre_id, name in self._genres.items()
+                           if self._lists.get(('genre', genre_id))), key=lambda genre: genre[1])
+
+    def content_types(self):
+        with self._lock:
+            return sorted(name[1] for name, keys in self._lists.items()
+                          if name is not None and name[0] == 'type' and keys)
+
+    def _score(self, item, prior_mean):
+        item['avg_rating'] = item['rating_sum'] / item['num_ratings'] if item['num_ratings'] else 0.0
+        item['score'] = ((self.prior_weight * prior_mean + item['rating_sum']) /
+                         (self.prior_weight + item['num_ratings']))
+
+    def _key(self, item):
+        return (-item['score'], -item['num_ratings'], item['content_id'])
+
+    def _list_names(self, item):
+        return [None, ('type', item['content_type'])] + [('genre', genre_id) for genre_id in item['genres']]
+
+    def _row(self, item):
+        return {
+            'content_id': item['content_id'],
+            'title': item['title'],
+            'release_year': item['release_year'],
+            'content_type': item['content_type'],
+            'avg_rating': round(item['avg_rating'], 2),
+            'num_ratings': item['num_ratings'],
+            'score': round(item['score'], 3),
+        }
+
+
+class RankingService(IndexService):
+    """
+    Holds a BayesianRanking that this process updates on every rating it
+    writes, and rebuilds from the database on a background thread every
+    `refresh_seconds`, which picks up ratings written by other processes
+    and new titles.
+    """
+
+    description = 'ranking'
+
+    # titles share this many locks, see reload()
+    LOCK_STRIPES = 64
+
+    def __init__(self, get_connection, ranking, refresh_seconds=300):
+        super().__init__(get_connection, refresh_seconds)
+        self.ranking = ranking
+        self._recent_updates = None
+        self._title_locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+
+    def top(self, limit=10, genre=None, content_type=None):
+        if not self.ensure_fresh():
+            return None
+        return self.ranking.top(limit, genre=genre, content_type=content_type)
+
+    def reload(self, conn, content_ids):
+        """
+        Reads the committed totals of `content_ids` and moves the titles.
+        Called after a rating commits. The read and the update happen under
+        the titles' locks, so when two ratings of a title commit close
+        together, the totals applied last are from the later read, which
+        saw both.
+        """
+        content_ids = sorted(set(content_ids))
+        if not content_ids:
+            return
+        # always taken in stripe order, so two reloads can't deadlock
+        stripes = sorted({content_id % self.LOCK_STRIPES for content_id in content_ids})
+        for stripe in stripes:
+            self._title_locks[stripe].acquire()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            for row in leaderboard.rating_totals_many(cursor, content_ids):
+                self.update(row)
+            # don't leave the read's snapshot open on the connection
+            conn.commit()
+        except mysql.connector.Error as err:
+            # the next rebuild picks the totals up
+            print(f"Error reloading rating totals: {err}")
+        finally:
+            cursor.close()
+            for stripe in stripes:
+                self._title_locks[stripe].release()
+
+    def update(self, row):
+        self.ranking.update(row)
+        # a rebuild that is already reading may have missed this one
+        recent = self._recent_updates
+        if recent is not None:
+            recent[row['content_id']] = row
+
+    def build(self, cursor):
+        self._recent_updates = {}
+        try:
+            self.ranking.build(cursor)
+            # replay what was written while the build was reading, those
+            # totals are at least as new as what the build saw
+            recent, self._recent_updates = self._recent_updates, None
+            for row in list(recent.values()):
+                self.ranking.update(row)
+        finally:
+            self._recent_updates = None
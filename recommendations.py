@@ -0,0 +1,276 @@
+import argparse
+import os
+import sys
+import time
+from datetime import timedelta
+
+import mysql.connector
+import numpy as np
+import scipy.sparse as sp
+from dotenv import load_dotenv
+
+from bulk_load import InsertWriter
+
+# item-item neighbours for the dashboard's recommendations panel, stored in
+# content_similarity; the per-user lookup is plain SQL in dashboard_data.py so
+# the web app doesn't need numpy/scipy
+
+# how strongly each kind of interaction ties a user to an item
+RATING_WEIGHT = 1.0     # scaled by rating / 5
+WATCHLIST_WEIGHT = 0.6
+
+class SimilarityModel:
+    """
+    Item-item similarity over the whole catalog.
+
+    Collaborative part: a sparse user x item matrix of interaction weights
+    (ratings and watchlist adds), columns L2-normalized, so X.T @ X is the
+    cosine similarity between items. Content part: a sparse item x feature
+    matrix of genres and directors, rows L2-normalized, so F @ F.T is their
+    cosine overlap. The two are blended with `cf_weight`, plus a small
+    popularity prior that breaks ties between otherwise equal neighbours.
+
+    Rows are computed `block_size` items at a time as dense blocks, and only
+    the top `neighbors` per item are kept.
+    """
+
+    def __init__(self, neighbors=20, cf_weight=0.7, min_score=0.01, block_size=256):
+        self.neighbors = neighbors
+        self.cf_weight = cf_weight
+        self.min_score = min_score
+        self.block_size = block_size
+
+    def load(self, cursor):
+        cursor.execute("SELECT content_id FROM content ORDER BY content_id")
+        self.content_ids = np.fromiter((row[0] for row in cursor.fetchall()), dtype=np.int64)
+        self.index = {int(content_id): i for i, content_id in enumerate(self.content_ids)}
+        n_items = len(self.content_ids)
+
+        # interactions, the stronger of rating and watchlist per (user, item)
+        cursor.execute("""
+            SELECT user_id, content_id, MAX(weight) FROM (
+                SELECT user_id, content_id, rating / 5 * %s AS weight FROM user_ratings
+                UNION ALL
+                SELECT user_id, content_id, %s FROM user_watchlist
+            ) interactions
+            GROUP BY user_id, content_id
+        """, (RATING_WEIGHT, WATCHLIST_WEIGHT))
+        users, items, weights = [], [], []
+        user_index = {}
+        for user_id, content_id, weight in cursor.fetchall():
+            item = self.index.get(content_id)
+            if item is None:
+                continue
+            users.append(user_index.setdefault(user_id, len(user_index)))
+            items.append(item)
+            weights.append(float(weight))
+        interactions = sp.csr_matrix((np.array(weights, dtype=np.float32), (users, items)),
+                                     shape=(max(len(user_index), 1), n_items))
+        self.cf = _normalize_columns(interactions).tocsc()
+        self.popularity = np.asarray((interactions > 0).sum(axis=0)).ravel().astype(np.float32)
+
+        # content features: genres for movies, directors for shows
+        cursor.execute("""
+            SELECT content_id, CONCAT('g', genre_id) FROM content_genres
+            UNION ALL
+            SELECT content_id, CONCAT('d', director_id) FROM content_directors
+        """)
+        feature_index = {}
+        rows, cols = [], []
+        for content_id, feature in cursor.fetchall():
+            item = self.index.get(content_id)
+            if item is None:
+                continue
+            rows.append(item)
+            cols.append(feature_index.setdefault(feature, len(feature_index)))
+        features = sp.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                                 shape=(n_items, max(len(feature_index), 1)))
+        self.content = _normalize_rows(features)
+
+        # log-scaled popularity in [0, 1], weighted so it only ever breaks ties
+        self.prior = (0.01 * np.log1p(self.popularity) / max(np.log1p(self.popularity.max()), 1.0)).astype(np.float32)
+        return self
+
+    def top_neighbors(self, items=None):
+        """
+        Yields (content_id, neighbor_id, score) for the top neighbours of
+        every item in `items` (indexes into content_ids, default all).
+        """
+        items = np.arange(len(self.content_ids)) if items is None else np.asarray(items)
+        k = min(self.neighbors, len(self.content_ids) - 1)
+        if k <= 0:
+            return
+
+        cf_t = self.cf.T.tocsr()
+        content_t = self.content.T.tocsc()
+        for start in range(0, len(items), self.block_size):
+            block = items[start:start + self.block_size]
+            scores = self.cf_weight * (cf_t[block] @ self.cf).toarray()
+            scores += (1 - self.cf_weight) * (self.content[block] @ content_t).toarray()
+            # no similarity at all means no neighbour, the prior only ranks real matches
+            scores = np.where(scores > 0, scores + self.prior, 0)
+            scores[np.arange(len(block)), block] = 0
+
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            for row, item in enumerate(block):
+                for neighbor, score in zip(top[row], top_scores[row]):
+                    if score >= self.min_score:
+                        yield int(self.content_ids[item]), int(self.content_ids[neighbor]), round(float(score), 6)
+
+
+def _normalize_columns(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    return matrix @ sp.diags(1 / norms)
+
+
+def _normalize_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sp.diags(1 / norms) @ matrix
+
+
+def rebuild(cursor, model=None):
+    """
+    Recomputes the neighbours of every title. Returns the number of pairs stored.
+    """
+    model = model or SimilarityModel()
+    started_at = _database_now(cursor)
+    model.load(cursor)
+    cursor.execute("DELETE FROM content_similarity")
+    pairs = _store(cursor, model.top_neighbors())
+    _log_refresh(cursor, started_at, model, True, len(model.content_ids))
+    return pairs
+
+
+def refresh(cursor, model=None, lookback=0):
+    """
+    Recomputes only the titles whose ratings or watchlist entries changed
+    since the last refresh, the titles added since then, and the titles that
+    are now among their neighbours (their lists are the ones most likely to
+    change). Neighbour lists further away catch up on the next rebuild().
+
+    Changes are looked for from `lookback` seconds before the last refresh
+    started, so action_log rows stamped before it but committed after it
+    (the app writes them behind, in batches) aren't missed.
+    Returns the number of titles recomputed.
+    """
+    cursor.execute("SELECT MAX(started_at), MAX(max_content_id) FROM similarity_refresh")
+    since, max_content_id = cursor.fetchone()
+    if since is None:
+        rebuild(cursor, model)
+        return None
+    since -= timedelta(seconds=lookback)
+
+    model = model or SimilarityModel()
+    started_at = _database_now(cursor)
+    # rating updates keep their created_at, the action log has every write;
+    # an imported batch is logged without its titles, so all of that user's ratings count
+    cursor.execute("""
+        SELECT target_id FROM action_log WHERE action_type = 'USER_RATED_CONTENT' AND timestamp >= %s
+        UNION SELECT r.content_id FROM action_log a JOIN user_ratings r ON r.user_id = a.user_id
+            WHERE a.action_type = 'USER_IMPORTED_RATINGS' AND a.timestamp >= %s
+        UNION SELECT content_id FROM user_ratings WHERE created_at >= %s
+        UNION SELECT content_id FROM user_watchlist WHERE added_at >= %s
+        UNION SELECT content_id FROM content WHERE content_id > %s
+    """, (since, since, since, since, max_content_id or 0))
+    changed = {row[0] for row in cursor.fetchall() if row[0] is not None}
+    if not changed:
+        _log_refresh(cursor, started_at, None, False, 0, max_content_id)
+        return 0
+
+    model.load(cursor)
+    dirty = sorted(model.index[cid] for cid in changed if cid in model.index)
+    pairs = list(model.top_neighbors(dirty))
+    affected = sorted({model.index[neighbor] for _, neighbor, _ in pairs} - set(dirty))
+    pairs += model.top_neighbors(affected)
+
+    recomputed = [int(model.content_ids[i]) for i in dirty + affected]
+    for start in range(0, len(recomputed), 1000):
+        chunk = recomputed[start:start + 1000]
+        cursor.execute(f"DELETE FROM content_similarity WHERE content_id IN ({', '.join(['%s'] * len(chunk))})",
+                       chunk)
+    _store(cursor, pairs)
+    _log_refresh(cursor, started_at, model, False, len(recomputed))
+    return len(recomputed)
+
+
+def _store(cursor, pairs):
+    writer = InsertWriter(cursor, 'content_similarity', ('content_id', 'neighbor_id', 'score'))
+    stored = 0
+    for pair in pairs:
+        writer.write(pair)
+        stored += 1
+    writer.close()
+    return stored
+
+
+def _database_now(cursor):
+    # the database clock, so it lines up with the timestamps it is compared to
+    cursor.execute("SELECT NOW()")
+    return cursor.fetchone()[0]
+
+
+def _log_refresh(cursor, started_at, model, full_rebuild, items, max_content_id=None):
+    if model is not None:
+        max_content_id = int(model.content_ids.max()) if len(model.content_ids) else 0
+    cursor.execute("""
+        INSERT INTO similarity_refresh (started_at, max_content_id, full_rebuild, items_recomputed)
+        VALUES (%s, %s, %s, %s)
+    """, (started_at, max_content_id or 0, full_rebuild, items))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the item-item similarity table behind recommendations.")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--rebuild', action='store_true', help="recompute every title (e.g. nightly)")
+    mode.add_argument('--refresh', action='store_true', help="recompute the titles that changed since the last run")
+    parser.add_argument('--watch', type=int, metavar='SECONDS',
+                        help="with --refresh, keep running and refresh every SECONDS")
+    args = parser.parse_args()
+
+    load_dotenv()
+    model = SimilarityModel(
+        neighbors=int(os.getenv('RECOMMENDATION_NEIGHBORS', 20)),
+        cf_weight=float(os.getenv('RECOMMENDATION_CF_WEIGHT', 0.7))
+    )
+    # write-behind batches commit up to a flush interval late, a batch retried row by row later still
+    lookback = max(60.0, 2 * float(os.getenv('WRITE_BEHIND_FLUSH_INTERVAL', 1.0)))
+
+    while True:
+        try:
+            conn = mysql.connector.connect(
+                host=os.getenv('DB_HOST'),
+                user=os.getenv('DB_USER'),
+                password=os.getenv('DB_PASSWORD'),
+                database=os.getenv('DB_NAME')
+            )
+        except mysql.connector.Error as err:
+            print(f"Error connecting to database: {err}")
+            sys.exit(1)
+
+        cursor = conn.cursor()
+        start = time.perf_counter()
+        try:
+            if args.rebuild:
+                pairs = rebuild(cursor, model)
+                print(f"[SUCCESS] Similarity table rebuilt ({pairs} pairs) in {time.perf_counter() - start:.1f}s.")
+            else:
+                items = refresh(cursor, model, lookback)
+                if items is None:
+                    print(f"--> No earlier build, did a full rebuild in {time.perf_counter() - start:.1f}s.")
+                else:
+                    print(f"[SUCCESS] Recomputed {items} titles in {time.perf_counter() - start:.1f}s.")
+            conn.commit()
+        except mysql.connector.Error as err:
+            print(f"[ERROR] {err}")
+            conn.rollback()
+            sys.exit(1)
+        finally:
+            cursor.close()
+            conn.close()
+
+        if not (args.refresh and args.watch):
+            break
+        time.sleep(args.watch)
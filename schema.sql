@@ -37,6 +37,7 @@ CREATE TABLE content (
     title           VARCHAR(255) NOT NULL,
     release_year    YEAR,
     overview        TEXT,
+    content_hash    CHAR(32) NULL, -- fingerprint of the source row, lets an incremental sync skip unchanged titles
     FULLTEXT(title, overview)
 );
 
@@ -63,6 +64,7 @@ CREATE TABLE awards (
     content_id      INT NOT NULL,
     year            INT NOT NULL,
     category        VARCHAR(255) NOT NULL,
+    INDEX idx_awards_year (year), -- recent winners on the homepage
     FOREIGN KEY (content_id) REFERENCES content(content_id) ON DELETE CASCADE
 );
 
@@ -71,6 +73,7 @@ CREATE TABLE sessions (
     session_id      VARCHAR(255) PRIMARY KEY,
     user_id         INT NOT NULL,
     expires_at      TIMESTAMP NOT NULL,
+    INDEX idx_sessions_expires (expires_at), -- expiry sweep
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
 );
 
@@ -79,6 +82,7 @@ CREATE TABLE user_watchlist (
     content_id      INT NOT NULL,
     added_at        TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (user_id, content_id),
+    INDEX idx_watchlist_user_added (user_id, added_at, content_id), -- keyset paging on the dashboard
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
     FOREIGN KEY (content_id) REFERENCES content(content_id) ON DELETE CASCADE
 );
@@ -89,16 +93,57 @@ CREATE TABLE user_ratings (
     rating          DECIMAL(3, 1) NOT NULL,
     created_at      TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (user_id, content_id),
+    INDEX idx_ratings_user_created (user_id, created_at, content_id), -- keyset paging on the dashboard
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
     FOREIGN KEY (content_id) REFERENCES content(content_id) ON DELETE CASCADE,
     CONSTRAINT chk_rating CHECK (rating >= 1.0 AND rating <= 5.0)
 );
 
+-- `content_rating_stats` table: running rating totals per content, kept up to date on every rating write
+CREATE TABLE content_rating_stats (
+    content_id      INT PRIMARY KEY,
+    rating_sum      DECIMAL(12, 1) NOT NULL DEFAULT 0,
+    rating_count    INT NOT NULL DEFAULT 0,
+    avg_rating      DECIMAL(7, 4) AS (IF(rating_count > 0, rating_sum / rating_count, 0)) STORED,
+    FOREIGN KEY (content_id) REFERENCES content(content_id) ON DELETE CASCADE
+);
+
+-- `user_stats` table: per-user counters for the dashboard and profile, kept up to date by the routes that write them
+CREATE TABLE user_stats (
+    user_id         INT PRIMARY KEY,
+    watchlist_count INT NOT NULL DEFAULT 0,
+    rating_count    INT NOT NULL DEFAULT 0,
+    rating_sum      DECIMAL(12, 1) NOT NULL DEFAULT 0,
+    report_count    INT NOT NULL DEFAULT 0,
+    request_count   INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+-- `content_similarity` table: top-K most similar titles per title, built by recommendations.py
+CREATE TABLE content_similarity (
+    content_id      INT NOT NULL,
+    neighbor_id     INT NOT NULL,
+    score           FLOAT NOT NULL,
+    PRIMARY KEY (content_id, neighbor_id),
+    FOREIGN KEY (content_id) REFERENCES content(content_id) ON DELETE CASCADE,
+    FOREIGN KEY (neighbor_id) REFERENCES content(content_id) ON DELETE CASCADE
+);
+
+-- `similarity_refresh` table: one row per similarity build, incremental refreshes start from the last one
+CREATE TABLE similarity_refresh (
+    refresh_id          INT AUTO_INCREMENT PRIMARY KEY,
+    started_at          TIMESTAMP NOT NULL,
+    max_content_id      INT NOT NULL,
+    full_rebuild        BOOLEAN NOT NULL,
+    items_recomputed    INT NOT NULL
+);
+
 CREATE TABLE action_log (
     log_id          INT AUTO_INCREMENT PRIMARY KEY,
     user_id         INT NULL,
     action_type     VARCHAR(50) NOT NULL,
     target_id       INT NULL,
+    item_count      INT NULL, -- titles written, for the one row a bulk import batch logs
     timestamp       TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE SET NULL
 );
@@ -117,6 +162,7 @@ CREATE TABLE search_history (
     user_id         INT NOT NULL,
     search_query    VARCHAR(255) NOT NULL,
     searched_at     TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_search_history_user_query (user_id, search_query, searched_at), -- recent searches on the dashboard
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
 );
 
@@ -129,6 +175,7 @@ CREATE TABLE content_reports (
     details       TEXT NULL,
     status        ENUM('Pending', 'Resolved', 'Dismissed') NOT NULL DEFAULT 'Pending',
     created_at    TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_reports_user_created (user_id, created_at), -- latest reports on the dashboard
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
     FOREIGN KEY (content_id) REFERENCES content(content_id) ON DELETE CASCADE
 );
@@ -153,5 +200,31 @@ CREATE TABLE content_requests (
     title           VARCHAR(255) NOT NULL,
     status          ENUM('Pending', 'Added', 'Rejected') NOT NULL DEFAULT 'Pending',
     requested_at    TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    group_id        INT NULL, -- see content_request_groups
+    INDEX idx_requests_user_requested (user_id, requested_at), -- latest requests on the dashboard
+    INDEX idx_requests_group_user (group_id, user_id), -- one request per user and group
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-);
\ No newline at end of file
+);
+
+-- `content_request_groups` table: requests for the same title (fuzzily matched, see content_requests.py)
+-- collapsed into one row, request_count is the number of users asking for it
+CREATE TABLE content_request_groups (
+    group_id            INT AUTO_INCREMENT PRIMARY KEY,
+    title               VARCHAR(255) NOT NULL,
+    title_key           VARCHAR(255) NOT NULL,
+    status              ENUM('Pending', 'Added', 'Rejected') NOT NULL DEFAULT 'Pending',
+    request_count       INT NOT NULL DEFAULT 0,
+    first_requested_at  TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_requested_at   TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_request_groups_key (title_key),
+    INDEX idx_request_groups_demand (status, request_count, last_requested_at) -- most requested view
+);
+
+-- `schema_migrations` table: the migrations in migrations/ applied to this database (see migrate.py),
+-- a database created from this file already has them all and is stamped by setup_database.py
+CREATE TABLE schema_migrations (
+    version         INT PRIMARY KEY,
+    name            VARCHAR(255) NOT NULL,
+    checksum        CHAR(32) NOT NULL,
+    applied_at      TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
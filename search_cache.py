@@ -0,0 +1,52 @@
+import threading
+from collections import Counter
+
+
+def normalize_query(query):
+    """
+    Case-folds a search query and collapses whitespace, so 'The  Matrix'
+    and 'the matrix' share one cache entry.
+    """
+    return ' '.join(query.casefold().split())
+
+
+class SearchResultCache:
+    """
+    Caches search results by normalized query on top of a Cache (see cache.py),
+    and counts hits per query so the most popular cached queries can be listed.
+    """
+
+    # per-query hit counters are trimmed back to the busiest queries past this size
+    MAX_TRACKED_QUERIES = 5000
+
+    def __init__(self, cache, backend_name):
+        self.cache = cache
+        self.backend_name = backend_name
+        self._query_hits = Counter()
+        self._lock = threading.Lock()
+
+    def key(self, query):
+        # results differ per backend, so the backend is part of the key
+        return f"search:{self.backend_name}:{normalize_query(query)}"
+
+    def get(self, query):
+        results = self.cache.get(self.key(query))
+        if results is not None:
+            with self._lock:
+                self._query_hits[normalize_query(query)] += 1
+                if len(self._query_hits) > self.MAX_TRACKED_QUERIES:
+                    self._query_hits = Counter(dict(self._query_hits.most_common(self.MAX_TRACKED_QUERIES // 2)))
+        return results
+
+    def set(self, query, results):
+        self.cache.set(self.key(query), results)
+
+    def invalidate(self):
+        # called whenever the content table changes
+        self.cache.invalidate_prefix('search:')
+
+    def stats(self, top=20):
+        with self._lock:
+            top_queries = self._query_hits.most_common(top)
+        counters = self.cache.stats().get('search', {'hits': 0, 'misses': 0, 'invalidations': 0, 'hit_rate': 0.0})
+        return dict(counters, top_queries=[{'query': q, 'hits': hits} for q, hits in top_queries])
@@ -0,0 +1,223 @@
+import heapq
+import math
+import re
+import threading
+import time
+from array import array
+
+# small english stopword list, roughly what MySQL's FULLTEXT ignores
+STOPWORDS = frozenset("""
+a about an and are as at be by com de en for from how i in is it la of on or
+that the this to was what when where who will with und www
+""".split())
+
+TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text):
+    """
+    Lowercases and splits text into word tokens, dropping stopwords and
+    single characters.
+    """
+    if not text:
+        return []
+    return [t for t in TOKEN_RE.findall(text.casefold()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class SearchIndex:
+    """
+    In-process inverted index over the `content` table with BM25 scoring.
+
+    Each term maps to a compact posting list: an array of document numbers
+    and a parallel array of term frequencies, where a title occurrence counts
+    `title_boost` times an overview occurrence. Documents are numbered in the
+    order they are added, so posting lists stay sorted on incremental adds.
+    Replaced and removed documents stay in the posting lists, marked dead,
+    until build() compacts them away by swapping in a freshly built index.
+    """
+
+    def __init__(self, k1=1.2, b=0.75, title_boost=3.0):
+        self.k1 = k1
+        self.b = b
+        self.title_boost = title_boost
+
+        self._postings = {}
+        self._docs = []          # document number -> result row
+        self._lengths = array('f')
+        self._live = bytearray()  # 0 once a document has been replaced
+        self._doc_by_content_id = {}
+        self._total_length = 0.0
+        self._live_count = 0
+        self._checksums = {}     # content_id -> checksum of the indexed columns
+        self._lock = threading.RLock()
+
+        self.built_at = None
+
+    def __len__(self):
+        return self._live_count
+
+    def add(self, content_id, title, overview, release_year, content_type):
+        """
+        Indexes one content item. Adding a content_id that is already indexed
+        replaces the old document.
+        """
+        title_terms = tokenize(title)
+        overview_terms = tokenize(overview)
+
+        freqs = {}
+        for term in title_terms:
+            freqs[term] = freqs.get(term, 0.0) + self.title_boost
+        for term in overview_terms:
+            freqs[term] = freqs.get(term, 0.0) + 1.0
+        length = len(title_terms) * self.title_boost + len(overview_terms)
+
+        with self._lock:
+            old_doc = self._doc_by_content_id.get(content_id)
+            if old_doc is not None:
+                self._live[old_doc] = 0
+                self._total_length -= self._lengths[old_doc]
+                self._live_count -= 1
+
+            doc = len(self._docs)
+            self._docs.append({
+                'content_id': content_id,
+                'title': title,
+                'release_year': release_year,
+                'content_type': content_type,
+            })
+            self._lengths.append(length)
+            self._live.append(1)
+            self._doc_by_content_id[content_id] = doc
+            self._total_length += length
+            self._live_count += 1
+
+            for term, tf in freqs.items():
+                posting = self._postings.get(term)
+                if posting is None:
+                    posting = self._postings[term] = (array('I'), array('f'))
+                posting[0].append(doc)
+                posting[1].append(tf)
+
+    def search(self, query, limit=50):
+        """
+        Returns the top `limit` rows for a query, best match first, in the
+        same shape as the FULLTEXT search query.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            n_docs = self._live_count
+            if n_docs == 0:
+                return []
+            avg_length = self._total_length / n_docs or 1.0
+            k1, b = self.k1, self.b
+            lengths, live = self._lengths, self._live
+            has_dead = len(self._docs) > n_docs
+
+            scores = {}
+            for term in terms:
+                posting = self._postings.get(term)
+                if posting is None:
+                    continue
+                docs, tfs = posting
+                # replaced and removed documents don't count towards the document frequency
+                df = sum(live[doc] for doc in docs) if has_dead else len(docs)
+                if df == 0:
+                    continue
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc, tf in zip(docs, tfs):
+                    if not live[doc]:
+                        continue
+                    norm = k1 * (1 - b + b * lengths[doc] / avg_length)
+                    scores[doc] = scores.get(doc, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+            # top-k selection with a heap instead of sorting every match
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+            return [dict(self._docs[doc]) for doc, _ in best]
+
+    def remove(self, content_id):
+        """
+        Drops a content item from the results. Returns False if it was not
+        indexed.
+        """
+        with self._lock:
+            doc = self._doc_by_content_id.pop(content_id, None)
+            if doc is None:
+                return False
+            self._live[doc] = 0
+            self._total_length -= self._lengths[doc]
+            self._live_count -= 1
+            self._checksums.pop(content_id, None)
+            return True
+
+    def build(self, cursor, batch_size=5000):
+        """
+        Brings the index in line with the content table. Called on an empty
+        index this is a full build; afterwards it compares a checksum of the
+        indexed columns per row and only re-indexes new and changed titles
+        and drops deleted ones, so catalog syncs and edits show up too.
+        Returns the number of rows indexed or removed.
+        """
+        cursor.execute("""
+            SELECT content_id,
+                   CRC32(CONCAT_WS('|', title, overview, release_year, content_type)) AS checksum
+            FROM content
+        """)
+        current = {}
+        for row in cursor.fetchall():
+            if isinstance(row, dict):
+                row = (row['content_id'], row['checksum'])
+            current[row[0]] = row[1]
+
+        removed = [content_id for content_id in self._checksums if content_id not in current]
+        changed = [content_id for content_id, checksum in current.items()
+                   if self._checksums.get(content_id) != checksum]
+
+        # once dead documents would outnumber live ones, start over instead of growing the
+        # postings; the new index is built on the side so searches keep the old one meanwhile
+        if len(self._docs) - self._live_count + len(removed) + len(changed) > max(self._live_count, batch_size):
+            fresh = SearchIndex(self.k1, self.b, self.title_boost)
+            fresh._index_rows(cursor, sorted(current), current, batch_size)
+            with self._lock:
+                self._postings = fresh._postings
+                self._docs = fresh._docs
+                self._lengths = fresh._lengths
+                self._live = fresh._live
+                self._doc_by_content_id = fresh._doc_by_content_id
+                self._total_length = fresh._total_length
+                self._live_count = fresh._live_count
+                self._checksums = fresh._checksums
+        else:
+            for content_id in removed:
+                self.remove(content_id)
+            self._index_rows(cursor, sorted(changed), current, batch_size)
+
+        self.built_at = time.time()
+        return len(changed) + len(removed)
+
+    def _index_rows(self, cursor, content_ids, checksums, batch_size):
+        for start in range(0, len(content_ids), batch_size):
+            chunk = content_ids[start:start + batch_size]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"""
+                SELECT content_id, title, overview, release_year, content_type
+                FROM content
+                WHERE content_id IN ({placeholders})
+                ORDER BY content_id
+            """, chunk)
+            for row in cursor.fetchall():
+                if isinstance(row, dict):
+                    row = (row['content_id'], row['title'], row['overview'],
+                           row['release_year'], row['content_type'])
+                self.add(*row)
+                self._checksums[row[0]] = checksums[row[0]]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'documents': self._live_count,
+                'terms': len(self._postings),
+                'postings': sum(len(docs) for docs, _ in self._postings.values()),
+                'built_at': self.built_at,
+            }
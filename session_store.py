@@ -0,0 +1,270 @@
+import atexit
+import hashlib
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import mysql.connector
+
+from cache import MemoryBackend
+
+
+_UNAVAILABLE = object()
+
+
+def _utcnow():
+    # expiry times are naive UTC, compared with UTC_TIMESTAMP() in the sweep, so
+    # the app hosts and the database server don't have to share a time zone
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _token_key(token):
+    # only a hash of the token is stored, so the sessions table can't be used to log in
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class SessionStore:
+    """
+    Server-side login sessions kept in the `sessions` table.
+
+    The browser only holds a random token (inside Flask's signed cookie).
+    Lookups go through an in-process LRU for `cache_ttl` seconds, so a
+    logged-in request normally doesn't touch the database. Revoking a session
+    takes effect at once in this process, and within `cache_ttl` seconds in
+    the others.
+
+    Sessions slide: a session used more than `refresh_interval` seconds after
+    its last extension gets a new expires_at. Those updates are collected and
+    written together every `flush_interval` seconds by a background thread,
+    which also deletes expired rows every `sweep_interval` seconds.
+    """
+
+    def __init__(self, get_connection, lifetime=7 * 86400, cache_ttl=60, cache_max_entries=10000,
+                 refresh_interval=300, flush_interval=30, sweep_interval=600):
+        self.get_connection = get_connection
+        self.lifetime = lifetime
+        self.cache_ttl = cache_ttl
+        self.refresh_interval = refresh_interval
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+
+        self._cache = MemoryBackend(max_entries=cache_max_entries)
+        self._lock = threading.Lock()
+        self._pending_refresh = {}
+        self._counters = {'created': 0, 'revoked': 0, 'cache_hits': 0, 'cache_misses': 0,
+                          'rejected': 0, 'refreshes_written': 0, 'swept': 0}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def create(self, user_id):
+        """
+        Stores a new session for `user_id` and returns the token to hand to
+        the browser, or None if the database is unavailable.
+        """
+        token = secrets.token_urlsafe(32)
+        key = _token_key(token)
+        expires_at = _utcnow() + timedelta(seconds=self.lifetime)
+
+        conn = self.get_connection()
+        if not conn:
+            return None
+        cursor = conn.cursor()
+        try:
+            cursor.execute("INSERT INTO sessions (session_id, user_id, expires_at) VALUES (%s, %s, %s)",
+                           (key, user_id, expires_at))
+            conn.commit()
+        except mysql.connector.Error as err:
+            print(f"Error creating session: {err}")
+            return None
+        finally:
+            cursor.close()
+            conn.close()
+
+        self._cache.set(key, (user_id, expires_at), self.cache_ttl)
+        self._count('created')
+        self._ensure_worker()
+        return token
+
+    def validate(self, token, user_id):
+        """
+        True if `token` is a live session belonging to `user_id`, False if it
+        isn't, and None if that can't be told because the database is down
+        (so a blip doesn't log everyone out). Extends the session's expiry in
+        the background when it is due.
+        """
+        if not token:
+            return False
+        key = _token_key(token)
+
+        entry = self._cache.get(key)
+        if entry is not None:
+            self._count('cache_hits')
+        else:
+            self._count('cache_misses')
+            entry = self._load(key)
+            if entry is _UNAVAILABLE:
+                return None
+            if entry is None:
+                self._count('rejected')
+                return False
+            self._cache.set(key, entry, self.cache_ttl)
+
+        session_user_id, expires_at = entry
+        now = _utcnow()
+        if session_user_id != user_id or expires_at <= now:
+            self._cache.delete(key)
+            self._count('rejected')
+            return False
+
+        # extended at most once per refresh_interval, and written in batches
+        if expires_at - now < timedelta(seconds=self.lifetime - self.refresh_interval):
+            new_expires_at = now + timedelta(seconds=self.lifetime)
+            with self._lock:
+                self._pending_refresh[key] = new_expires_at
+            self._cache.set(key, (session_user_id, new_expires_at), self.cache_ttl)
+            self._ensure_worker()
+        return True
+
+    def revoke(self, token):
+        if token:
+            key = _token_key(token)
+            self._delete("DELETE FROM sessions WHERE session_id = %s", key, [key])
+
+    def revoke_user(self, user_id):
+        """
+        Logs a user out everywhere. Other processes notice within cache_ttl seconds.
+        """
+        conn = self.get_connection()
+        if not conn:
+            return 0
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT session_id FROM sessions WHERE user_id = %s", (user_id,))
+            keys = [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            conn.close()
+        self._delete("DELETE FROM sessions WHERE user_id = %s", user_id, keys)
+        return len(keys)
+
+    def flush(self):
+        """
+        Writes the pending expires_at extensions in one batch.
+        """
+        with self._lock:
+            pending, self._pending_refresh = self._pending_refresh, {}
+        if not pending:
+            return
+        conn = self.get_connection()
+        if not conn:
+            print(f"Session refresh failed: no database connection, {len(pending)} sessions not extended.")
+            return
+        cursor = conn.cursor()
+        try:
+            cursor.executemany("UPDATE sessions SET expires_at = %s WHERE session_id = %s",
+                               [(expires_at, key) for key, expires_at in pending.items()])
+            conn.commit()
+            self._count('refreshes_written', len(pending))
+        except mysql.connector.Error as err:
+            print(f"Session refresh failed: {err}")
+            conn.rollback()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def sweep(self, batch_size=1000):
+        """
+        Deletes expired sessions a batch at a time, so the table never stays
+        locked for long. Returns the number of rows deleted.
+        """
+        conn = self.get_connection()
+        if not conn:
+            return 0
+        cursor = conn.cursor()
+        deleted = 0
+        try:
+            while True:
+                cursor.execute("DELETE FROM sessions WHERE expires_at < UTC_TIMESTAMP() LIMIT %s", (batch_size,))
+                conn.commit()
+                deleted += cursor.rowcount
+                if cursor.rowcount < batch_size:
+                    break
+        except mysql.connector.Error as err:
+            print(f"Session sweep failed: {err}")
+            conn.rollback()
+        finally:
+            cursor.close()
+            conn.close()
+        self._count('swept', deleted)
+        return deleted
+
+    def close(self):
+        # write the last extensions on shutdown
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(self.flush_interval + 5)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, cached=len(self._cache.keys()),
+                        pending_refresh=len(self._pending_refresh))
+
+    def _load(self, key):
+        conn = self.get_connection()
+        if not conn:
+            return _UNAVAILABLE
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT user_id, expires_at FROM sessions WHERE session_id = %s", (key,))
+            row = cursor.fetchone()
+        except mysql.connector.Error as err:
+            print(f"Error loading session: {err}")
+            return _UNAVAILABLE
+        finally:
+            cursor.close()
+            conn.close()
+        return tuple(row) if row else None
+
+    def _delete(self, query, param, keys):
+        conn = self.get_connection()
+        if not conn:
+            return
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query, (param,))
+            conn.commit()
+        except mysql.connector.Error as err:
+            print(f"Error revoking sessions: {err}")
+            return
+        finally:
+            cursor.close()
+            conn.close()
+        with self._lock:
+            for key in keys:
+                self._pending_refresh.pop(key, None)
+        for key in keys:
+            self._cache.delete(key)
+        self._count('revoked', len(keys))
+
+    def _ensure_worker(self):
+        # started lazily so importing the app never spawns threads
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='session-store', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def _run(self):
+        next_sweep = time.monotonic()
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+            if time.monotonic() >= next_sweep:
+                self.sweep()
+                next_sweep = time.monotonic() + self.sweep_interval
+        self.flush()
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] += amount
@@ -1,282 +1,37 @@
 import os
-import re 
-import csv
-import json
+import argparse
 import mysql.connector
 from mysql.connector import Error
 from dotenv import load_dotenv
+from cache import cache_from_env
+from bulk_load import bulk_populate, InsertWriter, StageTimer
+from ingest import ingest_catalog
+from catalog_sync import sync_catalog, SyncAborted
+import migrate
 
-def populate_genres(cursor):
+def clear_cached_views():
     """
-    Reads genre data from movies.csv, extracts a unique list of genres,
-    and populates the 'genres' table.
-    """
-    print("--> Populating 'genres' table...")
-    
-    unique_genres = set()
-    movies_file_path = os.path.join('data', 'movies.csv')
-    
-    try:
-        with open(movies_file_path, 'r', encoding='utf-8') as file:
-            # find the genres column index
-            header = next(file).strip().split(',')
-            try:
-                genres_column_index = header.index('genres')
-            except ValueError:
-                print("[ERROR] 'genres' column not found in the header of movies.csv")
-                return
-
-            # process each data line
-            for line in file:
-                try:
-                    # split the line by comma
-                    columns = line.split(',')
-
-                    json_start = line.find('"[{"') 
-                    json_end = line.find('}]"')
-                    
-                    if json_start != -1 and json_end != -1:
-                        # extract the whole JSON string
-                        genres_field = line[json_start : json_end + 3]
-                        
-                        # remove outer quotes
-                        clean_json_string = genres_field.strip('"').replace('""', '"')
-                        
-                        genres_list = json.loads(clean_json_string)
-                        for genre_obj in genres_list:
-                            genre_name = genre_obj.get('name')
-                            if genre_name:
-                                unique_genres.add(genre_name)
-                except (json.JSONDecodeError, ValueError):
-                    continue
-
-        print(f"--> Found {len(unique_genres)} unique genres to insert.")
-        
-        if not unique_genres:
-            print("[!!!] No genres found to insert. Skipping insertion.")
-            return
-
-        sql = "INSERT INTO genres (genre_name) VALUES (%s)"
-        genre_data = [(genre,) for genre in sorted(list(unique_genres))]
-        
-        cursor.executemany(sql, genre_data)
-        
-        print("[SUCCESS] 'genres' table populated successfully.")
-        
-    except FileNotFoundError:
-        print(f"[ERROR] Could not find the file at {movies_file_path}")
-    except Exception as e:
-        print(f"[ERROR] An error occurred during genre population: {e}")
-        raise
-
-def populate_directors(cursor):
-    """
-    Reads director data from netflix_shows.csv, extracts a unique list,
-    and populates the 'directors' table.
-    """
-    print("--> Populating 'directors' table...")
-    
-    unique_directors = set()
-    shows_file_path = os.path.join('data', 'netflix_shows.csv')
-    
-    try:
-        with open(shows_file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                directors_string = row.get('director')
-                
-                if directors_string:
-                    director_list = [name.strip() for name in directors_string.split(',')]
-                    unique_directors.update(director_list)
-
-        print(f"--> Found {len(unique_directors)} unique directors to insert.")
-        
-        if not unique_directors:
-            print("[!!!] No directors found to insert. Skipping insertion.")
-            return
-
-        sql = "INSERT INTO directors (director_name) VALUES (%s)"
-        director_data = [(name,) for name in sorted(list(unique_directors))]
-        
-        cursor.executemany(sql, director_data)
-        
-        print("[SUCCESS] 'directors' table populated successfully.")
-        
-    except FileNotFoundError:
-        print(f"[ERROR] Could not find the file at {shows_file_path}")
-    except Exception as e:
-        print(f"[ERROR] An error occurred during director population: {e}")
-        raise
-
-def populate_content_and_bridges(cursor):
-    """
-    Populates content and bridge tables. Returns a map of 
-    {original_tmdb_id -> new_auto_incremented_content_id}.
-    """
-    print("--> Populating 'content' and bridge tables...")
-    
-    cursor.execute("SELECT genre_id, genre_name FROM genres")
-    genre_map = {name: id for id, name in cursor.fetchall()}
-    cursor.execute("SELECT director_id, director_name FROM directors")
-    director_map = {name: id for id, name in cursor.fetchall()}
-    
-    content_to_insert = []
-    movies_by_tmdb_id = {}
-    
-    csv_regex = re.compile(r',(?=(?:[^\"]*\"[^\"]*\")*[^\"]*$)')
-
-    print("--> Processing movies.csv...")
-    movies_file_path = os.path.join('data', 'movies.csv')
-    with open(movies_file_path, 'r', encoding='utf-8') as file:
-        header = next(file).strip().split(',')
-        h = {name: i for i, name in enumerate(header)}
-
-        for line in file:
-            try:
-                fields = csv_regex.split(line)
-                tmdb_id = int(fields[h['id']])
-                title = fields[h['title']].strip('"')
-                overview = fields[h['overview']].strip('"')
-                release_year_str = fields[h['release_date']][:4]
-
-                movie_tuple = (
-                    'Movie', title, overview, 
-                    int(release_year_str) if release_year_str.isdigit() else None,
-                    tmdb_id
-                )
-                movies_by_tmdb_id[tmdb_id] = movie_tuple
-                
-            except (ValueError, IndexError, json.JSONDecodeError):
-                continue
-
-    print(f"--> Inserting {len(movies_by_tmdb_id)} movie records into 'content' table...")
-    tmdb_id_to_content_id_map = {}
-    sql_content_movie = "INSERT INTO content (content_type, title, overview, release_year, source_id) VALUES (%s, %s, %s, %s, %s)"
-
-    for tmdb_id, movie_tuple in movies_by_tmdb_id.items():
-        cursor.execute(sql_content_movie, movie_tuple)
-        new_content_id = cursor.lastrowid
-        tmdb_id_to_content_id_map[tmdb_id] = new_content_id
-
-    # handle genres using new map
-    content_genres_to_insert = []
-    with open(movies_file_path, 'r', encoding='utf-8') as file:
-        header = next(file).strip().split(',')
-        h = {name: i for i, name in enumerate(header)}
-        for line in file:
-             try:
-                fields = csv_regex.split(line)
-                tmdb_id = int(fields[h['id']])
-                if tmdb_id in tmdb_id_to_content_id_map:
-                    new_content_id = tmdb_id_to_content_id_map[tmdb_id]
-                    genres_json_string = fields[h['genres']].strip('"').replace('""', '"')
-                    if genres_json_string:
-                        genres_list = json.loads(genres_json_string)
-                        for genre_obj in genres_list:
-                            genre_name = genre_obj.get('name')
-                            if genre_name in genre_map:
-                                genre_id = genre_map[genre_name]
-                                content_genres_to_insert.append((new_content_id, genre_id))
-             except (ValueError, IndexError, json.JSONDecodeError):
-                continue
-                
-    # process netflix_shows.csv
-    print("--> Processing netflix_shows.csv...")
-    shows_file_path = os.path.join('data', 'netflix_shows.csv')
-    content_directors_to_insert = []
-    sql_content_show = "INSERT INTO content (content_type, title, overview, release_year, source_id) VALUES (%s, %s, %s, %s, %s)"
-    with open(shows_file_path, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            source_id = row.get('show_id')
-            title = row.get('title')
-            release_year_str = row.get('release_year')
-            
-            show_tuple = (
-                'TV Show', title, None,
-                int(release_year_str) if release_year_str and release_year_str.isdigit() else None,
-                source_id
-            )
-            cursor.execute(sql_content_show, show_tuple)
-            new_content_id = cursor.lastrowid
-
-            directors_string = row.get('director')
-            if directors_string:
-                director_list = [name.strip() for name in directors_string.split(',')]
-                for director_name in director_list:
-                    if director_name in director_map:
-                        director_id = director_map[director_name]
-                        content_directors_to_insert.append((new_content_id, director_id))
-
-    # insert the bridge table data
-    print(f"--> Inserting {len(content_genres_to_insert)} records into 'content_genres' table...")
-    sql_genres = "INSERT INTO content_genres (content_id, genre_id) VALUES (%s, %s)"
-    cursor.executemany(sql_genres, content_genres_to_insert)
-
-    print(f"--> Inserting {len(content_directors_to_insert)} records into 'content_directors' table...")
-    sql_directors = "INSERT INTO content_directors (content_id, director_id) VALUES (%s, %s)"
-    cursor.executemany(sql_directors, content_directors_to_insert)
-
-    print("[SUCCESS] 'content' and bridge tables populated successfully.")
-    
-    # return map
-    return tmdb_id_to_content_id_map
+    Clears the homepage and search result caches after the catalog changed.
 
-def populate_awards(cursor, tmdb_id_map):
+    Only a shared cache (CACHE_BACKEND=sqlite) can be cleared from here. The
+    default memory backend lives inside each app process, which keeps
+    serving its entries until they expire or the app restarts.
     """
-    Reads cleaned Oscar data and populates the 'awards' table using the
-    tmdb_id -> content_id map.
-    """
-    print("--> Populating 'awards' table...")
-    
-    awards_to_insert = []
-    awards_file_path = os.path.join('data', 'oscars.csv')
-    
-    try:
-        with open(awards_file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                try:
-                    original_tmdb_id_str = row.get('tmdb_id')
-                    year = row.get('Year')
-                    category = row.get('Category')
-                    
-                    if original_tmdb_id_str and original_tmdb_id_str.strip():
-                        original_tmdb_id = int(original_tmdb_id_str)
-                        
-                        if original_tmdb_id in tmdb_id_map:
-                            new_content_id = tmdb_id_map[original_tmdb_id]
-                            
-                            awards_to_insert.append((
-                                new_content_id,
-                                int(year),
-                                category
-                            ))
-                except (ValueError, TypeError):
-                    continue
-
-        print(f"--> Found {len(awards_to_insert)} award records to insert.")
-
-        if not awards_to_insert:
-            print("[!!!] No awards found to insert. Skipping insertion.")
-            return
-
-        sql = "INSERT INTO awards (content_id, year, category) VALUES (%s, %s, %s)"
-        cursor.executemany(sql, awards_to_insert)
-        
-        print("[SUCCESS] 'awards' table populated successfully.")
-
-    except FileNotFoundError:
-        # ... (error handling is the same) ...
-        print(f"[ERROR] Could not find the file at {awards_file_path}")
-        raise
-    except Exception as e:
-        print(f"[ERROR] An error occurred during award population: {e}")
-        raise
-
-def create_and_populate_database():
+    if os.getenv('CACHE_BACKEND', 'memory').lower() != 'sqlite':
+        print("--> The app caches are per process (CACHE_BACKEND=memory), restart the app "
+              "or wait HOMEPAGE_CACHE_TTL/SEARCH_CACHE_TTL seconds to see the changes.")
+        return
+    cache_from_env().clear()
+    cache_from_env('search').clear()
+    print("--> Cleared cached views.")
+
+def create_and_populate_database(bulk=False, load_data=False, workers=1):
     """
     Connects to MySQL, creates the database and tables by executing schema.sql.
+    The catalog is streamed in with the ingest pipeline (ingest.py). With
+    bulk=True constraint checks and the FULLTEXT index are deferred during the
+    load, and load_data=True writes through LOAD DATA LOCAL INFILE, see bulk_load.py.
+    With workers > 1 the source files are parsed in that many processes.
     """
     load_dotenv()
 
@@ -292,7 +47,8 @@ def create_and_populate_database():
         conn = mysql.connector.connect(
             host=db_host,
             user=db_user,
-            password=db_password
+            password=db_password,
+            allow_local_infile=load_data
         )
         if conn.is_connected():
             print("[SUCCESS] Successfully connected to MySQL server.")
@@ -318,20 +74,25 @@ def create_and_populate_database():
         conn.database = db_name
         print(f"--> Switched to database '{db_name}'.")
 
-        print("--- [GENRES TABLE] ---")
-        populate_genres(cursor)
-        print("--- [DIRECTORS TABLE] ---")
-        populate_directors(cursor)
-        print("--- [CONTENT & BRIDGE TABLES] ---")
-        id_map = populate_content_and_bridges(cursor)
-        print("--- [AWARDS TABLE] ---")
-        populate_awards(cursor, id_map)
+        # schema.sql is the latest schema, so every migration counts as applied
+        migrate.stamp(cursor)
+
+        if bulk:
+            print("--- [BULK LOAD] ---")
+            bulk_populate(cursor, load_data=load_data, workers=workers)
+        else:
+            # each source file is streamed once and written in chunks, see ingest.py
+            print("--- [CATALOG TABLES] ---")
+            ingest_catalog(cursor, lambda table, columns: InsertWriter(cursor, table, columns), workers=workers)
 
         conn.commit()
 
         print("[SUCCESS] Database schema and tables created successfully.")
         print("[SUCCESS] All data populated successfully.")
 
+        # the cached homepage views (awards especially) and search results are stale after a reload
+        clear_cached_views()
+
     except Error as e:
         print(f"[ERROR] Error during database setup: {e}")
         if conn:
@@ -343,5 +104,61 @@ def create_and_populate_database():
             conn.close()
             print("--> MySQL connection closed.")
 
+def sync_database(workers=1, allow_mass_delete=False):
+    """
+    Refreshes the catalog of an existing database from the CSVs in place,
+    writing only what changed (see catalog_sync.py). Users, ratings and
+    everything else they created are kept, except for titles that were
+    removed from the source files.
+    """
+    load_dotenv()
+
+    conn = None
+    cursor = None
+    try:
+        conn = mysql.connector.connect(
+            host=os.getenv("DB_HOST"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            database=os.getenv("DB_NAME")
+        )
+        print("[SUCCESS] Successfully connected to MySQL server.")
+        cursor = conn.cursor()
+
+        print("--- [CATALOG SYNC] ---")
+        timer = StageTimer()
+        sync_catalog(cursor, timer=timer, workers=workers, allow_mass_delete=allow_mass_delete)
+        conn.commit()
+        timer.summary()
+        print("[SUCCESS] Catalog synced.")
+
+        clear_cached_views()
+
+    except (Error, SyncAborted) as e:
+        print(f"[ERROR] Error during catalog sync: {e}")
+        if conn:
+            conn.rollback()
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+            print("--> MySQL connection closed.")
+
 if __name__ == '__main__':
-    create_and_populate_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create the movie_app database and load the datasets.")
+    parser.add_argument('--bulk', action='store_true',
+                        help="load with multi-row inserts and deferred checks instead of row by row")
+    parser.add_argument('--load-data', action='store_true',
+                        help="with --bulk, load through LOAD DATA LOCAL INFILE (needs local_infile enabled on the server)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="parse the source files in this many processes (results are identical to 1)")
+    parser.add_argument('--sync', action='store_true',
+                        help="update the catalog of an existing database in place, keeping user data")
+    parser.add_argument('--allow-mass-delete', action='store_true',
+                        help="with --sync, go ahead even if a large part of the catalog would be deleted")
+    args = parser.parse_args()
+    if args.sync:
+        sync_database(workers=args.workers, allow_mass_delete=args.allow_mass_delete)
+    else:
+        create_and_populate_database(bulk=args.bulk or args.load_data, load_data=args.load_data, workers=args.workers)
\ No newline at end of file
@@ -0,0 +1,181 @@
+import os
+import sys
+import mysql.connector
+from dotenv import load_dotenv
+
+# the counters kept per user, and how each one is recomputed from its source table
+COUNTERS = {
+    'watchlist_count': "SELECT user_id, COUNT(*) FROM user_watchlist {where} GROUP BY user_id",
+    'rating_count': "SELECT user_id, COUNT(*) FROM user_ratings {where} GROUP BY user_id",
+    'rating_sum': "SELECT user_id, SUM(rating) FROM user_ratings {where} GROUP BY user_id",
+    'report_count': "SELECT user_id, COUNT(*) FROM content_reports {where} GROUP BY user_id",
+    'request_count': "SELECT user_id, COUNT(*) FROM content_requests {where} GROUP BY user_id",
+}
+
+def get(cursor, user_id):
+    """
+    Returns a user's counters as a dictionary (zeros for a user with no
+    activity yet), plus their average rating. One primary key lookup.
+    """
+    cursor.execute(f"SELECT {', '.join(COUNTERS)} FROM user_stats WHERE user_id = %s", (user_id,))
+    row = cursor.fetchone()
+    if row is None:
+        stats = dict.fromkeys(COUNTERS, 0)
+    else:
+        stats = dict(row) if isinstance(row, dict) else dict(zip(COUNTERS, row))
+    stats['avg_rating'] = stats['rating_sum'] / stats['rating_count'] if stats['rating_count'] else 0
+    return stats
+
+def apply(cursor, user_id, **deltas):
+    """
+    Adds deltas to a user's counters, e.g. apply(cursor, 7, watchlist_count=1).
+    Runs inside the caller's transaction, next to the write it accounts for,
+    so both are committed (or rolled back) together.
+    """
+    columns = [name for name in COUNTERS if deltas.get(name)]
+    if not columns:
+        return
+    query = f"""
+        INSERT INTO user_stats (user_id, {', '.join(columns)})
+        VALUES (%s, {', '.join(['%s'] * len(columns))})
+        ON DUPLICATE KEY UPDATE {', '.join(f'{name} = {name} + VALUES({name})' for name in columns)}
+    """
+    cursor.execute(query, [user_id] + [deltas[name] for name in columns])
+
+def record_rating(cursor, user_id, old_rating, new_rating):
+    """
+    Applies a rating write as returned by leaderboard.save_rating().
+    """
+    if old_rating is None:
+        apply(cursor, user_id, rating_count=1, rating_sum=new_rating)
+    else:
+        apply(cursor, user_id, rating_sum=new_rating - old_rating)
+
+def actual(cursor, user_ids=None):
+    """
+    Recomputes the counters from the source tables, for every user or only
+    `user_ids`. Returns {user_id: {counter: value}} for users with any activity.
+    """
+    where, params = "", ()
+    if user_ids is not None:
+        where = f"WHERE user_id IN ({', '.join(['%s'] * len(user_ids))})"
+        params = tuple(user_ids)
+    totals = {}
+    for name, query in COUNTERS.items():
+        cursor.execute(query.format(where=where), params)
+        for user_id, value in cursor.fetchall():
+            totals.setdefault(user_id, dict.fromkeys(COUNTERS, 0))[name] = value
+    return totals
+
+def rebuild(cursor):
+    """
+    Recomputes user_stats from scratch. Used for backfilling; on a live
+    database use reconcile(), which doesn't race the request writes.
+    """
+    cursor.execute("DELETE FROM user_stats")
+    rows = [(user_id,) + tuple(values[name] for name in COUNTERS) for user_id, values in actual(cursor).items()]
+    if rows:
+        cursor.executemany(f"""
+            INSERT INTO user_stats (user_id, {', '.join(COUNTERS)})
+            VALUES (%s, {', '.join(['%s'] * len(COUNTERS))})
+        """, rows)
+    return len(rows)
+
+def check_consistency(cursor):
+    """
+    Compares user_stats against the source tables. Returns a list of
+    (user_id, stored, actual) for every user whose counters disagree, an
+    empty list means the counters are in sync.
+    """
+    cursor.execute(f"SELECT user_id, {', '.join(COUNTERS)} FROM user_stats")
+    stored = {row[0]: dict(zip(COUNTERS, row[1:])) for row in cursor.fetchall()}
+    totals = actual(cursor)
+    zeros = dict.fromkeys(COUNTERS, 0)
+    mismatches = []
+    for user_id in sorted(stored.keys() | totals.keys()):
+        have, want = stored.get(user_id, zeros), totals.get(user_id, zeros)
+        if any(have[name] != want[name] for name in COUNTERS):
+            mismatches.append((user_id, have, want))
+    return mismatches
+
+def recount(cursor, user_ids, chunk_size=1000):
+    """
+    Overwrites the counters of `user_ids` with fresh totals from the source
+    tables, inside the caller's transaction. For bulk changes that bypass
+    the routes, like titles deleted by a catalog sync.
+    """
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        totals = actual(cursor, chunk)
+        cursor.executemany(f"""
+            INSERT INTO user_stats (user_id, {', '.join(COUNTERS)})
+            VALUES (%s, {', '.join(['%s'] * len(COUNTERS))})
+            ON DUPLICATE KEY UPDATE {', '.join(f'{name} = VALUES({name})' for name in COUNTERS)}
+        """, [(user_id,) + tuple(totals.get(user_id, dict.fromkeys(COUNTERS, 0))[name] for name in COUNTERS)
+              for user_id in chunk])
+    return len(user_ids)
+
+def reconcile(cursor, user_ids):
+    """
+    Repairs the counters of `user_ids` one user at a time, safe to run
+    while the app is writing. Each user's stats row is locked first, so a
+    request that already changed a source row waits for the repair and then
+    applies its delta on top of the corrected value. Commits per user.
+    """
+    for user_id in user_ids:
+        # a locking read doesn't take a snapshot, the recount below starts one after the lock
+        cursor.execute("SELECT user_id FROM user_stats WHERE user_id = %s FOR UPDATE", (user_id,))
+        cursor.fetchall()
+        recount(cursor, [user_id])
+        cursor.execute("COMMIT")
+    return len(user_ids)
+
+if __name__ == '__main__':
+    # usage: python user_stats.py --check | --reconcile | --rebuild
+    load_dotenv()
+    if len(sys.argv) < 2 or sys.argv[1] not in ('--check', '--reconcile', '--rebuild'):
+        print("Usage: python user_stats.py --check | --reconcile | --rebuild")
+        sys.exit(1)
+
+    try:
+        conn = mysql.connector.connect(
+            host=os.getenv('DB_HOST'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            database=os.getenv('DB_NAME')
+        )
+    except mysql.connector.Error as err:
+        print(f"Error connecting to database: {err}")
+        sys.exit(1)
+
+    cursor = conn.cursor()
+    try:
+        if sys.argv[1] == '--rebuild':
+            print("--> Rebuilding 'user_stats' from the source tables...")
+            rows = rebuild(cursor)
+            conn.commit()
+            print(f"[SUCCESS] User stats rebuilt ({rows} users).")
+        else:
+            mismatches = check_consistency(cursor)
+            conn.commit()
+            if sys.argv[1] == '--reconcile':
+                repaired = reconcile(cursor, [user_id for user_id, _, _ in mismatches])
+                print(f"[SUCCESS] Repaired the counters of {repaired} users.")
+            elif mismatches:
+                print(f"[!!!] {len(mismatches)} users are out of sync:")
+                for user_id, have, want in mismatches:
+                    diff = ', '.join(f"{name} {have[name]} != {want[name]}" for name in COUNTERS
+                                     if have[name] != want[name])
+                    print(f"    user_id={user_id}: {diff}")
+                print("--> Run 'python user_stats.py --reconcile' to repair.")
+                sys.exit(2)
+            else:
+                print("[SUCCESS] User stats are consistent with the source tables.")
+    except mysql.connector.Error as err:
+        print(f"[ERROR] {err}")
+        conn.rollback()
+        sys.exit(1)
+    finally:
+        cursor.close()
+        conn.close()
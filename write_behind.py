@@ -0,0 +1,198 @@
+import atexit
+import queue
+import threading
+import time
+
+import mysql.connector
+
+# append-only tables that can be written behind, and how to insert into them; the
+# event time is left to the column default, so it comes from the database clock like
+# every other timestamp those tables are compared with (it is the flush time, up to
+# flush_interval after the event)
+EVENT_STATEMENTS = {
+    'search_history': "INSERT INTO search_history (user_id, search_query) VALUES (%s, %s)",
+    'action_log': "INSERT INTO action_log (user_id, action_type, target_id) VALUES (%s, %s, %s)",
+}
+
+# longest string each table takes per value position, longer
+# values are cut on add() so a single oversized row can't fail a shared batch
+VALUE_LIMITS = {
+    'search_history': {1: 255},
+    'action_log': {1: 50},
+}
+
+_STOP = object()
+
+
+class WriteBehindBuffer:
+    """
+    Queues telemetry rows and writes them from a background thread in
+    multi-row batches, flushing once `batch_size` rows are waiting or
+    `flush_interval` seconds have passed.
+
+    The queue holds at most `max_queue` rows. When it is full, add() waits up
+    to `put_timeout` seconds and then applies `on_full`: 'sync' writes the row
+    on the caller's thread (nothing is lost, the caller pays the latency),
+    'drop' throws it away and counts it.
+    """
+
+    def __init__(self, get_connection, batch_size=200, flush_interval=1.0,
+                 max_queue=10000, put_timeout=0.05, on_full='sync', enabled=True):
+        if on_full not in ('sync', 'drop'):
+            raise ValueError("on_full must be 'sync' or 'drop'")
+        self.get_connection = get_connection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.on_full = on_full
+        self.enabled = enabled
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._counters = {'queued': 0, 'written': 0, 'batches': 0, 'sync_writes': 0, 'dropped': 0, 'failed': 0}
+        self._thread = None
+        self._closed = False
+
+    def add(self, table, *values):
+        """
+        Queues one row for `table` (a key of EVENT_STATEMENTS). The values are
+        the statement's parameters.
+        """
+        limits = VALUE_LIMITS.get(table, {})
+        values = tuple(value[:limits[i]] if i in limits and isinstance(value, str) else value
+                       for i, value in enumerate(values))
+        row = (table, values)
+
+        if not self.enabled or self._closed:
+            self._write_sync(row)
+            return
+
+        self._ensure_worker()
+        try:
+            self._queue.put(row, timeout=self.put_timeout)
+            self._count('queued')
+        except queue.Full:
+            # backpressure: the writer can't keep up
+            if self.on_full == 'sync':
+                self._write_sync(row)
+            else:
+                self._count('dropped')
+
+    def close(self, timeout=10):
+        """
+        Stops the worker after writing everything still queued. Registered
+        with atexit so a clean shutdown never loses events.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        # an add() that raced with close() can queue a row behind _STOP
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        for start in range(0, len(leftover), self.batch_size):
+            self._write_batch(leftover[start:start + self.batch_size])
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, queue_depth=self._queue.qsize(), enabled=self.enabled)
+
+    def _ensure_worker(self):
+        # started lazily so importing the app never spawns threads
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            # collect until the batch is full or the flush interval is up
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            if stopping:
+                # drain whatever is left before exiting
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+
+            if batch:
+                for start in range(0, len(batch), self.batch_size):
+                    self._write_batch(batch[start:start + self.batch_size])
+
+    def _write_batch(self, batch):
+        # one multi-row insert per table
+        by_table = {}
+        for table, values in batch:
+            by_table.setdefault(table, []).append(values)
+
+        conn = self.get_connection()
+        if not conn:
+            print(f"Write-behind flush failed: no database connection, {len(batch)} rows lost.")
+            self._count('failed', len(batch))
+            return
+        cursor = conn.cursor()
+        try:
+            for table, rows in by_table.items():
+                cursor.executemany(EVENT_STATEMENTS[table], rows)
+            conn.commit()
+            self._count('written', len(batch))
+            self._count('batches')
+        except mysql.connector.Error as err:
+            conn.rollback()
+            if len(batch) == 1:
+                print(f"Write-behind flush failed: {err}, 1 row lost.")
+                self._count('failed')
+            else:
+                # the batch is rows from unrelated requests, only drop the ones that fail on their own
+                print(f"Write-behind flush failed: {err}, retrying {len(batch)} rows one by one.")
+                self._write_rows(cursor, conn, batch)
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _write_rows(self, cursor, conn, batch):
+        for table, values in batch:
+            try:
+                cursor.execute(EVENT_STATEMENTS[table], values)
+                conn.commit()
+                self._count('written')
+            except mysql.connector.Error as err:
+                print(f"Write-behind row dropped: {err}")
+                conn.rollback()
+                self._count('failed')
+
+    def _write_sync(self, row):
+        self._count('sync_writes')
+        self._write_batch([row])
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] += amount